@@ -1,4 +1,7 @@
+import json
+import secrets
 from asyncio import run as asyncio_run
+from pathlib import Path
 from typing import Final
 
 import requests
@@ -9,10 +12,16 @@ from sqlalchemy.orm import Session
 from typer import Exit
 from typer import Typer
 
+from src.api.openapi import write_schema
 from src.core.config import configs
+from src.db import postgres_db
+from src.db import redis_db
 from src.models.alchemy_model import PermissionOrm
 from src.models.alchemy_model import UserOrm
+from src.services.client_credentials_service import secret_digest
+from src.services.compaction import UserCompaction
 from src.services.password_service import get_password_service
+from src.services.redis_service import RedisService
 
 
 NAME_PERMISSION: Final = "admin"
@@ -73,5 +82,40 @@ def delete_admin(login: str) -> None:
         session.commit()
 
 
+@app.command()
+def create_service_client(client_id: str, permissions: list[str]) -> None:
+    """Prints a new secret for the client, and its entry for SERVICE_CLIENTS: the secret itself is not stored"""
+    secret = secrets.token_urlsafe(32)
+    entry = {client_id: {"secret_digest": secret_digest(client_id, secret), "permissions": permissions}}
+    print(f"client_secret: {secret}")
+    print(f"SERVICE_CLIENTS entry: {json.dumps(entry)}")
+
+
+@app.command()
+def compact_users() -> None:
+    """Purges the users deleted longer ago than the retention, like the scheduled compaction, and prints the report"""
+
+    async def compact() -> None:
+        # Connected the way the lifespan connects a worker
+        redis_db.redis = redis_db.connect()
+        try:
+            compaction = UserCompaction(RedisService(redis_db.get_redis(), redis_db.breaker, redis_db.recent_values))
+            report = await compaction.run_locked()
+            print("another worker is compacting" if report is None else report)
+        finally:
+            await redis_db.close()
+            await postgres_db.close()
+
+    asyncio_run(compact())
+
+
+@app.command()
+def build_openapi(path: Path) -> None:
+    """Writes the OpenAPI schema for OPENAPI_PATH, so workers load it instead of generating it"""
+    from src.main import app as api
+
+    write_schema(api, path)
+
+
 if __name__ == "__main__":
     app()
@@ -0,0 +1,42 @@
+"""audit event
+
+Revision ID: 3b7c1e9a4d20
+Revises: df58f06270f0
+Create Date: 2026-10-19 10:12:41.318204
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3b7c1e9a4d20"
+down_revision: str | None = "df58f06270f0"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "audit_event",
+        sa.Column("occurred_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("event", sa.String(length=32), nullable=False),
+        sa.Column("user_id", sa.UUID(), nullable=True),
+        sa.Column("login", sa.String(length=60), nullable=True),
+        sa.Column("address", postgresql.INET(), nullable=True),
+        sa.Column("detail", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        postgresql_partition_by="RANGE (occurred_at)",
+    )
+    op.create_index("ix_audit_event_user_id_occurred_at", "audit_event", ["user_id", "occurred_at"], unique=False)
+    # Monthly partitions are created by the service ahead of time, rows outside them land here
+    op.execute("CREATE TABLE audit_event_default PARTITION OF audit_event DEFAULT")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_audit_event_user_id_occurred_at", table_name="audit_event")
+    op.drop_table("audit_event")
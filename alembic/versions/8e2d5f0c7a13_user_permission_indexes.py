@@ -0,0 +1,51 @@
+"""user permission indexes
+
+Revision ID: 8e2d5f0c7a13
+Revises: 3b7c1e9a4d20
+Create Date: 2026-10-19 14:03:27.551390
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8e2d5f0c7a13"
+down_revision: str | None = "3b7c1e9a4d20"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    # Built without blocking writes, which cannot happen inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_user_permission_permission_id",
+            "user_permission",
+            ["permission_id"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # The unique constraint on login already indexes every lookup this one served
+        op.drop_index("login_deleted", table_name="user", postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "login_deleted",
+            "user",
+            ["login", "is_deleted"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_user_permission_permission_id",
+            table_name="user_permission",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,44 @@
+"""user deleted modified at
+
+Revision ID: c4a9e2b7f815
+Revises: 8e2d5f0c7a13
+Create Date: 2026-10-19 18:21:09.402716
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4a9e2b7f815"
+down_revision: str | None = "8e2d5f0c7a13"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    # Built without blocking writes, which cannot happen inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_user_deleted_modified_at",
+            "user",
+            ["modified_at"],
+            unique=False,
+            postgresql_where=sa.text("is_deleted"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_user_deleted_modified_at",
+            table_name="user",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,163 @@
+"""Throughput of token verifications with and without Redis auto-pipelining
+
+Runs `--concurrency` `JWTService.check_banned` calls at once, `--rounds` times, first with every
+GET sent on its own connection round trip, then coalesced by `AutoPipeline`. It needs a real
+Redis: round trips are what auto-pipelining saves, and an in-process stand-in has none. Half of
+the tokens are revoked, so both answers are checked. The database is flushed before and after,
+so point it at a scratch one.
+
+    python -m bench.auto_pipeline run --db 15
+    python -m bench.auto_pipeline run --concurrency 5000 --rounds 50 --url redis://redis_auth:6379/15
+"""
+
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+from typing import Annotated
+
+from redis.asyncio import Redis
+from typer import Option
+from typer import Typer
+
+from bench.environment import prepare_environment
+from bench.load import percentile
+
+
+if TYPE_CHECKING:
+    from src.models.jwt import Payload
+    from src.services.jwt_service import JWTService
+
+
+app = Typer()
+
+
+@dataclass(slots=True)
+class Result:
+    mode: str
+    seconds: float
+    latencies: list[float]
+    failures: int
+    mismatches: int
+    commands_per_round_trip: float
+
+    @property
+    def throughput(self) -> float:
+        return len(self.latencies) / self.seconds
+
+
+async def verify(jwt_service: "JWTService", payload: "Payload", *, revoked: bool) -> tuple[float, bool]:
+    """Seconds the verification took, and whether its answer was right"""
+    started = time.perf_counter()
+    banned = await jwt_service.check_banned(payload)
+    return time.perf_counter() - started, banned == revoked
+
+
+async def measure_mode(
+    redis: Redis, mode: str, payloads: list["Payload"], revoked: set[uuid.UUID], rounds: int
+) -> Result:
+    from src.core.config import configs
+    from src.services.auto_pipeline import AutoPipeline
+    from src.services.circuit_breaker import CircuitBreaker
+    from src.services.jwt_service import JWTService
+    from src.services.recent_values import RecentValues
+    from src.services.redis_service import RedisService
+    from src.services.revocation_service import RevocationLayout
+    from src.services.revocation_service import RevocationService
+
+    pipeline = AutoPipeline(redis, configs.redis_auto_pipeline_max_batch) if mode == "auto" else None
+    breaker = CircuitBreaker(configs.redis_breaker_failures, configs.redis_breaker_reset_timeout)
+    # A fresh local store per mode, so neither is served from values the other one read
+    service = RedisService(redis, breaker, RecentValues(configs.redis_recent_size), pipeline)
+    jwt_service = JWTService(service, RevocationService(service, RevocationLayout.keys, legacy_reads=False))
+
+    async def one_round() -> list[tuple[float, bool] | BaseException]:
+        return await asyncio.gather(
+            *(verify(jwt_service, payload, revoked=payload.jti in revoked) for payload in payloads),
+            return_exceptions=True,
+        )
+
+    # Opens the connections the mode needs before anything is timed
+    await one_round()
+    if pipeline is not None:
+        pipeline.batches = pipeline.commands = 0
+
+    latencies: list[float] = []
+    failures = mismatches = 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for outcome in await one_round():
+            if isinstance(outcome, BaseException):
+                failures += 1
+                continue
+
+            latency, right = outcome
+            latencies.append(latency)
+            mismatches += not right
+
+    return Result(
+        mode=mode,
+        seconds=time.perf_counter() - started,
+        latencies=latencies,
+        failures=failures,
+        mismatches=mismatches,
+        commands_per_round_trip=1 if pipeline is None else pipeline.commands / max(pipeline.batches, 1),
+    )
+
+
+async def measure(url: str, concurrency: int, rounds: int) -> list[Result]:
+    from src.core.config import configs
+    from src.models.jwt import Payload
+    from src.services.circuit_breaker import CircuitBreaker
+    from src.services.recent_values import RecentValues
+    from src.services.redis_service import RedisService
+    from src.services.revocation_service import RevocationLayout
+    from src.services.revocation_service import RevocationService
+
+    redis = Redis.from_url(url, socket_timeout=configs.redis_timeout, socket_connect_timeout=configs.redis_timeout)
+    now = int(time.time())
+    payloads = [
+        Payload(sub=uuid.uuid4(), iat=now, jti=uuid.uuid4(), exp=now + 3600, type="access", permissions=[])  # pyright: ignore[reportCallIssue]
+        for _ in range(concurrency)
+    ]
+    try:
+        await redis.flushdb()
+        breaker = CircuitBreaker(configs.redis_breaker_failures, configs.redis_breaker_reset_timeout)
+        service = RedisService(redis, breaker, RecentValues(configs.redis_recent_size))
+        await RevocationService(service, RevocationLayout.keys, legacy_reads=False).revoke(*payloads[::2])
+        revoked = {payload.jti for payload in payloads[::2]}
+        return [await measure_mode(redis, mode, payloads, revoked, rounds) for mode in ("direct", "auto")]
+    finally:
+        await redis.flushdb()
+        await redis.aclose()
+
+
+@app.command()
+def run(
+    url: Annotated[str | None, Option(help="Redis URL, REDIS_HOST and REDIS_PORT by default")] = None,
+    db: Annotated[int, Option(help="Scratch database, flushed by the run")] = 15,
+    concurrency: Annotated[int, Option(help="Verifications in flight at once")] = 1000,
+    rounds: Annotated[int, Option(help="Times every verification runs per mode")] = 20,
+) -> None:
+    prepare_environment()
+    from src.core.config import configs
+
+    results = asyncio.run(
+        measure(url or f"redis://{configs.redis_host}:{configs.redis_port}/{db}", concurrency, rounds)
+    )
+    print(
+        f"{'mode':<8} {'verifications/s':>16} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'commands/trip':>14} {'failed':>8} {'wrong':>6}"
+    )
+    for result in results:
+        ordered = sorted(result.latencies) or [0.0]
+        print(
+            f"{result.mode:<8} {result.throughput:>16,.0f} {percentile(ordered, 50) * 1000:>8.2f} "
+            f"{percentile(ordered, 99) * 1000:>8.2f} {result.commands_per_round_trip:>14.1f} "
+            f"{result.failures:>8} {result.mismatches:>6}"
+        )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,37 @@
+import os
+from pathlib import Path
+from typing import Final
+
+from dotenv import dotenv_values
+
+
+DEFAULT_ENVIRONMENT: Final = {
+    "PROJECT_NAME": "auth-bench",
+    "FUZZY_EXCEL_HOST": "127.0.0.1",
+    "FUZZY_EXCEL_PORT": "1",
+    "POSTGRES_DB": "auth",
+    "POSTGRES_USER": "postgres",
+    "POSTGRES_PASSWORD": "postgres",
+    "POSTGRES_HOST": "127.0.0.1",
+    "POSTGRES_PORT": "5432",
+    "REDIS_HOST": "127.0.0.1",
+    "REDIS_PORT": "6379",
+    "PERMISSION_NAMES": '["admin"]',
+    "ITERS_PASSWORD": "100000",
+    "HASH_NAME_PASSWORD": "sha256",
+    "JWT_SECRET_KEY": "bench-secret-key",
+    "JWT_EXPIRES_ACCESS_SECONDS": "900",
+    "JWT_EXPIRES_REFRESH_SECONDS": "86400",
+    "LOGGER_FILENAME": "logs/bench.log",
+}
+
+
+def prepare_environment() -> None:
+    """Fills in the settings the app requires, without shadowing `.env` or the real environment
+
+    Must run before anything under `src` is imported: the settings objects are built at import time.
+    """
+    dotenv = {name.upper() for name in dotenv_values(Path(".env"))}
+    for name, value in DEFAULT_ENVIRONMENT.items():
+        if name not in dotenv:
+            os.environ.setdefault(name, value)
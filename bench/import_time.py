@@ -0,0 +1,118 @@
+"""Import time of `src.main`, checked against a budget
+
+Imports `src.main` under `python -X importtime` in a fresh interpreter `--runs` times, keeps the
+fastest run and lists the top-level packages that spent the most time importing themselves.
+
+Import time depends on the machine far more than on a change, so the check is against a run of
+the base revision on the same machine: it exits with a non-zero status when `src.main` took over
+`--tolerance` longer than in the `--baseline` report. `--budget` adds an absolute ceiling in
+milliseconds, for a machine whose numbers are known:
+
+    python -m bench.import_time run --output before.json  # on the base revision
+    python -m bench.import_time run --baseline before.json
+    python -m bench.import_time run --budget 800 --top 30
+"""
+
+import json
+import os
+import re
+import subprocess  # noqa: S404
+import sys
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Annotated
+from typing import Final
+
+import typer
+from typer import Option
+from typer import Typer
+
+from bench.environment import prepare_environment
+from bench.load import git_revision
+
+
+app = Typer()
+
+MODULE: Final = "src.main"
+# import time: self [us] | cumulative | imported package
+IMPORT_LINE: Final = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|\s+(\S+)$")
+
+
+@dataclass(slots=True, frozen=True)
+class ImportTimes:
+    total: int
+    packages: Counter[str]
+
+
+def measure() -> ImportTimes:
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", f"import {MODULE}"],
+        capture_output=True,
+        text=True,
+        env=os.environ,
+        check=True,
+    )
+    total = 0
+    packages: Counter[str] = Counter()
+    for line in result.stderr.splitlines():
+        if (match := IMPORT_LINE.match(line)) is None:
+            continue
+
+        own, cumulative, name = match.groups()
+        packages[name.split(".")[0]] += int(own)
+        if name == MODULE:
+            total = int(cumulative)
+
+    return ImportTimes(total, packages)
+
+
+@app.command()
+def run(
+    baseline: Annotated[Path | None, Option(help="Report of the base revision on this machine")] = None,
+    tolerance: Annotated[float, Option(help="Share by which the import may exceed the baseline")] = 0.1,
+    budget: Annotated[float | None, Option(help="Milliseconds `src.main` may take to import")] = None,
+    runs: Annotated[int, Option(help="Fresh interpreters to import it in, the fastest counts")] = 5,
+    top: Annotated[int, Option(help="Top-level packages to list")] = 15,
+    output: Annotated[Path | None, Option(help="Where to write the JSON report")] = None,
+) -> None:
+    prepare_environment()
+    fastest = min((measure() for _ in range(runs)), key=lambda times: times.total)
+    print(f"{'package':<32} {'ms':>8}")
+    for package, own in fastest.packages.most_common(top):
+        print(f"{package:<32} {own / 1000:>8.1f}")
+
+    total = fastest.total / 1000
+    print(f"{MODULE}: {total:.1f} ms")
+    if output is not None:
+        report = {
+            "revision": git_revision(),
+            "total_ms": total,
+            "packages_ms": {package: own / 1000 for package, own in fastest.packages.most_common()},
+        }
+        output.write_text(json.dumps(report, indent=2))
+
+    violated = False
+    if baseline is not None:
+        base = json.loads(baseline.read_text())
+        limit = base["total_ms"] * (1 + tolerance)
+        change = total / base["total_ms"] - 1
+        print(f"baseline {base['revision']}: {base['total_ms']:.1f} ms, limit {limit:.1f} ms, change {change:+.1%}")
+        if total > limit:
+            print(f"VIOLATION import time over the baseline limit by {total - limit:.1f} ms")
+            violated = True
+
+    if budget is not None:
+        print(f"budget {budget:.0f} ms")
+        if total > budget:
+            print(f"VIOLATION import time over budget by {total - budget:.1f} ms")
+            violated = True
+
+    if violated:
+        raise typer.Exit(1)
+
+    print("ok")
+
+
+if __name__ == "__main__":
+    app()
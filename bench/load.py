@@ -0,0 +1,361 @@
+"""Load generator for the auth flows
+
+Every virtual user goes through register -> login -> checkout_access * N -> refresh -> logout,
+then checks that the logged-out cookies get a 401 from `checkout_access`.
+A `ban_ratio` share of them calls `logout_all` after login and keeps using the revoked
+cookies, so the banned path of `checkout_access` is measured too. The watermark `logout_all`
+sets is in whole seconds and revokes the tokens issued strictly before it, so these users wait
+`BAN_DELAY` between login and `logout_all`, which holds their slot of the concurrency.
+
+`--app memory` swaps Postgres and Redis for the stand-ins of `bench.stubs` and does the
+request-path part of the startup: the Redis client with its auto-pipeline and the code-path
+warmup. The connection warmups and the background tasks are left out, as they need the real
+Postgres and Redis; `--app local` runs the whole lifespan.
+
+    python -m bench.load run bench/scenarios/default.json --app memory --output before.json
+    python -m bench.load run bench/scenarios/default.json --url http://127.0.0.1:8000
+    python -m bench.load compare before.json after.json
+"""
+
+import asyncio
+import json
+import random
+import subprocess  # noqa: S404
+import time
+import uuid
+from collections.abc import AsyncIterator
+from collections.abc import Awaitable
+from collections.abc import Callable
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import UTC
+from datetime import datetime
+from enum import StrEnum
+from http.cookies import SimpleCookie
+from pathlib import Path
+from typing import Annotated
+from typing import Any
+from typing import Final
+
+import httpx
+from typer import Argument
+from typer import Option
+from typer import Typer
+
+from bench.environment import prepare_environment
+
+
+app = Typer()
+REQUEST_TIMEOUT: Final = 30
+# Seconds past the one-second resolution of the revocation watermark
+BAN_DELAY: Final = 1.1
+
+
+class AppMode(StrEnum):
+    memory = "memory"
+    local = "local"
+
+
+@dataclass(slots=True, frozen=True)
+class Scenario:
+    name: str
+    users: int = 100
+    concurrency: int = 20
+    checkouts_per_user: int = 20
+    permissions_per_user: int = 3
+    ban_ratio: float = 0.1
+    seed: int = 0
+
+    @classmethod
+    def load(cls, path: Path) -> "Scenario":
+        return cls(**json.loads(path.read_text()))
+
+
+@dataclass(slots=True)
+class Recorder:
+    latencies: dict[str, list[float]] = field(default_factory=dict)
+    errors: dict[str, int] = field(default_factory=dict)
+
+    async def call(
+        self, endpoint: str, request: Awaitable[httpx.Response], expected: int = httpx.codes.OK
+    ) -> httpx.Response:
+        started = time.perf_counter()
+        response = await request
+        self.latencies.setdefault(endpoint, []).append(time.perf_counter() - started)
+        if response.status_code != expected:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+        return response
+
+    def report(self, elapsed: float) -> dict[str, Any]:
+        endpoints: dict[str, Any] = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            latencies.sort()
+            endpoints[endpoint] = {
+                "count": len(latencies),
+                "errors": self.errors.get(endpoint, 0),
+                "rps": len(latencies) / elapsed,
+                "mean_ms": sum(latencies) / len(latencies) * 1000,
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p95_ms": percentile(latencies, 95) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+            }
+
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        return {"elapsed_s": elapsed, "requests": total, "rps": total / elapsed, "endpoints": endpoints}
+
+
+def percentile(ordered: list[float], rank: float) -> float:
+    index = max(0, min(len(ordered) - 1, round(rank / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Session:
+    """One browser: keeps its own cookies while the HTTP client and its connection pool are shared"""
+
+    def __init__(self, client: httpx.AsyncClient) -> None:
+        self.client = client
+        self.cookies: dict[str, str] = {}
+
+    def _headers(self, cookies: dict[str, str] | None = None) -> dict[str, str]:
+        cookies = self.cookies if cookies is None else cookies
+        return {"Cookie": "; ".join(f"{name}={value}" for name, value in cookies.items())}
+
+    def _update(self, response: httpx.Response) -> httpx.Response:
+        for header in response.headers.get_list("set-cookie"):
+            for name, morsel in SimpleCookie(header).items():
+                if not morsel.value or morsel["max-age"] == "0":
+                    self.cookies.pop(name, None)
+                else:
+                    self.cookies[name] = morsel.value
+
+        return response
+
+    async def request(
+        self, method: str, url: str, cookies: dict[str, str] | None = None, **kwargs: Any
+    ) -> httpx.Response:
+        response = await self.client.request(method, url, headers=self._headers(cookies), **kwargs)
+        return self._update(response) if cookies is None else response
+
+
+type Grant = Callable[[str], Awaitable[None]]
+
+
+async def virtual_user(number: int, scenario: Scenario, session: Session, recorder: Recorder, grant: Grant) -> None:
+    login = f"bench-{uuid.uuid4().hex[:12]}-{number}"
+    password = uuid.uuid4().hex
+    banned = random.Random(scenario.seed + number).random() < scenario.ban_ratio
+
+    account = {"login": login, "password": password}
+
+    # A user that could not register or log in, e.g. shed by admission control, has nothing left to do
+    if (await recorder.call("register", session.request("POST", "/auth/register", json=account))).is_error:
+        return
+    await grant(login)
+    if (await recorder.call("login", session.request("POST", "/auth/login", json=account))).is_error:
+        return
+
+    if banned:
+        revoked = dict(session.cookies)
+        await asyncio.sleep(BAN_DELAY)
+        await recorder.call("logout_all", session.request("GET", "/auth/logout_all"))
+        for _ in range(scenario.checkouts_per_user):
+            await recorder.call(
+                "checkout_access[banned]",
+                session.request("GET", "/auth/checkout_access", cookies=revoked),
+                httpx.codes.UNAUTHORIZED,
+            )
+        return
+
+    for _ in range(scenario.checkouts_per_user):
+        await recorder.call("checkout_access", session.request("GET", "/auth/checkout_access"))
+
+    await recorder.call("refresh", session.request("GET", "/auth/refresh"))
+    logged_out = dict(session.cookies)
+    await recorder.call("logout", session.request("GET", "/auth/logout"))
+    await recorder.call(
+        "checkout_access[logged_out]",
+        session.request("GET", "/auth/checkout_access", cookies=logged_out),
+        httpx.codes.UNAUTHORIZED,
+    )
+
+
+@dataclass(slots=True, frozen=True)
+class Target:
+    transport: httpx.AsyncBaseTransport
+    grant: Grant
+    base_url: str = "http://auth"
+
+
+@asynccontextmanager
+async def memory_target(scenario: Scenario) -> AsyncIterator[Target]:
+    from bench.stubs import MemoryRedis
+    from bench.stubs import MemoryStore
+    from bench.stubs import memory_overrides
+    from src import lifecycle
+    from src.core.config import configs
+    from src.db import redis_db
+    from src.main import app as fastapi_app
+    from src.services.auto_pipeline import AutoPipeline
+
+    store = MemoryStore()
+    redis = MemoryRedis()
+    permissions = store.seed_permissions(scenario.permissions_per_user)
+
+    async def grant(login: str) -> None:  # noqa: RUF029
+        store.grant(login, permissions)
+
+    # What `lifespan` wires up for requests, on the stand-ins
+    redis_db.redis = redis  # pyright: ignore[reportAttributeAccessIssue]
+    if configs.redis_auto_pipeline:
+        redis_db.pipeline = AutoPipeline(redis, configs.redis_auto_pipeline_max_batch)  # pyright: ignore[reportArgumentType]
+    fastapi_app.dependency_overrides.update(memory_overrides(store, redis))
+    try:
+        await lifecycle.warmup_code_paths()
+        yield Target(httpx.ASGITransport(app=fastapi_app), grant)
+    finally:
+        fastapi_app.dependency_overrides.clear()
+        redis_db.redis = redis_db.pipeline = None
+
+
+async def database_grant(scenario: Scenario) -> Grant:
+    """Grants the seeded permissions straight in Postgres: setup work that must not show up in the timings"""
+    from sqlalchemy import insert
+    from sqlalchemy import select
+
+    from src.db.postgres_db import async_session
+    from src.models.alchemy_model import PermissionOrm
+    from src.models.alchemy_model import UserOrm
+    from src.models.alchemy_model import user_permission
+
+    names = [f"bench_{number}" for number in range(scenario.permissions_per_user)]
+    async with async_session() as session:
+        existing = set((await session.scalars(select(PermissionOrm.name).where(PermissionOrm.name.in_(names)))).all())
+        session.add_all(PermissionOrm(name=name) for name in names if name not in existing)
+        await session.commit()
+        permission_ids = list(
+            (await session.scalars(select(PermissionOrm.id).where(PermissionOrm.name.in_(names)))).all()
+        )
+
+    async def grant(login: str) -> None:
+        if not permission_ids:
+            return
+
+        async with async_session() as session:
+            user_id = (await session.scalars(select(UserOrm.id).where(UserOrm.login == login))).one()
+            await session.execute(
+                insert(user_permission),
+                [{"user_id": user_id, "permission_id": permission_id} for permission_id in permission_ids],
+            )
+            await session.commit()
+
+    return grant
+
+
+@asynccontextmanager
+async def local_target(scenario: Scenario) -> AsyncIterator[Target]:
+    from src.main import app as fastapi_app
+
+    async with fastapi_app.router.lifespan_context(fastapi_app):
+        yield Target(httpx.ASGITransport(app=fastapi_app), await database_grant(scenario))
+
+
+@asynccontextmanager
+async def url_target(scenario: Scenario, url: str) -> AsyncIterator[Target]:
+    transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=scenario.concurrency))
+    async with transport:
+        yield Target(transport, await database_grant(scenario), url)
+
+
+async def run_scenario(scenario: Scenario, mode: AppMode, url: str | None) -> dict[str, Any]:
+    recorder = Recorder()
+    semaphore = asyncio.Semaphore(scenario.concurrency)
+
+    async def drive(number: int, client: httpx.AsyncClient, grant: Grant) -> None:
+        async with semaphore:
+            await virtual_user(number, scenario, Session(client), recorder, grant)
+
+    if url is not None:
+        context = url_target(scenario, url)
+    elif mode is AppMode.memory:
+        context = memory_target(scenario)
+    else:
+        context = local_target(scenario)
+
+    async with (
+        context as target,
+        httpx.AsyncClient(transport=target.transport, base_url=target.base_url, timeout=REQUEST_TIMEOUT) as client,
+    ):
+        started = time.perf_counter()
+        await asyncio.gather(*(drive(number, client, target.grant) for number in range(scenario.users)))
+        elapsed = time.perf_counter() - started
+
+    return recorder.report(elapsed)
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(  # noqa: S603
+            ["git", "rev-parse", "--short", "HEAD"],  # noqa: S607
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@app.command()
+def run(
+    scenario_path: Annotated[Path, Argument(help="JSON scenario file")],
+    mode: Annotated[AppMode, Option("--app", help="In-process app backed by stand-ins or by local Postgres/Redis")] = (
+        AppMode.memory
+    ),
+    url: Annotated[str | None, Option(help="Drive an already running instance instead of an in-process app")] = None,
+    output: Annotated[Path | None, Option(help="Where to write the JSON report")] = None,
+) -> None:
+    prepare_environment()
+    scenario = Scenario.load(scenario_path)
+    result = asyncio.run(run_scenario(scenario, mode, url))
+    report = {
+        "revision": git_revision(),
+        "timestamp": datetime.now(UTC).isoformat(),
+        "target": url or mode.value,
+        "scenario": asdict(scenario),
+        **result,
+    }
+
+    for endpoint, stats in report["endpoints"].items():
+        print(
+            f"{endpoint:<26} n={stats['count']:<7} err={stats['errors']:<5} rps={stats['rps']:<9.1f} "
+            f"p50={stats['p50_ms']:.2f}ms p95={stats['p95_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms"
+        )
+    print(f"total: {report['requests']} requests in {report['elapsed_s']:.2f}s, {report['rps']:.1f} rps")
+
+    if output is not None:
+        output.write_text(json.dumps(report, indent=2))
+
+
+@app.command()
+def compare(
+    before: Annotated[Path, Argument(help="Baseline report")], after: Annotated[Path, Argument(help="New report")]
+) -> None:
+    old = json.loads(before.read_text())
+    new = json.loads(after.read_text())
+    print(f"{old['revision']} -> {new['revision']}")
+    for endpoint, stats in new["endpoints"].items():
+        if (base := old["endpoints"].get(endpoint)) is None:
+            continue
+
+        changes = " ".join(
+            f"{metric}={base[metric]:.2f}->{stats[metric]:.2f} ({(stats[metric] / base[metric] - 1) * 100:+.1f}%)"
+            for metric in ("rps", "p50_ms", "p95_ms", "p99_ms")
+            if base[metric]
+        )
+        print(f"{endpoint:<26} {changes}")
+
+
+if __name__ == "__main__":
+    app()
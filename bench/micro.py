@@ -0,0 +1,393 @@
+"""Micro-benchmarks for the functions every request goes through
+
+Each benchmark is calibrated to run for about `--min-time` seconds per repeat, after a warmup.
+Reported are the mean and standard deviation of ns/op across repeats, and the allocation
+profile of a single call measured with `tracemalloc`: the peak of memory allocated while
+the call runs and the number of blocks it leaves behind. Before the `jwt_engine` benchmarks
+run, PyJWT and the built-in HS256 engine must agree on a signed token, one without `nbf` and
+one whose `nbf` is in the future.
+
+    python -m bench.micro run --output before.json
+    python -m bench.micro run --filter payload
+    python -m bench.micro run --filter jwt_engine
+    python -m bench.micro compare before.json after.json
+"""
+
+import asyncio
+import gc
+import json
+import statistics
+import time
+import tracemalloc
+import uuid
+from collections.abc import Callable
+from collections.abc import Iterator
+from dataclasses import asdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Annotated
+from typing import Any
+
+from typer import Argument
+from typer import Exit
+from typer import Option
+from typer import Typer
+
+from bench.environment import prepare_environment
+
+
+app = Typer()
+
+type Operation = Callable[[], Any]
+
+
+@dataclass(slots=True, frozen=True)
+class Benchmark:
+    name: str
+    operation: Operation
+    is_async: bool = False
+
+
+@dataclass(slots=True, frozen=True)
+class Result:
+    name: str
+    loops: int
+    ns_per_op: float
+    ns_stdev: float
+    peak_bytes_per_op: int
+    retained_blocks_per_op: float
+
+
+class Runner:
+    def __init__(self, min_time: float, repeats: int) -> None:
+        self.min_time = min_time
+        self.repeats = repeats
+        self.loop = asyncio.new_event_loop()
+
+    def _timer(self, benchmark: Benchmark) -> Callable[[int], float]:
+        operation = benchmark.operation
+        if not benchmark.is_async:
+
+            def run_sync(loops: int) -> float:
+                started = time.perf_counter_ns()
+                for _ in range(loops):
+                    operation()
+                return time.perf_counter_ns() - started
+
+            return run_sync
+
+        async def many(loops: int) -> int:
+            started = time.perf_counter_ns()
+            for _ in range(loops):
+                await operation()
+            return time.perf_counter_ns() - started
+
+        return lambda loops: self.loop.run_until_complete(many(loops))
+
+    def _call_once(self, benchmark: Benchmark) -> None:
+        result = benchmark.operation()
+        if benchmark.is_async:
+            self.loop.run_until_complete(result)
+
+    def _calibrate(self, timer: Callable[[int], float]) -> int:
+        loops = 1
+        while (elapsed := timer(loops)) < self.min_time * 1e9 / 10:
+            loops *= 10
+
+        return max(1, int(loops * self.min_time * 1e9 / max(elapsed, 1)))
+
+    def _allocations(self, benchmark: Benchmark, calls: int = 100) -> tuple[int, float]:
+        peaks: list[int] = []
+        tracemalloc.start()
+        try:
+            blocks_before = len(tracemalloc.take_snapshot().traces)
+            for _ in range(calls):
+                current, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                self._call_once(benchmark)
+                peaks.append(tracemalloc.get_traced_memory()[1] - current)
+            blocks_after = len(tracemalloc.take_snapshot().traces)
+        finally:
+            tracemalloc.stop()
+
+        return int(statistics.median(peaks)), (blocks_after - blocks_before) / calls
+
+    def run(self, benchmark: Benchmark) -> Result:
+        timer = self._timer(benchmark)
+        self._call_once(benchmark)
+        loops = self._calibrate(timer)
+
+        gc.collect()
+        gc.disable()
+        try:
+            samples = [timer(loops) / loops for _ in range(self.repeats)]
+        finally:
+            gc.enable()
+
+        peak, retained = self._allocations(benchmark)
+        return Result(
+            name=benchmark.name,
+            loops=loops,
+            ns_per_op=statistics.fmean(samples),
+            ns_stdev=statistics.stdev(samples) if len(samples) > 1 else 0.0,
+            peak_bytes_per_op=peak,
+            retained_blocks_per_op=retained,
+        )
+
+
+@dataclass(slots=True, frozen=True)
+class Tokens:
+    """A signed access/refresh pair and the access token's claims, shared by the benchmarks"""
+
+    access: str
+    refresh: str
+    raw_access: dict[str, Any]
+
+
+def tokens() -> Tokens:
+    from src.core.config import JWTConfig
+    from src.core.config import jwt_config
+    from src.custom_auth_jwt import CustomAuthJWT
+
+    @CustomAuthJWT.load_config
+    def _() -> JWTConfig:  # pyright: ignore[reportUnusedFunction]
+        return jwt_config
+
+    async def sign() -> Tokens:
+        authorize = CustomAuthJWT()
+        subject = str(uuid.uuid4())
+        claims = {"permissions": [str(uuid.uuid4()) for _ in range(5)]}
+        access = await authorize.create_access_token(subject=subject, user_claims=claims)
+        refresh = await authorize.create_refresh_token(subject=subject, user_claims=claims)
+        raw_access = await authorize.get_raw_jwt(access)
+        assert raw_access is not None
+        return Tokens(access, refresh, raw_access)
+
+    return asyncio.run(sign())
+
+
+def request_path_benchmarks(signed: Tokens) -> Iterator[Benchmark]:
+    from pickle import HIGHEST_PROTOCOL as PICKLE_HIGHEST_PROTOCOL  # noqa: S403
+    from pickle import dumps as pickle_dumps  # noqa: S403
+    from pickle import loads as pickle_loads  # noqa: S403
+
+    from bench.stubs import MemoryRedis
+    from src.core.config import configs
+    from src.custom_auth_jwt import CustomAuthJWT
+    from src.models.jwt import Payload
+    from src.services.circuit_breaker import CircuitBreaker
+    from src.services.jwt_service import JWTService
+    from src.services.recent_values import RecentValues
+    from src.services.redis_service import Key
+    from src.services.redis_service import RedisService
+    from src.services.revocation_service import RevocationLayout
+    from src.services.revocation_service import RevocationService
+    from src.services.revocation_service import legacy_key
+
+    authorize = CustomAuthJWT()
+    payload = Payload.model_validate(signed.raw_access)
+    banned_payload = payload.model_copy(update={"jti": uuid.uuid4()})
+    redis = MemoryRedis()
+    banned_key = str(legacy_key("access", banned_payload.user_id, banned_payload.jti))
+    redis.data[banned_key] = (pickle_dumps((banned_payload.jti,), protocol=PICKLE_HIGHEST_PROTOCOL), None)
+    breaker = CircuitBreaker(configs.redis_breaker_failures, configs.redis_breaker_reset_timeout)
+    service = RedisService(redis, breaker, RecentValues(configs.redis_recent_size))  # pyright: ignore[reportArgumentType]
+    jwt_service = JWTService(service, RevocationService(service, RevocationLayout.keys, legacy_reads=False))
+    key = Key("access_banned", payload.user_id, payload.jti)
+    pickled = pickle_dumps((payload.jti,), protocol=PICKLE_HIGHEST_PROTOCOL)
+
+    yield Benchmark("jwt_service.check_banned[clean]", lambda: jwt_service.check_banned(payload), is_async=True)
+    yield Benchmark("jwt_service.check_banned[banned]", lambda: jwt_service.check_banned(banned_payload), is_async=True)
+    yield Benchmark("payload.model_validate", lambda: Payload.model_validate(signed.raw_access))
+    yield Benchmark("key.__str__", lambda: str(key))
+    yield Benchmark(
+        "redis_service.pickle_dumps", lambda: pickle_dumps((payload.jti,), protocol=PICKLE_HIGHEST_PROTOCOL)
+    )
+    yield Benchmark("redis_service.pickle_loads", lambda: pickle_loads(pickled)[0])  # noqa: S301
+    yield Benchmark("custom_auth_jwt.get_payload", lambda: authorize.get_payload(signed.access), is_async=True)
+
+
+def response_benchmarks(signed: Tokens) -> Iterator[Benchmark]:
+    from async_fastapi_jwt_auth.auth_jwt import AuthJWT
+    from fastapi import Response
+    from fastapi.responses import JSONResponse
+    from fastapi.responses import ORJSONResponse
+
+    from src.core.config import jwt_config
+    from src.custom_auth_jwt import CustomAuthJWT
+    from src.models.cookie import Cookie
+    from src.models.errors import ErrorBody
+
+    authorize = CustomAuthJWT()
+    access_expires = jwt_config.authjwt_access_token_expires
+    refresh_expires = jwt_config.authjwt_refresh_token_expires
+
+    async def set_login_cookies() -> None:
+        response = Response()
+        await authorize.set_access_cookies(signed.access, response, access_expires)
+        await authorize.set_refresh_cookies(signed.refresh, response, refresh_expires)
+
+    async def set_login_cookies_through_models() -> None:
+        """Cookie writing of a login as it was before the templated cookies, kept as the reference point"""
+        response = Response()
+        await AuthJWT.set_access_cookies(authorize, signed.access, response, access_expires)
+        exp = (await authorize.get_payload(signed.access)).exp
+        response.set_cookie(
+            **Cookie(key="access_expire", value=str(exp), samesite=None, max_age=access_expires).model_dump()
+        )
+        await AuthJWT.set_refresh_cookies(authorize, signed.refresh, response, refresh_expires)
+        exp = (await authorize.get_payload(signed.refresh)).exp
+        response.set_cookie(
+            **Cookie(key="refresh_expire", value=str(exp), samesite=None, max_age=refresh_expires).model_dump()
+        )
+
+    yield Benchmark(
+        "cookie.model_dump",
+        lambda: Cookie(key="access_expire", value="1700000000", samesite=None, max_age=900).model_dump(),
+    )
+    yield Benchmark("custom_auth_jwt.set_login_cookies", set_login_cookies, is_async=True)
+    yield Benchmark("custom_auth_jwt.set_login_cookies[models]", set_login_cookies_through_models, is_async=True)
+    yield Benchmark("error_response.orjson", lambda: ORJSONResponse(status_code=401, content={"detail": "banned"}))
+    yield Benchmark(
+        "error_response.json[models]",
+        lambda: JSONResponse(status_code=401, content=ErrorBody(detail="banned").model_dump()),
+    )
+
+
+def jwt_engine_benchmarks(signed: Tokens) -> Iterator[Benchmark]:
+    from async_fastapi_jwt_auth.exceptions import JWTDecodeError
+    from starlette.requests import Request
+
+    from src.custom_auth_jwt import CustomAuthJWT
+    from src.services.hs256_engine import HS256Engine
+
+    class LibraryAuthJWT(CustomAuthJWT):
+        @classmethod
+        def _engine(cls) -> HS256Engine | None:
+            return None
+
+    class BuiltinAuthJWT(CustomAuthJWT):
+        @classmethod
+        def _engine(cls) -> HS256Engine | None:
+            if cls._hs256 is None:
+                cls._hs256 = HS256Engine(cls._secret_key)  # pyright: ignore[reportUnknownMemberType, reportUnknownArgumentType]
+            return cls._hs256
+
+    claims = {"permissions": [str(uuid.uuid4()) for _ in range(5)]}
+    subject = str(uuid.uuid4())
+    engine = BuiltinAuthJWT._engine()
+    assert engine is not None
+    now = int(time.time())
+    issued = {"sub": subject, "iat": now, "jti": str(uuid.uuid4()), "exp": now + 600, "type": "access", **claims}
+    cases = {
+        "signed": signed.access,
+        "nbf_in_future": engine.encode({**issued, "nbf": now + 600}),
+        "no_nbf": engine.encode(issued),
+    }
+
+    async def outcome(auth_jwt: type[CustomAuthJWT], token: str) -> str:
+        try:
+            # The claims as the library's own checks read them, and the payload the routes build
+            await auth_jwt().get_raw_jwt(token)
+            await auth_jwt().get_payload(token)
+        except JWTDecodeError as error:
+            return f"rejected: {error.message}"
+        return "accepted"
+
+    async def mismatches() -> list[str]:
+        """Cases the engines disagree on: both must accept a token, or reject it with the same message"""
+        found: list[str] = []
+        for case, token in cases.items():
+            library, builtin = await outcome(LibraryAuthJWT, token), await outcome(BuiltinAuthJWT, token)
+            if library != builtin:
+                found.append(f"{case}: pyjwt {library}, hs256 {builtin}")
+        return found
+
+    if found := asyncio.run(mismatches()):
+        for mismatch in found:
+            print(f"MISMATCH jwt_engine {mismatch}")
+        raise Exit(1)
+
+    scope = {"type": "http", "headers": [(b"cookie", f"access_token_cookie={signed.access}".encode())]}
+
+    for name, auth_jwt in (("pyjwt", LibraryAuthJWT), ("hs256", BuiltinAuthJWT)):
+        authorize = auth_jwt()
+
+        async def verify(auth_jwt: type[CustomAuthJWT] = auth_jwt) -> None:
+            """What a protected route does: read the cookie, verify the token, build the payload"""
+            authorize = auth_jwt(Request(scope))
+            await authorize.jwt_required()
+            await authorize.get_payload()
+
+        yield Benchmark(
+            f"jwt_engine.sign[{name}]",
+            lambda authorize=authorize: authorize.create_access_token(subject=subject, user_claims=claims),
+            is_async=True,
+        )
+        yield Benchmark(f"jwt_engine.verify[{name}]", verify, is_async=True)
+
+
+def password_benchmarks() -> Iterator[Benchmark]:
+    from src.core.config import configs
+    from src.services.password_service import PasswordService
+
+    password_service = PasswordService()
+    for iters in sorted({1_000, 10_000, 100_000, configs.iters_password}):
+        yield Benchmark(
+            f"password_service.compute_hash[iters={iters}]",
+            lambda iters=iters: password_service.compute_hash("password", iters=iters),
+            is_async=True,
+        )
+
+
+def benchmarks() -> Iterator[Benchmark]:
+    signed = tokens()
+    yield from request_path_benchmarks(signed)
+    yield from response_benchmarks(signed)
+    yield from jwt_engine_benchmarks(signed)
+    yield from password_benchmarks()
+
+
+@app.command()
+def run(
+    filter_: Annotated[str | None, Option("--filter", help="Run only benchmarks whose name contains this")] = None,
+    min_time: Annotated[float, Option(help="Seconds per repeat")] = 0.2,
+    repeats: Annotated[int, Option(help="Timed repeats per benchmark")] = 5,
+    output: Annotated[Path | None, Option(help="Where to write the JSON report")] = None,
+) -> None:
+    prepare_environment()
+    runner = Runner(min_time, repeats)
+    results: list[Result] = []
+    for benchmark in benchmarks():
+        if filter_ is not None and filter_ not in benchmark.name:
+            continue
+
+        result = runner.run(benchmark)
+        results.append(result)
+        print(
+            f"{result.name:<48} {result.ns_per_op:>14,.0f} ns/op ± {result.ns_stdev:>10,.0f} "
+            f"{result.peak_bytes_per_op:>9,} B peak {result.retained_blocks_per_op:>7.2f} blocks retained"
+        )
+
+    if output is not None:
+        output.write_text(json.dumps([asdict(result) for result in results], indent=2))
+
+
+@app.command()
+def compare(
+    before: Annotated[Path, Argument(help="Baseline report")], after: Annotated[Path, Argument(help="New report")]
+) -> None:
+    old = {result["name"]: result for result in json.loads(before.read_text())}
+    for result in json.loads(after.read_text()):
+        if (base := old.get(result["name"])) is None:
+            continue
+
+        change = (result["ns_per_op"] / base["ns_per_op"] - 1) * 100
+        print(
+            f"{result['name']:<48} {base['ns_per_op']:>12,.0f} -> {result['ns_per_op']:>12,.0f} ns/op ({change:+.1f}%) "
+            f"{base['peak_bytes_per_op']:>8,} -> {result['peak_bytes_per_op']:>8,} B peak"
+        )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,346 @@
+"""Query-plan regression checks for the statements the services issue
+
+`seed` fills a migrated, empty Postgres with users, permissions and grants at a realistic
+scale. `run` drives the real services against it, records every statement they send,
+replays each under `EXPLAIN (ANALYZE, BUFFERS)` in a rolled back transaction and exits
+with a non-zero status when a plan scans a table sequentially past `--seq-scan-rows` rows,
+or a node is estimated above `--max-estimate` rows outside a `LIMIT`. Reads meant to take
+everything, the permission catalog and the export, are reported but not checked. The run
+writes a user and a permission of its own, so point it at a scratch database.
+
+    alembic upgrade head
+    python -m bench.query_plans seed --users 1000000
+    python -m bench.query_plans run --output plans.json
+"""
+
+import asyncio
+import json
+import random
+import uuid
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Iterator
+from contextlib import aclosing
+from contextvars import ContextVar
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Annotated
+from typing import Any
+
+import typer
+from sqlalchemy.ext.asyncio import AsyncSession
+from typer import Option
+from typer import Typer
+
+from bench.environment import prepare_environment
+
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from src.services.permission_management_service import PermissionManagementService
+    from src.services.redis_service import RedisService
+    from src.services.user_service import UserService
+
+
+app = Typer()
+
+EXPLAINED_VERBS = ("SELECT", "WITH", "UPDATE", "DELETE")
+
+SEED_STATEMENTS = (
+    """
+    INSERT INTO permission (id, name, description, created_at, modified_at)
+    SELECT gen_random_uuid(), 'permission_' || lpad(n::text, 6, '0'), 'seeded', now(), now()
+    FROM generate_series(1, :permissions) AS n
+    """,
+    """
+    INSERT INTO "user" (id, login, is_deleted, created_at, modified_at, hash_name, iters, salt, password_hash)
+    SELECT gen_random_uuid(), 'user_' || lpad(n::text, 9, '0'), n % :deleted_every = 0, now(), now(),
+        'sha256', 1, 'salt', 'hash'
+    FROM generate_series(1, :users) AS n
+    """,
+    """
+    WITH numbered AS (SELECT id, row_number() OVER (ORDER BY id) - 1 AS n FROM permission)
+    INSERT INTO user_permission (user_id, permission_id)
+    SELECT DISTINCT u.id, numbered.id
+    FROM "user" AS u
+    CROSS JOIN generate_series(1, :per_user) AS k
+    JOIN numbered ON numbered.n = abs(hashtext(u.id::text || k::text)) % :permissions
+    """,
+)
+
+
+@dataclass(slots=True)
+class Statement:
+    label: str
+    sql: str
+    parameters: Any
+    full_read: bool
+    plan: dict[str, Any] = field(default_factory=dict)
+    violations: list[str] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class Recorder:
+    statements: dict[tuple[str, str], Statement] = field(default_factory=dict)
+    current: ContextVar[tuple[str, bool] | None] = field(default_factory=lambda: ContextVar("label", default=None))
+
+    def listen(self, _conn: Any, _cursor: Any, sql: str, parameters: Any, _context: Any, executemany: bool) -> None:
+        if (current := self.current.get()) is None or not sql.lstrip().upper().startswith(EXPLAINED_VERBS):
+            return
+
+        label, full_read = current
+        first = parameters[0] if executemany and parameters else parameters
+        self.statements.setdefault((label, sql), Statement(label, sql, first, full_read))
+
+    async def scenario(self, label: str, call: Callable[[], Awaitable[Any]], *, full_read: bool = False) -> None:
+        token = self.current.set((label, full_read))
+        try:
+            await call()
+        finally:
+            self.current.reset(token)
+
+
+def inspect(node: dict[str, Any], seq_scan_rows: int, max_estimate: int, *, limited: bool = False) -> Iterator[str]:
+    loops = node.get("Actual Loops", 1)
+    read = (node.get("Actual Rows", 0) + node.get("Rows Removed by Filter", 0)) * loops
+    if node["Node Type"] == "Seq Scan" and read > seq_scan_rows:
+        yield f"seq scan on {node['Relation Name']} read {read} rows"
+    if not limited and node["Plan Rows"] > max_estimate:
+        yield f"{node['Node Type']} estimated at {node['Plan Rows']} rows"
+
+    limited = limited or node["Node Type"] == "Limit"
+    for child in node.get("Plans", []):
+        yield from inspect(child, seq_scan_rows, max_estimate, limited=limited)
+
+
+class Services:
+    """Services on sessions and empty caches of their own, so that every call goes to the database"""
+
+    def __init__(self) -> None:
+        from src.core.config import configs
+        from src.services.circuit_breaker import CircuitBreaker
+        from src.services.password_service import get_password_service
+
+        self.breaker = CircuitBreaker(configs.redis_breaker_failures, configs.redis_breaker_reset_timeout)
+        self.password = get_password_service()
+        self.opened: list[AsyncSession] = []
+
+    def redis(self) -> "RedisService":
+        from bench.stubs import MemoryRedis
+        from src.core.config import configs
+        from src.services.recent_values import RecentValues
+        from src.services.redis_service import RedisService
+
+        return RedisService(MemoryRedis(), self.breaker, RecentValues(configs.redis_recent_size))  # pyright: ignore[reportArgumentType]
+
+    def session(self) -> "AsyncSession":
+        from src.db.postgres_db import async_session
+
+        self.opened.append(async_session())
+        return self.opened[-1]
+
+    def users(self) -> "UserService":
+        from src.core.config import configs
+        from src.services.login_filter import LoginFilter
+        from src.services.projection_cache import ProjectionCache
+        from src.services.user_service import UserService
+
+        session = self.session()
+        logins = LoginFilter(self.redis(), configs.login_filter_counters, configs.login_filter_hashes)
+        return UserService(session, self.password, ProjectionCache(self.redis()), logins, session)
+
+    def permissions(self) -> "PermissionManagementService":
+        from src.services.permission_management_service import PermissionManagementService
+        from src.services.projection_cache import ProjectionCache
+        from src.services.revocation_service import RevocationLayout
+        from src.services.revocation_service import RevocationService
+
+        revocations = RevocationService(self.redis(), RevocationLayout.keys, legacy_reads=False)
+        return PermissionManagementService(revocations, ProjectionCache(self.redis()), self.session())
+
+    async def close(self) -> None:
+        for session in self.opened:
+            await session.close()
+
+
+async def sample() -> tuple[Any, Any]:
+    from sqlalchemy import text
+
+    from src.db.postgres_db import async_session
+
+    async with async_session() as session:
+        stmt_user = text('SELECT id, login FROM "user" WHERE NOT is_deleted LIMIT 1 OFFSET :offset')
+        user = (await session.execute(stmt_user, {"offset": random.randrange(1000)})).one()
+        permission = (await session.execute(text("SELECT id, name FROM permission LIMIT 1"))).one()
+
+    return user, permission
+
+
+async def drive(recorder: Recorder) -> None:
+    from src.api.models.access_control import ChangePermissionModel
+    from src.api.models.access_control import CreatePermissionModel
+    from src.api.models.access_control import PageModel
+    from src.api.models.access_control import SearchPermissionModel
+    from src.api.models.access_control import UserModel
+    from src.api.models.auth import AccountModel
+    from src.api.models.users import UserFilterModel
+    from src.api.models.users import UsersPageQueryModel
+    from src.services.user_service import UserService
+
+    user, permission = await sample()
+    login_prefix = user.login[: len(user.login) - 3]
+    account = AccountModel(login=f"plans_{uuid.uuid4().hex[:12]}", password=uuid.uuid4().hex)
+    new_permission = CreatePermissionModel(name=f"plans_{uuid.uuid4().hex[:12]}")
+    services = Services()
+    users, permissions = services.users, services.permissions
+
+    async def export(filter_: UserFilterModel) -> None:
+        async with aclosing(UserService.export(filter_)) as chunks:
+            async for _ in chunks:
+                break
+
+    steps: list[tuple[str, Callable[[], Awaitable[Any]], bool]] = [
+        ("user.get_user", lambda: users().get_user(user.login), False),
+        ("user.get_user_by_id", lambda: users().get_user_by_id(user.id), False),
+        ("user.get_projection", lambda: users().get_projection(user.id), False),
+        ("user.get_page", lambda: users().get_page(UsersPageQueryModel()), False),
+        ("user.get_page[after]", lambda: users().get_page(UsersPageQueryModel(after=user.login)), False),
+        ("user.get_page[prefix]", lambda: users().get_page(UsersPageQueryModel(login_prefix=login_prefix)), False),
+        ("user.get_page[deleted]", lambda: users().get_page(UsersPageQueryModel(is_deleted=True)), False),
+        ("user.get_page[permission]", lambda: users().get_page(UsersPageQueryModel(permission=permission.id)), False),
+        ("user.export", lambda: export(UserFilterModel()), True),
+        ("user.create_user", lambda: users().create_user(account), False),
+        ("permission.get_all", lambda: permissions().get_all(), True),
+        ("permission.get_page", lambda: permissions().get_page(PageModel(after=permission.name)), False),
+        ("permission.get_user_permissions", lambda: permissions().get_user_permissions(UserModel(id=user.id)), False),
+        ("permission.create", lambda: permissions().create(new_permission), False),
+        (
+            "permission.assign",
+            lambda: permissions().assign(
+                SearchPermissionModel(name=new_permission.name), UserModel(login=account.login)
+            ),
+            False,
+        ),
+        (
+            "permission.take_away",
+            lambda: permissions().take_away(
+                SearchPermissionModel(name=new_permission.name), UserModel(login=account.login)
+            ),
+            False,
+        ),
+        (
+            "permission.update",
+            lambda: permissions().update(
+                SearchPermissionModel(id=permission.id), ChangePermissionModel(description="seeded")
+            ),
+            False,
+        ),
+        ("permission.delete", lambda: permissions().delete(SearchPermissionModel(name=new_permission.name)), False),
+    ]
+    try:
+        for label, call, full_read in steps:
+            await recorder.scenario(label, call, full_read=full_read)
+
+        created = await users().get_user(account.login)
+        assert created is not None
+        projection = await users().get_projection(created.id)
+        assert projection is not None
+        await recorder.scenario("user.delete_user", lambda: users().delete_user(projection))
+    finally:
+        await services.close()
+
+
+async def explain(recorder: Recorder, seq_scan_rows: int, max_estimate: int) -> None:
+    from src.db.postgres_db import engine
+
+    async with engine.connect() as connection:
+        for statement in recorder.statements.values():
+            transaction = await connection.begin()
+            try:
+                result = await connection.exec_driver_sql(
+                    f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement.sql}", statement.parameters
+                )
+                statement.plan = result.scalar_one()[0]
+            finally:
+                await transaction.rollback()
+
+            if not statement.full_read:
+                statement.violations = list(inspect(statement.plan["Plan"], seq_scan_rows, max_estimate))
+
+
+async def plans(seq_scan_rows: int, max_estimate: int) -> Recorder:
+    from sqlalchemy import event
+
+    from src.db.postgres_db import engine
+
+    recorder = Recorder()
+    event.listen(engine.sync_engine, "before_cursor_execute", recorder.listen)
+    try:
+        await drive(recorder)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", recorder.listen)
+
+    await explain(recorder, seq_scan_rows, max_estimate)
+    await engine.dispose()
+    return recorder
+
+
+async def fill(users: int, permissions: int, per_user: int, deleted_every: int) -> None:
+    from sqlalchemy import text
+
+    from src.db.postgres_db import engine
+
+    parameters = {"users": users, "permissions": permissions, "per_user": per_user, "deleted_every": deleted_every}
+    async with engine.begin() as connection:
+        for sql in SEED_STATEMENTS:
+            await connection.execute(text(sql), parameters)
+        await connection.execute(text("ANALYZE"))
+
+    await engine.dispose()
+
+
+@app.command()
+def seed(
+    users: Annotated[int, Option(help="Users to create")] = 1_000_000,
+    permissions: Annotated[int, Option(help="Permissions to create")] = 200,
+    per_user: Annotated[int, Option(help="Permissions granted to every user")] = 3,
+    deleted_every: Annotated[int, Option(help="Every n-th user is marked deleted")] = 20,
+) -> None:
+    prepare_environment()
+    asyncio.run(fill(users, permissions, per_user, deleted_every))
+
+
+@app.command()
+def run(
+    seq_scan_rows: Annotated[int, Option(help="Rows a sequential scan may read")] = 1000,
+    max_estimate: Annotated[int, Option(help="Rows a plan node may be estimated at outside a LIMIT")] = 50_000,
+    output: Annotated[Path | None, Option(help="Write the statements and their plans as JSON")] = None,
+) -> None:
+    prepare_environment()
+    recorder = asyncio.run(plans(seq_scan_rows, max_estimate))
+    statements = list(recorder.statements.values())
+    for statement in statements:
+        plan = statement.plan
+        top = plan["Plan"]
+        print(
+            f"{statement.label:<34} {plan['Execution Time']:>9.2f}ms "
+            f"rows={top['Actual Rows']:<7} hit={top.get('Shared Hit Blocks', 0):<7} "
+            f"read={top.get('Shared Read Blocks', 0):<7}{' (full read)' if statement.full_read else ''}"
+        )
+        for violation in statement.violations:
+            print(f"    VIOLATION {violation}")
+            print(f"    {' '.join(statement.sql.split())}")
+
+    if output is not None:
+        output.write_text(json.dumps([asdict(statement) for statement in statements], indent=2, default=str))
+
+    if any(statement.violations for statement in statements):
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,165 @@
+"""Checks the revocation keys against a Redis Cluster
+
+For `--users` users it checks that every revocation key of a user lands in one slot, revokes
+a token per user in each `--layout` and expects `JWTService.check_banned` to reject it and
+accept a fresh one, then raises every watermark with a single `pipe_set` and checks they all
+took. It does all of that twice, with every command sent on its own and through the
+auto-pipeline, and also asks the login filter and drops projections in several slots with one
+`forget_users`. Exits with a non-zero status on any mismatch. Start a cluster with
+docker-compose.redis-cluster.yaml and run it from inside that network:
+
+    python -m bench.redis_cluster
+    python -m bench.redis_cluster --host redis_node_3 --users 5000
+
+The `hash` layout needs Redis 7.4 or newer.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import Counter
+from typing import TYPE_CHECKING
+from typing import Annotated
+
+import typer
+from redis.exceptions import RedisError
+from typer import Option
+from typer import Typer
+
+from bench.environment import prepare_environment
+
+
+if TYPE_CHECKING:
+    from src.services.redis_service import RedisService
+
+
+app = Typer()
+
+
+async def check_service(
+    service: "RedisService", mode: str, user_ids: list[uuid.UUID], layouts: list[str], violations: Counter[str]
+) -> None:
+    """Revocations, watermarks, the login filter and projection invalidation, through `service`"""
+    from redis.asyncio import RedisCluster
+
+    from src.core.config import configs
+    from src.models.jwt import Payload
+    from src.services.jwt_service import JWTService
+    from src.services.login_filter import LoginFilter
+    from src.services.projection_cache import ProjectionCache
+    from src.services.projection_cache import user_id_key
+    from src.services.projection_cache import user_login_key
+    from src.services.revocation_service import RevocationLayout
+    from src.services.revocation_service import RevocationService
+    from src.services.revocation_service import watermark_key
+
+    client = service.redis
+    assert isinstance(client, RedisCluster)
+    now = int(time.time())
+
+    def payload(user_id: uuid.UUID) -> Payload:
+        return Payload(sub=user_id, iat=now, jti=uuid.uuid4(), exp=now + 600, type="access", permissions=[])  # pyright: ignore[reportCallIssue]
+
+    for layout in map(RevocationLayout, layouts):
+        jwt_service = JWTService(service, RevocationService(service, layout, legacy_reads=True))
+        for user_id in user_ids:
+            revoked, fresh = payload(user_id), payload(user_id)
+            await jwt_service.revocations.revoke(revoked)
+            if not await jwt_service.check_banned(revoked):
+                violations[f"{mode} {layout}: revoked token accepted"] += 1
+            if await jwt_service.check_banned(fresh):
+                violations[f"{mode} {layout}: fresh token rejected"] += 1
+
+    watermarks = {watermark_key("access", user_id): now for user_id in user_ids}
+    shards = {client.get_node_from_key(str(key)).name for key in watermarks}  # pyright: ignore[reportOptionalMemberAccess]
+    await service.pipe_set(watermarks, 60)
+    print(f"{mode} pipe_set: {len(watermarks)} keys over {len(shards)} shards")
+    for key in watermarks:
+        if await service.get(key, None) != now:
+            violations[f"{mode}: pipe_set value missing"] += 1
+    await client.delete(*(str(key) for key in watermarks))
+
+    logins = LoginFilter(service, configs.login_filter_counters, configs.login_filter_hashes)
+    try:
+        await logins.might_exist("cluster")
+    except (RedisError, ValueError) as error:
+        print(f"{mode} login filter: {error!r}")
+        violations[f"{mode}: login filter failed"] += 1
+
+    users = {user_id: f"cluster-{user_id}" for user_id in user_ids}
+    for user_id, login in users.items():
+        await service.set(user_id_key(user_id), user_id, 60)
+        await service.set(user_login_key(login), user_id, 60)
+    await ProjectionCache(service).forget_users(users)
+    for user_id, login in users.items():
+        if await client.exists(str(user_id_key(user_id)), str(user_login_key(login))):
+            violations[f"{mode}: projection left after forget_users"] += 1
+
+
+async def drill(users: int, layouts: list[str]) -> Counter[str]:
+    from redis.asyncio import RedisCluster
+    from redis.crc import key_slot
+
+    from src.core.config import configs
+    from src.db import redis_db
+    from src.services.auto_pipeline import AutoPipeline
+    from src.services.recent_values import RecentValues
+    from src.services.redis_service import RedisService
+    from src.services.revocation_service import compact_key
+    from src.services.revocation_service import hash_key
+    from src.services.revocation_service import legacy_key
+    from src.services.revocation_service import watermark_key
+
+    client = redis_db.connect()
+    assert isinstance(client, RedisCluster)
+    await client.initialize()
+    violations: Counter[str] = Counter()
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    try:
+        for user_id in user_ids:
+            jti = uuid.uuid4()
+            names = (
+                str(watermark_key("access", user_id)).encode(),
+                str(legacy_key("access", user_id, jti)).encode(),
+                compact_key("access", user_id, jti),
+                hash_key("access", user_id),
+            )
+            if len({key_slot(name) for name in names}) != 1:
+                violations["keys of one user in several slots"] += 1
+
+        for mode in ("direct", "auto"):
+            pipeline = AutoPipeline(client, configs.redis_auto_pipeline_max_batch) if mode == "auto" else None
+            # A fresh local store per mode, so that every read is answered by the cluster
+            service = RedisService(client, redis_db.breaker, RecentValues(configs.redis_recent_size), pipeline)
+            await check_service(service, mode, user_ids, layouts, violations)
+    finally:
+        await client.aclose()
+
+    return violations
+
+
+@app.command()
+def run(
+    host: Annotated[str | None, Option(help="Any node of the cluster, REDIS_HOST by default")] = None,
+    port: Annotated[int | None, Option(help="Its port, REDIS_PORT by default")] = None,
+    users: Annotated[int, Option(help="Users to revoke tokens of")] = 1000,
+    layout: Annotated[list[str] | None, Option(help="Revocation layouts to check, all by default")] = None,
+) -> None:
+    prepare_environment()
+    from src.core.config import configs
+    from src.services.revocation_service import RevocationLayout
+
+    configs.redis_cluster = True
+    configs.redis_host = host or configs.redis_host
+    configs.redis_port = port or configs.redis_port
+    violations = asyncio.run(drill(users, layout or [str(item) for item in RevocationLayout]))
+    for violation, count in violations.items():
+        print(f"VIOLATION {violation}: {count}")
+    if violations:
+        raise typer.Exit(1)
+
+    print("ok")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,179 @@
+"""Fault injection for the Redis failure handling around `JWTService.check_banned`
+
+Runs concurrent revocation checks against an in-process Redis stand-in through a sequence
+of phases: healthy, slow, stalled (commands never answer), refusing (connections fail),
+recovering (healthy again, while the circuit breaker waits out `redis_breaker_reset_timeout`)
+and recovered. For every phase it reports the latency distribution and outcomes, and exits
+with a non-zero status when a check outlived the latency budget or the degraded policy
+gave a wrong answer: a revoked token accepted, an answer given under `fail_closed` during
+an outage, or no answer from a healthy Redis once the breaker had time to close.
+
+    python -m bench.redis_outage --policy fail_closed
+    python -m bench.redis_outage --policy fail_open --phase-seconds 5
+"""
+
+import asyncio
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from dataclasses import field
+from typing import TYPE_CHECKING
+from typing import Annotated
+from typing import Literal
+
+import typer
+from typer import Option
+from typer import Typer
+
+from bench.environment import prepare_environment
+from bench.load import percentile
+
+
+if TYPE_CHECKING:
+    from bench.stubs import Fault
+
+
+app = Typer()
+
+
+@dataclass(slots=True)
+class PhaseResult:
+    latencies: list[float] = field(default_factory=list)
+    outcomes: Counter[str] = field(default_factory=Counter)
+    violations: Counter[str] = field(default_factory=Counter)
+
+
+class OutageDrill:
+    def __init__(self, policy: Literal["fail_closed", "fail_open"], concurrency: int, slack: float) -> None:
+        from bench.stubs import FaultyRedis
+        from src.core.config import configs
+        from src.services.circuit_breaker import CircuitBreaker
+        from src.services.jwt_service import JWTService
+        from src.services.recent_values import RecentValues
+        from src.services.redis_service import RedisService
+        from src.services.revocation_service import RevocationLayout
+        from src.services.revocation_service import RevocationService
+
+        configs.redis_degraded_policy = policy
+        self.policy = policy
+        self.concurrency = concurrency
+        self.budget = configs.redis_timeout + slack
+        self.redis = FaultyRedis(latency=configs.redis_timeout / 5)
+        self.breaker = CircuitBreaker(configs.redis_breaker_failures, configs.redis_breaker_reset_timeout)
+        self.service = RedisService(self.redis, self.breaker, RecentValues(configs.redis_recent_size))  # pyright: ignore[reportArgumentType]
+        # The stand-in has no pipelines, so the drill runs on the layout that needs none
+        revocations = RevocationService(self.service, RevocationLayout.keys, legacy_reads=False)
+        self.jwt_service = JWTService(self.service, revocations)
+
+    async def seed(self, tokens: int = 100, revoked_every: int = 4) -> None:
+        from src.models.jwt import Payload
+        from src.services.revocation_service import legacy_key
+
+        now = int(time.time())
+        self.payloads = [
+            Payload(sub=uuid.uuid4(), iat=now, jti=uuid.uuid4(), exp=now + 900, type="access", permissions=[])  # pyright: ignore[reportCallIssue]
+            for _ in range(tokens)
+        ]
+        self.revoked = {payload.jti for payload in self.payloads[::revoked_every]}
+        for payload in self.payloads[::revoked_every]:
+            await self.service.set(legacy_key("access", payload.user_id, payload.jti), payload.jti, 900)
+
+    async def _check(self, index: int, result: PhaseResult, *, outage: bool, strict: bool) -> None:
+        from src.services.custom_error import RedisUnavailableError
+
+        payload = self.payloads[index % len(self.payloads)]
+        started = time.perf_counter()
+        try:
+            banned = await self.jwt_service.check_banned(payload)
+        except RedisUnavailableError:
+            outcome = "unavailable"
+            if strict:
+                result.violations["unavailable while healthy"] += 1
+        else:
+            outcome = "banned" if banned else "clean"
+            if not banned and payload.jti in self.revoked:
+                result.violations["revoked token accepted"] += 1
+            if outage and self.policy == "fail_closed":
+                result.violations["answered while failing closed"] += 1
+
+        elapsed = time.perf_counter() - started
+        result.latencies.append(elapsed)
+        result.outcomes[outcome] += 1
+        if elapsed > self.budget:
+            result.violations["latency budget exceeded"] += 1
+
+    async def run_phase(self, fault: "Fault", seconds: float, *, strict: bool) -> PhaseResult:
+        """`strict` phases have a healthy Redis and a closed breaker, so every check must get an answer"""
+        from bench.stubs import Fault
+
+        self.redis.fault = fault
+        outage = fault in {Fault.stalled, Fault.refusing}
+        result = PhaseResult()
+        deadline = time.monotonic() + seconds
+
+        async def worker(offset: int) -> None:
+            index = offset
+            while time.monotonic() < deadline:
+                await self._check(index, result, outage=outage, strict=strict)
+                index += self.concurrency
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*(worker(offset) for offset in range(self.concurrency)))
+        result.latencies.sort()
+        return result
+
+
+async def run_phases(
+    policy: Literal["fail_closed", "fail_open"], phase_seconds: float, concurrency: int, slack: float
+) -> bool:
+    from bench.stubs import Fault
+    from src.core.config import configs
+
+    drill = OutageDrill(policy, concurrency, slack)
+    await drill.seed()
+    # The breaker opened during the outage lets a probe through `redis_breaker_reset_timeout` after
+    # its last failure at the latest, and the probe takes up to `redis_timeout` to be answered
+    recovery = configs.redis_breaker_reset_timeout + configs.redis_timeout
+    phases = (
+        ("healthy", Fault.healthy, phase_seconds, True),
+        ("slow", Fault.slow, phase_seconds, False),
+        ("stalled", Fault.stalled, phase_seconds, False),
+        ("refusing", Fault.refusing, phase_seconds, False),
+        ("recovering", Fault.healthy, recovery, False),
+        ("recovered", Fault.healthy, phase_seconds, True),
+    )
+    healthy = True
+    for number, (name, fault, seconds, strict) in enumerate(phases):
+        result = await drill.run_phase(fault, seconds, strict=strict)
+        print(
+            f"{number}:{name:<10} n={len(result.latencies):<7} "
+            f"p50={percentile(result.latencies, 50) * 1000:7.2f}ms "
+            f"p99={percentile(result.latencies, 99) * 1000:7.2f}ms "
+            f"max={result.latencies[-1] * 1000:7.2f}ms "
+            f"breaker={drill.breaker.state:<9} {dict(result.outcomes)}"
+        )
+        for violation, count in result.violations.items():
+            print(f"    VIOLATION {violation}: {count}")
+            healthy = False
+
+    return healthy
+
+
+@app.command()
+def run(
+    policy: Annotated[str, Option(help="fail_closed or fail_open")] = "fail_closed",
+    phase_seconds: Annotated[float, Option(help="Duration of every phase")] = 3.0,
+    concurrency: Annotated[int, Option(help="Concurrent checks")] = 200,
+    slack: Annotated[float, Option(help="Seconds allowed above REDIS_TIMEOUT for scheduling")] = 0.05,
+) -> None:
+    if policy not in {"fail_closed", "fail_open"}:
+        raise typer.BadParameter("policy must be fail_closed or fail_open")
+
+    prepare_environment()
+    if not asyncio.run(run_phases(policy, phase_seconds, concurrency, slack)):  # pyright: ignore[reportArgumentType]
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,275 @@
+"""Replays captured traffic against an in-process app or a running instance
+
+With `CAPTURE_ENABLED=true` the service writes the sanitized shape of its requests to rotating
+JSON lines files: arrival time, route, status, the user behind the request and the shape of the
+tokens it presented. The replay creates one account per captured user, granted as many permissions
+as the captured tokens carried most often, and keeps revoked cookies for the users whose tokens
+were rejected. It then sends every request at its captured offset divided by `--speed`, without
+waiting for the earlier ones to answer, so a slow server does not slow the load down with it.
+
+Only `/auth` and `/health` requests are replayed, the others are counted as skipped. Tokens are
+issued at setup, so their ages are not reproduced: `describe` shows the captured ones.
+
+    python -m bench.replay describe ../logs/capture.jsonl*
+    python -m bench.replay run ../logs/capture.jsonl* --speed 4 --app memory --output replay.json
+    python -m bench.replay run ../logs/capture.jsonl* --url http://127.0.0.1:8000
+    python -m bench.load compare before.json replay.json
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from collections import Counter
+from collections.abc import Awaitable
+from dataclasses import asdict
+from dataclasses import dataclass
+from datetime import UTC
+from datetime import datetime
+from pathlib import Path
+from typing import Annotated
+from typing import Any
+from typing import Final
+
+import httpx
+from typer import Argument
+from typer import Option
+from typer import Typer
+
+from bench.environment import prepare_environment
+from bench.load import REQUEST_TIMEOUT
+from bench.load import AppMode
+from bench.load import Grant
+from bench.load import Recorder
+from bench.load import Scenario
+from bench.load import Session
+from bench.load import git_revision
+from bench.load import local_target
+from bench.load import memory_target
+from bench.load import percentile
+from bench.load import url_target
+
+
+app = Typer()
+REPLAYED_PREFIXES: Final = ("/auth/", "/health/")
+VERIFICATION_ROUTES: Final = ("/auth/checkout_access", "/auth/get_payload", "/auth/refresh")
+SETUP_CONCURRENCY: Final = 20
+
+
+@dataclass(slots=True, frozen=True)
+class Captured:
+    at: float
+    method: str
+    route: str
+    status: int
+    actor: str | None = None
+    permissions: int | None = None
+    access_age: int | None = None
+    presented: bool = False
+
+    @classmethod
+    def parse(cls, line: str) -> "Captured":
+        data = json.loads(line)
+        access = data.get("access") or {}
+        return cls(
+            at=data["at"],
+            method=data["method"],
+            route=data["route"],
+            status=data["status"] or httpx.codes.INTERNAL_SERVER_ERROR,
+            actor=data.get("actor"),
+            permissions=access.get("permissions"),
+            access_age=access.get("age"),
+            presented="access" in data or "refresh" in data,
+        )
+
+    @property
+    def rejected(self) -> bool:
+        return self.presented and self.status == httpx.codes.UNAUTHORIZED and self.route in VERIFICATION_ROUTES
+
+
+def read_capture(paths: list[Path]) -> list[Captured]:
+    requests = [Captured.parse(line) for path in paths for line in path.read_text().splitlines() if line.strip()]
+    requests.sort(key=lambda request: request.at)
+    return requests
+
+
+def describe_capture(requests: list[Captured]) -> dict[str, Any]:
+    duration = requests[-1].at - requests[0].at if requests else 0
+    routes: dict[str, Any] = {}
+    for request in requests:
+        route = routes.setdefault(f"{request.method} {request.route}", {"count": 0, "statuses": Counter[int]()})
+        route["count"] += 1
+        route["statuses"][request.status] += 1
+
+    ages = sorted(float(request.access_age) for request in requests if request.access_age is not None)
+    presented = [request for request in requests if request.presented and request.route in VERIFICATION_ROUTES]
+    return {
+        "requests": len(requests),
+        "duration_s": duration,
+        "rps": len(requests) / duration if duration else 0,
+        "actors": len({request.actor for request in requests if request.actor}),
+        "rejected_share": sum(request.rejected for request in presented) / len(presented) if presented else 0,
+        "access_age_s": {f"p{rank}": percentile(ages, rank) for rank in (50, 95, 99)} if ages else {},
+        "permissions": dict(
+            Counter(request.permissions for request in requests if request.permissions is not None).most_common()
+        ),
+        "routes": {
+            route: {"count": stats["count"], "statuses": dict(sorted(stats["statuses"].items()))}
+            for route, stats in sorted(routes.items())
+        },
+    }
+
+
+@dataclass(slots=True)
+class Actor:
+    session: Session
+    account: dict[str, str]
+    revoked: dict[str, str] | None = None
+
+
+async def prepare_actor(session: Session, grant: Grant, *, banned: bool) -> Actor:
+    """Account, permissions and cookies of one captured user: setup work that must not show up in the timings"""
+    account = {"login": f"replay-{uuid.uuid4().hex[:12]}", "password": uuid.uuid4().hex}
+    await session.request("POST", "/auth/register", json=account)
+    await grant(account["login"])
+    await session.request("POST", "/auth/login", json=account)
+    actor = Actor(session, account)
+    if banned:
+        actor.revoked = dict(session.cookies)
+        await session.request("GET", "/auth/logout_all")
+        await session.request("POST", "/auth/login", json=account)
+
+    return actor
+
+
+def replay_request(request: Captured, actor: Actor | None, anonymous: Session) -> Awaitable[httpx.Response]:
+    session = anonymous if actor is None else actor.session
+    cookies = actor.revoked if actor is not None and request.rejected else None
+    body: dict[str, str] | None = None
+    if request.route == "/auth/register":
+        body = {"login": f"replay-{uuid.uuid4().hex[:12]}", "password": uuid.uuid4().hex}
+    elif request.route == "/auth/login":
+        succeeded = actor is not None and request.status == httpx.codes.OK
+        body = actor.account if succeeded and actor is not None else {"login": "replay-unknown", "password": "none"}
+    elif request.route == "/auth/change_password" and actor is not None:
+        # The password stays the same, so that the later logins of the user still succeed
+        body = {"old_password": actor.account["password"], "new_password": actor.account["password"]}
+
+    # The captured login is not kept, a fresh one is probed instead
+    params = {"login": f"replay-{uuid.uuid4().hex[:12]}"} if request.route == "/auth/login_available" else None
+    return session.request(request.method, request.route, cookies=cookies, json=body, params=params)
+
+
+def replay_scenario(replayed: list[Captured], users: int, max_connections: int) -> Scenario:
+    permissions = Counter(request.permissions for request in replayed if request.permissions is not None)
+    return Scenario(
+        name="replay",
+        users=users,
+        concurrency=max_connections,
+        permissions_per_user=permissions.most_common(1)[0][0] if permissions else 0,
+    )
+
+
+async def replay(
+    requests: list[Captured], speed: float, mode: AppMode, url: str | None, max_connections: int
+) -> dict[str, Any]:
+    replayed = [request for request in requests if request.route.startswith(REPLAYED_PREFIXES)]
+    actors = {request.actor for request in replayed if request.actor}
+    banned = {request.actor for request in replayed if request.actor and request.rejected}
+    scenario = replay_scenario(replayed, len(actors), max_connections)
+    if url is not None:
+        context = url_target(scenario, url)
+    elif mode is AppMode.memory:
+        context = memory_target(scenario)
+    else:
+        context = local_target(scenario)
+
+    recorder = Recorder()
+    lateness: list[float] = []
+    async with (
+        context as target,
+        httpx.AsyncClient(transport=target.transport, base_url=target.base_url, timeout=REQUEST_TIMEOUT) as client,
+    ):
+        semaphore = asyncio.Semaphore(SETUP_CONCURRENCY)
+
+        async def prepare(actor: str) -> tuple[str, Actor]:
+            async with semaphore:
+                return actor, await prepare_actor(Session(client), target.grant, banned=actor in banned)
+
+        sessions = dict(await asyncio.gather(*(prepare(actor) for actor in actors)))
+        anonymous = Session(client)
+
+        async def fire(request: Captured) -> None:
+            endpoint = f"{request.method} {request.route}"
+            await recorder.call(
+                endpoint, replay_request(request, sessions.get(request.actor or ""), anonymous), request.status
+            )
+
+        tasks: list[asyncio.Task[None]] = []
+        origin = replayed[0].at if replayed else 0
+        started = time.perf_counter()
+        for request in replayed:
+            delay = (request.at - origin) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                lateness.append(-delay)
+            tasks.append(asyncio.create_task(fire(request)))
+
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    lateness.sort()
+    return {
+        **recorder.report(elapsed),
+        "scenario": asdict(scenario),
+        "skipped": len(requests) - len(replayed),
+        "late": len(lateness),
+        "late_p99_ms": percentile(lateness, 99) * 1000 if lateness else 0,
+    }
+
+
+@app.command()
+def describe(paths: Annotated[list[Path], Argument(help="Capture files, the rotated ones included")]) -> None:
+    print(json.dumps(describe_capture(read_capture(paths)), indent=2))
+
+
+@app.command()
+def run(
+    paths: Annotated[list[Path], Argument(help="Capture files, the rotated ones included")],
+    speed: Annotated[float, Option(min=0.01, help="How many times faster than captured to send the requests")] = 1,
+    mode: Annotated[AppMode, Option("--app", help="In-process app backed by stand-ins or by local Postgres/Redis")] = (
+        AppMode.memory
+    ),
+    url: Annotated[str | None, Option(help="Drive an already running instance instead of an in-process app")] = None,
+    max_connections: Annotated[int, Option(help="Connection pool size when driving --url")] = 100,
+    output: Annotated[Path | None, Option(help="Where to write the JSON report")] = None,
+) -> None:
+    prepare_environment()
+    requests = read_capture(paths)
+    result = asyncio.run(replay(requests, speed, mode, url, max_connections))
+    report = {
+        "revision": git_revision(),
+        "timestamp": datetime.now(UTC).isoformat(),
+        "target": url or mode.value,
+        "speed": speed,
+        "capture": describe_capture(requests),
+        **result,
+    }
+
+    for endpoint, stats in report["endpoints"].items():
+        print(
+            f"{endpoint:<30} n={stats['count']:<7} mismatch={stats['errors']:<5} rps={stats['rps']:<9.1f} "
+            f"p50={stats['p50_ms']:.2f}ms p95={stats['p95_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms"
+        )
+    print(
+        f"total: {report['requests']} requests in {report['elapsed_s']:.2f}s, {report['rps']:.1f} rps, "
+        f"{report['skipped']} skipped, {report['late']} sent late (p99 {report['late_p99_ms']:.2f}ms)"
+    )
+
+    if output is not None:
+        output.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,110 @@
+"""Redis memory taken by revoked tokens in every `RevocationLayout`
+
+Writes `--count` revocations per layout into an empty database, spread over `--users` users,
+and reports `used_memory` growth per revocation. The `hash` layout needs Redis 7.4+ for
+per-field TTL and is skipped on older servers. The database is flushed before and after
+every layout, so point it at a scratch one.
+
+    python -m bench.revocation_memory run --db 15
+    python -m bench.revocation_memory run --count 1000000 --layout compact --layout hash
+"""
+
+import asyncio
+import uuid
+from collections.abc import Iterator
+from typing import Annotated
+
+from redis.asyncio import Redis
+from typer import Option
+from typer import Typer
+
+from bench.environment import prepare_environment
+
+
+app = Typer()
+
+TTL = 86400
+
+
+def revocations(count: int, users: int) -> Iterator[tuple[uuid.UUID, uuid.UUID]]:
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    for number in range(count):
+        yield user_ids[number % users], uuid.uuid4()
+
+
+async def used_memory(redis: Redis) -> int:
+    await redis.memory_purge()  # pyright: ignore[reportUnknownMemberType]
+    return (await redis.info("memory"))["used_memory"]
+
+
+async def fill(redis: Redis, layout: str, count: int, users: int, chunk: int) -> None:
+    from pickle import HIGHEST_PROTOCOL as PICKLE_HIGHEST_PROTOCOL  # noqa: S403
+    from pickle import dumps as pickle_dumps  # noqa: S403
+
+    from src.services.revocation_service import RevocationLayout
+    from src.services.revocation_service import compact_key
+    from src.services.revocation_service import hash_key
+    from src.services.revocation_service import legacy_key
+
+    pipe = redis.pipeline(transaction=False)
+    for number, (user_id, jti) in enumerate(revocations(count, users), 1):
+        if layout == RevocationLayout.keys:
+            value = pickle_dumps((jti,), protocol=PICKLE_HIGHEST_PROTOCOL)
+            pipe.set(str(legacy_key("access", user_id, jti)), value, ex=TTL)  # pyright: ignore[reportUnusedCoroutine]
+        elif layout == RevocationLayout.compact:
+            pipe.set(compact_key("access", user_id, jti), b"", ex=TTL)  # pyright: ignore[reportUnusedCoroutine]
+        else:
+            name = hash_key("access", user_id)
+            pipe.hset(name, jti.bytes, b"")  # pyright: ignore[reportArgumentType, reportUnusedCoroutine]
+            pipe.hexpire(name, TTL, jti.bytes)  # pyright: ignore[reportArgumentType, reportUnusedCoroutine]
+
+        if number % chunk == 0:
+            await pipe.execute()
+            print(f"\r  {layout}: {number:>12,}/{count:,}", end="", flush=True)
+
+    await pipe.execute()
+    print()
+
+
+async def measure(url: str, layouts: list[str], count: int, users: int, chunk: int) -> None:
+    redis = Redis.from_url(url)
+    version = tuple(int(part) for part in (await redis.info("server"))["redis_version"].split(".")[:2])
+    results: dict[str, int] = {}
+    try:
+        for layout in layouts:
+            if layout == "hash" and version < (7, 4):
+                print(f"  {layout}: skipped, needs Redis 7.4+")
+                continue
+
+            await redis.flushdb()
+            before = await used_memory(redis)
+            await fill(redis, layout, count, users, chunk)
+            results[layout] = await used_memory(redis) - before
+            await redis.flushdb()
+    finally:
+        await redis.aclose()
+
+    print(f"{'layout':<8} {'total MiB':>12} {'bytes/revocation':>18}")
+    for layout, used in results.items():
+        print(f"{layout:<8} {used / 2**20:>12.1f} {used / count:>18.1f}")
+
+
+@app.command()
+def run(
+    url: Annotated[str | None, Option(help="Redis URL, REDIS_HOST and REDIS_PORT by default")] = None,
+    db: Annotated[int, Option(help="Scratch database, flushed by the run")] = 15,
+    count: Annotated[int, Option(help="Revocations written per layout")] = 10_000_000,
+    users: Annotated[int, Option(help="Distinct users the revocations are spread over")] = 100_000,
+    chunk: Annotated[int, Option(help="Commands per pipeline round trip")] = 10_000,
+    layout: Annotated[list[str] | None, Option(help="Layouts to measure, all by default")] = None,
+) -> None:
+    prepare_environment()
+    from src.core.config import configs
+    from src.services.revocation_service import RevocationLayout
+
+    layouts = [RevocationLayout(name).value for name in layout or list(RevocationLayout)]
+    asyncio.run(measure(url or f"redis://{configs.redis_host}:{configs.redis_port}/{db}", layouts, count, users, chunk))
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,265 @@
+"""In-process stand-ins for Postgres and Redis, so the real app can be driven without any containers"""
+
+import asyncio
+import time
+import uuid
+from collections.abc import Iterable
+from datetime import timedelta
+from enum import StrEnum
+from functools import partial
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Self
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import ResponseError as RedisResponseError
+
+from src.api.models.auth import AccountModel
+from src.db.redis_db import get_redis
+from src.models.alchemy_model import PermissionOrm
+from src.models.alchemy_model import UserOrm
+from src.models.projection import UserProjection
+from src.services.password_service import PasswordService
+from src.services.password_service import get_password_service
+from src.services.user_service import UserService
+from src.services.user_service import get_user_service
+
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable
+    from collections.abc import Callable
+
+
+class MemoryRedis:
+    """The subset of `redis.asyncio.Redis` the services use, with TTL support"""
+
+    def __init__(self) -> None:
+        self.data: dict[str, tuple[bytes, float | None]] = {}
+        self.streams: dict[str, list[tuple[bytes, dict[bytes, bytes]]]] = {}
+        self.bitfields: dict[str, dict[int, int]] = {}
+
+    @staticmethod
+    def _deadline(ex: int | timedelta | None) -> float | None:
+        if ex is None:
+            return None
+
+        seconds = ex.total_seconds() if isinstance(ex, timedelta) else ex
+        return time.monotonic() + seconds
+
+    async def get(self, name: str) -> bytes | None:
+        if (item := self.data.get(name)) is None:
+            return None
+
+        value, deadline = item
+        if deadline is not None and deadline <= time.monotonic():
+            del self.data[name]
+            return None
+
+        return value
+
+    async def set(self, name: str, value: bytes, ex: int | timedelta | None = None) -> bool:
+        self.data[name] = (value, self._deadline(ex))
+        return True
+
+    async def delete(self, *names: str) -> int:
+        return sum(self.data.pop(name, None) is not None for name in names)
+
+    async def xadd(self, name: str, fields: dict[bytes, bytes], **_: Any) -> bytes:
+        entries = self.streams.setdefault(name, [])
+        id_ = f"{time.time_ns() // 1_000_000}-{len(entries)}".encode()
+        entries.append((id_, fields))
+        return id_
+
+    async def exists(self, *names: str) -> int:
+        return sum(await self.get(name) is not None for name in names)
+
+    async def execute_command(self, command: str, name: str, *arguments: Any) -> list[int]:
+        """BITFIELD and BITFIELD_RO with `#index` offsets and saturation, the only raw commands the services send"""
+        if command not in {"BITFIELD", "BITFIELD_RO"}:
+            # As a real server answers, so that the services' handling of Redis errors runs
+            raise RedisResponseError(f"unknown command '{command}'")
+
+        counters = self.bitfields.setdefault(name, {})
+        results: list[int] = []
+        items = iter(arguments)
+        for operation in items:
+            if operation == "OVERFLOW":
+                next(items)
+                continue
+
+            width, index = int(next(items)[1:]), int(next(items)[1:])
+            increment = int(next(items)) if operation == "INCRBY" else 0
+            counters[index] = max(0, min((1 << width) - 1, counters.get(index, 0) + increment))
+            results.append(counters[index])
+
+        return results
+
+    async def eval(self, script: str, numkeys: int, *keys_and_arguments: Any) -> list[int] | None:  # noqa: ARG002
+        """The login filter's removal, the only script the services run: BITFIELD on a key if another exists"""
+        counters, ready = keys_and_arguments[:numkeys]
+        if not await self.exists(ready):
+            return None
+
+        return await self.execute_command("BITFIELD", counters, *keys_and_arguments[numkeys:])
+
+    async def ping(self) -> bool:
+        return True
+
+    def pipeline(self, *, transaction: bool = True) -> "MemoryPipeline":  # noqa: ARG002
+        return MemoryPipeline(self)
+
+    async def close(self) -> None:
+        self.data.clear()
+
+    aclose = close
+
+
+class MemoryPipeline:
+    def __init__(self, redis: MemoryRedis) -> None:
+        self.redis = redis
+        self.commands: list[Callable[[], Awaitable[Any]]] = []
+
+    def get(self, name: str) -> Self:
+        self.commands.append(partial(self.redis.get, name))
+        return self
+
+    def set(self, name: str, value: bytes, ex: int | timedelta | None = None) -> Self:
+        self.commands.append(partial(self.redis.set, name, value, ex))
+        return self
+
+    def delete(self, *names: str) -> Self:
+        self.commands.append(partial(self.redis.delete, *names))
+        return self
+
+    def xadd(self, name: str, fields: dict[bytes, bytes], **options: Any) -> Self:
+        self.commands.append(partial(self.redis.xadd, name, fields, **options))
+        return self
+
+    def exists(self, *names: str) -> Self:
+        self.commands.append(partial(self.redis.exists, *names))
+        return self
+
+    def execute_command(self, *arguments: Any) -> Self:
+        self.commands.append(partial(self.redis.execute_command, *arguments))
+        return self
+
+    async def execute(self, *, raise_on_error: bool = True) -> list[Any]:
+        result: list[Any] = []
+        for command in self.commands:
+            try:
+                result.append(await command())
+            except Exception as error:
+                if raise_on_error:
+                    raise
+                result.append(error)
+
+        self.commands.clear()
+        return result
+
+
+class Fault(StrEnum):
+    healthy = "healthy"
+    slow = "slow"
+    stalled = "stalled"
+    refusing = "refusing"
+
+
+class FaultyRedis(MemoryRedis):
+    """`MemoryRedis` whose every command can be delayed, hung or refused, to rehearse Redis outages"""
+
+    def __init__(self, latency: float = 0.05) -> None:
+        super().__init__()
+        self.fault = Fault.healthy
+        self.latency = latency
+
+    async def _inject(self) -> None:
+        match self.fault:
+            case Fault.slow:
+                await asyncio.sleep(self.latency)
+            case Fault.stalled:
+                await asyncio.Event().wait()
+            case Fault.refusing:
+                raise RedisConnectionError("Connection refused by fault injection")
+            case Fault.healthy:
+                pass
+
+    async def get(self, name: str) -> bytes | None:
+        await self._inject()
+        return await super().get(name)
+
+    async def set(self, name: str, value: bytes, ex: int | timedelta | None = None) -> bool:
+        await self._inject()
+        return await super().set(name, value, ex)
+
+    async def ping(self) -> bool:
+        await self._inject()
+        return True
+
+
+class MemoryStore:
+    """Users and permissions shared by every request, as the `user`/`permission` tables would be"""
+
+    def __init__(self) -> None:
+        self.users: dict[str, UserOrm] = {}
+        self.permissions: list[PermissionOrm] = []
+
+    def seed_permissions(self, count: int) -> list[PermissionOrm]:
+        while len(self.permissions) < count:
+            number = len(self.permissions)
+            self.permissions.append(PermissionOrm(id=uuid.uuid4(), name=f"bench_{number}", description=None))
+
+        return self.permissions[:count]
+
+    def grant(self, login: str, permissions: Iterable[PermissionOrm]) -> None:
+        self.users[login].permissions.extend(permissions)
+
+
+class MemoryUserService(UserService):
+    def __init__(self, store: MemoryStore, password: PasswordService) -> None:
+        self.store = store
+        self.password = password
+
+    async def get_user(self, login: str, *, is_deleted: bool = False) -> UserOrm | None:
+        user = self.store.users.get(login)
+        return user if user is not None and user.is_deleted == is_deleted else None
+
+    async def get_user_by_id(self, id_: uuid.UUID) -> UserOrm | None:
+        return next((user for user in self.store.users.values() if user.id == id_ and not user.is_deleted), None)
+
+    async def get_projection(self, id_: uuid.UUID) -> UserProjection | None:
+        user = next((user for user in self.store.users.values() if user.id == id_), None)
+        if user is None:
+            return None
+
+        permissions = tuple(permission.id for permission in user.permissions)
+        return UserProjection(id=user.id, login=user.login, is_deleted=user.is_deleted, permissions=permissions)
+
+    async def transfer_user_to_other_services(self, user_id: uuid.UUID, urls: Iterable[str]) -> None:
+        pass
+
+    async def create_user(self, account: AccountModel) -> UserOrm:
+        user = UserOrm(
+            id=uuid.uuid4(),
+            login=account.login,
+            is_deleted=False,
+            password=await self.password.compute_hash(account.password),
+        )
+        self.store.users[account.login] = user
+        return user
+
+    async def delete_user(self, user: UserProjection) -> None:
+        user_ = self.store.users[user.login]
+        user_.is_deleted = True
+        user_.permissions.clear()
+
+    async def change_password(self, user: UserOrm, new_password: str) -> None:
+        user.password = await self.password.compute_hash(new_password)
+
+
+def memory_overrides(store: MemoryStore, redis: MemoryRedis) -> dict[Any, Any]:
+    """`app.dependency_overrides` that swap the database and Redis for the stand-ins"""
+    password = get_password_service()
+    return {
+        get_redis: lambda: redis,
+        get_user_service: lambda: MemoryUserService(store, password),
+    }
@@ -1,4 +1,8 @@
 #!/bin/bash
 set -eo pipefail +x
 
-fastapi run src/main.py --reload
+if [[ "${RELOAD:-false}" == "true" ]]; then
+    exec fastapi run src/main.py --reload
+fi
+
+exec python -m src.server
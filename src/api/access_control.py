@@ -1,16 +1,29 @@
 from typing import Annotated
+from uuid import UUID
 
 from fastapi import APIRouter
 from fastapi import Body
 from fastapi import Depends
+from fastapi import Header
+from fastapi import Query
+from fastapi import Response
+from fastapi import status
 
+from src.api.etag import check_not_modified
+from src.api.etag import content_etag
 from src.api.models.access_control import ChangePermissionModel
 from src.api.models.access_control import CreatePermissionModel
+from src.api.models.access_control import PageModel
 from src.api.models.access_control import PermissionModel
 from src.api.models.access_control import PermissionsModel
+from src.api.models.access_control import PermissionsPageModel
 from src.api.models.access_control import ResponseUserModel
 from src.api.models.access_control import SearchPermissionModel
 from src.api.models.access_control import UserModel
+from src.jwt_auth_helpers import get_actor_id
+from src.services.audit_trail import AuditEventType
+from src.services.audit_trail import RequestAudit
+from src.services.audit_trail import get_audit
 from src.services.permission_management_service import PermissionManagementService
 from src.services.permission_management_service import get_permission_management_service
 
@@ -29,8 +42,12 @@ permissions_tags_metadata = {"name": "Права", "description": "Управл
 async def create(
     permission: CreatePermissionModel,
     permissions_management_service: Annotated[PermissionManagementService, Depends(get_permission_management_service)],
+    audit: Annotated[RequestAudit, Depends(get_audit)],
+    actor_id: Annotated[UUID, Depends(get_actor_id)],
 ) -> PermissionModel:
-    return await permissions_management_service.create(permission)
+    result = await permissions_management_service.create(permission)
+    audit.push(AuditEventType.permission_created, user_id=actor_id, detail={"permission": str(result.id)})
+    return result
 
 
 @router.delete(
@@ -45,8 +62,16 @@ async def delete(
         SearchPermissionModel, Body(description="Минимум одно поле должно быть заполненно", title="Право для удаления")
     ],
     permissions_management_service: Annotated[PermissionManagementService, Depends(get_permission_management_service)],
+    audit: Annotated[RequestAudit, Depends(get_audit)],
+    actor_id: Annotated[UUID, Depends(get_actor_id)],
 ) -> str:
-    return await permissions_management_service.delete(permission)
+    result = await permissions_management_service.delete(permission)
+    audit.push(
+        AuditEventType.permission_deleted,
+        user_id=actor_id,
+        detail=permission.model_dump(mode="json", exclude_none=True),
+    )
+    return result
 
 
 @router.put(
@@ -64,21 +89,44 @@ async def update(
         ChangePermissionModel, Body(description="Минимум одно поле должно быть заполненно", title="Новый данные права")
     ],
     permissions_management_service: Annotated[PermissionManagementService, Depends(get_permission_management_service)],
+    audit: Annotated[RequestAudit, Depends(get_audit)],
+    actor_id: Annotated[UUID, Depends(get_actor_id)],
 ) -> PermissionModel:
-    return await permissions_management_service.update(permission_old, permission_new)
+    result = await permissions_management_service.update(permission_old, permission_new)
+    audit.push(AuditEventType.permission_updated, user_id=actor_id, detail={"permission": str(result.id)})
+    return result
 
 
 @router.get(
     "/get_all",
     summary="Просмотр всех прав",
-    description="Просмотр всех прав",
+    description="Просмотр всех прав. Поддерживает `If-None-Match`",
     response_description="Список прав",
+    responses={status.HTTP_304_NOT_MODIFIED: {}},
     tags=["Права"],
 )
 async def get_all(
+    response: Response,
     permissions_management_service: Annotated[PermissionManagementService, Depends(get_permission_management_service)],
+    if_none_match: Annotated[str | None, Header()] = None,
 ) -> PermissionsModel:
-    return await permissions_management_service.get_all()
+    permissions = await permissions_management_service.get_all(fresh=True)
+    check_not_modified(response, content_etag(permissions), if_none_match)
+    return permissions
+
+
+@router.get(
+    "/list",
+    summary="Постраничный просмотр прав",
+    description="Права по возрастанию названия. Следующая страница запрашивается с `after` из `next_after`",
+    response_description="Страница прав",
+    tags=["Права"],
+)
+async def get_page(
+    page: Annotated[PageModel, Query()],
+    permissions_management_service: Annotated[PermissionManagementService, Depends(get_permission_management_service)],
+) -> PermissionsPageModel:
+    return await permissions_management_service.get_page(page)
 
 
 @router.post(
@@ -94,8 +142,16 @@ async def assign(
     ],
     user: Annotated[UserModel, Body(description="Минимум одно поле должно быть заполненно", title="Юзер")],
     permissions_management_service: Annotated[PermissionManagementService, Depends(get_permission_management_service)],
+    audit: Annotated[RequestAudit, Depends(get_audit)],
+    actor_id: Annotated[UUID, Depends(get_actor_id)],
 ) -> ResponseUserModel:
-    return await permissions_management_service.assign(permission, user)
+    result = await permissions_management_service.assign(permission, user)
+    audit.push(
+        AuditEventType.permission_assigned,
+        user_id=actor_id,
+        detail={"user": str(result.id), **permission.model_dump(mode="json", exclude_none=True)},
+    )
+    return result
 
 
 @router.delete(
@@ -111,8 +167,16 @@ async def take_away(
     ],
     user: Annotated[UserModel, Body(description="Минимум одно поле должно быть заполненно", title="Юзер")],
     permissions_management_service: Annotated[PermissionManagementService, Depends(get_permission_management_service)],
+    audit: Annotated[RequestAudit, Depends(get_audit)],
+    actor_id: Annotated[UUID, Depends(get_actor_id)],
 ) -> ResponseUserModel:
-    return await permissions_management_service.take_away(permission, user)
+    result = await permissions_management_service.take_away(permission, user)
+    audit.push(
+        AuditEventType.permission_taken_away,
+        user_id=actor_id,
+        detail={"user": str(result.id), **permission.model_dump(mode="json", exclude_none=True)},
+    )
+    return result
 
 
 @router.post(
@@ -127,3 +191,22 @@ async def get_user_permissions(
     permissions_management_service: Annotated[PermissionManagementService, Depends(get_permission_management_service)],
 ) -> PermissionsModel:
     return await permissions_management_service.get_user_permissions(user)
+
+
+@router.get(
+    "/get_user_permissions",
+    summary="Получить права пользователя",
+    description="Минимум один параметр должен быть заполнен. Поддерживает `If-None-Match`",
+    response_description="Права пользователя",
+    responses={status.HTTP_304_NOT_MODIFIED: {}},
+    tags=["Права"],
+)
+async def get_user_permissions_cacheable(
+    user: Annotated[UserModel, Query()],
+    response: Response,
+    permissions_management_service: Annotated[PermissionManagementService, Depends(get_permission_management_service)],
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> PermissionsModel:
+    permissions = await permissions_management_service.get_user_permissions(user, fresh=True)
+    check_not_modified(response, content_etag(permissions), if_none_match)
+    return permissions
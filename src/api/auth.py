@@ -1,35 +1,57 @@
-from datetime import UTC
-from datetime import datetime
+from contextlib import suppress
 from typing import Annotated
 
 from fastapi import APIRouter
 from fastapi import Depends
+from fastapi import Form
+from fastapi import Query
 from fastapi import Response
 from fastapi import status
+from fastapi.security import HTTPBasic
+from fastapi.security import HTTPBasicCredentials
 
 from src.api.models import AccountModel
 from src.api.models import ChangePasswordModel
+from src.api.models import ClientCredentialsModel
+from src.api.models import LoginAvailableModel
 from src.api.models import LoginModel
 from src.api.models import SecureAccountModel
+from src.api.models import TokenModel
 from src.core.config import configs
 from src.core.config import jwt_config
+from src.custom_auth_jwt import BearerAuthJWT
+from src.custom_auth_jwt import BearerAuthJWTBearer
 from src.custom_auth_jwt import CustomAuthJWT
 from src.custom_auth_jwt import CustomAuthJWTBearer
+from src.models.errors import ErrorBody
 from src.models.jwt import Payload
+from src.services.audit_trail import AuditEventType
+from src.services.audit_trail import RequestAudit
+from src.services.audit_trail import get_audit
+from src.services.client_credentials_service import ClientCredentialsService
+from src.services.client_credentials_service import client_subject
+from src.services.client_credentials_service import get_client_credentials_service
+from src.services.custom_error import LoginTakenError
+from src.services.custom_error import RedisUnavailableError
 from src.services.custom_error import ResponseError
 from src.services.jwt_service import JWTService
 from src.services.jwt_service import get_jwt_service
+from src.services.login_filter import LoginFilter
+from src.services.login_filter import get_login_filter
 from src.services.password_service import PasswordService
 from src.services.password_service import get_password_service
-from src.services.redis_service import Key
-from src.services.redis_service import RedisService
-from src.services.redis_service import get_service_redis
+from src.services.permission_management_service import PermissionManagementService
+from src.services.permission_management_service import get_permission_management_service
+from src.services.revocation_service import RevocationService
+from src.services.revocation_service import get_revocation_service
 from src.services.user_service import UserService
 from src.services.user_service import get_user_service
 
 
 router = APIRouter(tags=["Авторизация"])
 auth_dep = CustomAuthJWTBearer()
+bearer_auth_dep = BearerAuthJWTBearer()
+client_basic = HTTPBasic(auto_error=False)
 auth_tags_metadata = {"name": "Авторизация", "description": "Авторизация в API."}
 
 
@@ -42,15 +64,43 @@ auth_tags_metadata = {"name": "Авторизация", "description": "Авто
 async def register(
     data: AccountModel,
     user_service: Annotated[UserService, Depends(get_user_service)],
+    audit: Annotated[RequestAudit, Depends(get_audit)],
 ) -> SecureAccountModel:
     if await user_service.get_user(data.login):
         raise ResponseError(status.HTTP_409_CONFLICT, "Логин занят")
 
-    user = await user_service.create_user(data)
+    try:
+        user = await user_service.create_user(data)
+    except LoginTakenError:
+        raise ResponseError(status.HTTP_409_CONFLICT, "Логин занят") from None
+
+    audit.push(AuditEventType.registered, user_id=user.id, login=user.login)
     await user_service.transfer_user_to_other_services(user.id, configs.services_depend_user_id)
     return SecureAccountModel.model_validate(user.__dict__)
 
 
+@router.get(
+    "/login_available",
+    summary="Проверка логина",
+    description="Свободен ли логин. Занятые логины отсеивает фильтр Блума в Redis, "
+    "база проверяется, только если фильтр не уверен. Регистрация всё равно проверяет логин сама",
+    response_description="Свободен ли логин",
+)
+async def login_available(
+    login: Annotated[str, Query(min_length=1, max_length=60, description="Логин пользователя")],
+    logins: Annotated[LoginFilter, Depends(get_login_filter)],
+    user_service: Annotated[UserService, Depends(get_user_service)],
+) -> LoginAvailableModel:
+    might_exist = None
+    with suppress(RedisUnavailableError):
+        might_exist = await logins.might_exist(login)
+
+    if might_exist is False:
+        return LoginAvailableModel(login=login, available=True)
+
+    return LoginAvailableModel(login=login, available=await user_service.get_user(login) is None)
+
+
 @router.post(
     "/login",
     summary="Авторизация пользователя",
@@ -62,12 +112,16 @@ async def login(
     user_service: Annotated[UserService, Depends(get_user_service)],
     password_service: Annotated[PasswordService, Depends(get_password_service)],
     authorize: Annotated[CustomAuthJWT, Depends()],
+    audit: Annotated[RequestAudit, Depends(get_audit)],
 ) -> None:
     if (user := await user_service.get_user(account.login)) is None or not await password_service.check_password(
         account.password, user.password
     ):
+        audit.push(AuditEventType.login_failed, user_id=None if user is None else user.id, login=account.login)
         raise ResponseError(status.HTTP_401_UNAUTHORIZED, "Неверный логин или пароль")
 
+    audit.push(AuditEventType.login, user_id=user.id, login=user.login)
+
     permission = {"permissions": [str(permission.id) for permission in user.permissions]}
     user_id = str(user.id)
     access_token = await authorize.create_access_token(subject=user_id, user_claims=permission)
@@ -77,6 +131,49 @@ async def login(
     await authorize.set_refresh_cookies(refresh_token, max_age=jwt_config.authjwt_refresh_token_expires)
 
 
+@router.post(
+    "/token",
+    summary="Токен сервиса",
+    description="Client credentials (RFC 6749, 4.4): сервис получает access токен по своему секрету, "
+    "без пароля и cookie. Токен передаётся в заголовке `Authorization: Bearer` и годится до `expires_in`",
+    response_description="Bearer токен",
+    responses={
+        status.HTTP_400_BAD_REQUEST: {"model": ErrorBody},
+        status.HTTP_401_UNAUTHORIZED: {"model": ErrorBody},
+    },
+)
+async def token(
+    form: Annotated[ClientCredentialsModel, Form()],
+    basic: Annotated[HTTPBasicCredentials | None, Depends(client_basic)],
+    clients: Annotated[ClientCredentialsService, Depends(get_client_credentials_service)],
+    permission_management_service: Annotated[PermissionManagementService, Depends(get_permission_management_service)],
+    authorize: Annotated[CustomAuthJWT, Depends()],
+    audit: Annotated[RequestAudit, Depends(get_audit)],
+    response: Response,
+) -> TokenModel:
+    client_id, secret = (basic.username, basic.password) if basic is not None else (form.client_id, form.client_secret)
+    if client_id is None or secret is None or (client := clients.authenticate(client_id, secret)) is None:
+        audit.push(AuditEventType.service_token_failed, login=client_id)
+        raise ResponseError(status.HTTP_401_UNAUTHORIZED, "Неверный клиент или секрет")
+
+    if (names := clients.scope(client, form.scope)) is None:
+        audit.push(AuditEventType.service_token_failed, login=client_id, detail={"scope": form.scope})
+        raise ResponseError(status.HTTP_400_BAD_REQUEST, "Запрошены права, которых у клиента нет")
+
+    catalog = {name: id_ for id_, name in await permission_management_service.catalog()}
+    granted = [name for name in names if name in catalog]
+    subject = client_subject(client_id)
+    audit.push(AuditEventType.service_token, user_id=subject, login=client_id, detail={"scope": granted})
+
+    access_token = await authorize.create_access_token(
+        subject=str(subject),
+        expires_time=configs.service_token_expires,
+        user_claims={"permissions": [str(catalog[name]) for name in granted], "client": client_id},
+    )
+    response.headers["Cache-Control"] = "no-store"
+    return TokenModel(access_token=access_token, expires_in=configs.service_token_expires, scope=" ".join(granted))
+
+
 @router.get(
     "/logout",
     summary="Выход из системы",
@@ -84,9 +181,10 @@ async def login(
     response_description="Пользователь вышел из системы",
 )
 async def logout(
-    redis: Annotated[RedisService, Depends(get_service_redis)],
+    revocations: Annotated[RevocationService, Depends(get_revocation_service)],
     authorize: Annotated[CustomAuthJWT, Depends(auth_dep)],
     jwt: Annotated[JWTService, Depends(get_jwt_service)],
+    audit: Annotated[RequestAudit, Depends(get_audit)],
 ) -> None:
     await authorize.jwt_required()
     access_payload = await authorize.get_payload()
@@ -97,12 +195,8 @@ async def logout(
     await authorize.jwt_refresh_token_required()
     refresh_payload = await authorize.get_payload()
 
-    user_id = access_payload.user_id
-    access_jti = access_payload.jti
-    refresh_jti = refresh_payload.jti
-    now = int(datetime.now(UTC).timestamp())
-    await redis.set(Key("access_banned", user_id, access_jti), access_jti, access_payload.exp - now)
-    await redis.set(Key("refresh_banned", user_id, refresh_jti), refresh_jti, refresh_payload.exp - now)
+    await revocations.revoke(access_payload, refresh_payload)
+    audit.push(AuditEventType.logout, user_id=access_payload.user_id)
 
     await authorize.unset_jwt_cookies()
 
@@ -114,9 +208,10 @@ async def logout(
     response_description="Пользователь вышел со всех устройств",
 )
 async def logout_all(
-    redis: Annotated[RedisService, Depends(get_service_redis)],
+    revocations: Annotated[RevocationService, Depends(get_revocation_service)],
     authorize: Annotated[CustomAuthJWT, Depends(auth_dep)],
     jwt: Annotated[JWTService, Depends(get_jwt_service)],
+    audit: Annotated[RequestAudit, Depends(get_audit)],
 ) -> None:
     await authorize.jwt_required()
     payload = await authorize.get_payload()
@@ -125,9 +220,8 @@ async def logout_all(
     if await jwt.check_banned(payload):
         await authorize.raise_banned_jwt(payload.type)
 
-    now = int(datetime.now(UTC).timestamp())
-    await redis.set(Key("access_banned", "all", user_id), now, jwt_config.authjwt_access_token_expires)
-    await redis.set(Key("refresh_banned", "all", user_id), now, jwt_config.authjwt_refresh_token_expires)
+    await revocations.revoke_users([user_id])
+    audit.push(AuditEventType.logout_all, user_id=user_id)
 
     await authorize.unset_jwt_cookies()
 
@@ -145,6 +239,7 @@ async def change_password(
     user_service: Annotated[UserService, Depends(get_user_service)],
     authorize: Annotated[CustomAuthJWT, Depends(auth_dep)],
     jwt: Annotated[JWTService, Depends(get_jwt_service)],
+    audit: Annotated[RequestAudit, Depends(get_audit)],
 ) -> None:
     await authorize.jwt_required()
     payload = await authorize.get_payload()
@@ -157,9 +252,11 @@ async def change_password(
         raise ResponseError(status.HTTP_401_UNAUTHORIZED, "Аккаунт удалён")
 
     if not await password_service.check_password(data.old_password, user.password):
+        audit.push(AuditEventType.password_change_failed, user_id=user_id, login=user.login)
         raise ResponseError(status.HTTP_401_UNAUTHORIZED, "Неверный пароль")
 
     await user_service.change_password(user, data.new_password)
+    audit.push(AuditEventType.password_changed, user_id=user_id, login=user.login)
 
 
 @router.delete(
@@ -170,10 +267,11 @@ async def change_password(
     responses={status.HTTP_204_NO_CONTENT: {}},
 )
 async def delete(
-    redis: Annotated[RedisService, Depends(get_service_redis)],
+    revocations: Annotated[RevocationService, Depends(get_revocation_service)],
     user_service: Annotated[UserService, Depends(get_user_service)],
     authorize: Annotated[CustomAuthJWT, Depends(auth_dep)],
     jwt: Annotated[JWTService, Depends(get_jwt_service)],
+    audit: Annotated[RequestAudit, Depends(get_audit)],
     response: Response,
 ) -> None:
     await authorize.jwt_required()
@@ -183,12 +281,11 @@ async def delete(
     if await jwt.check_banned(payload):
         await authorize.raise_banned_jwt(payload.type)
 
-    if (user := await user_service.get_user_by_id(user_id)) is not None:
+    if (user := await user_service.get_projection(user_id)) is not None and not user.is_deleted:
         await user_service.delete_user(user)
+        audit.push(AuditEventType.account_deleted, user_id=user_id, login=user.login)
 
-    now = int(datetime.now(UTC).timestamp())
-    await redis.set(Key("access_banned", "all", user_id), now, jwt_config.authjwt_access_token_expires)
-    await redis.set(Key("refresh_banned", "all", user_id), now, jwt_config.authjwt_refresh_token_expires)
+    await revocations.revoke_users([user_id])
 
     await authorize.unset_jwt_cookies()
 
@@ -228,7 +325,7 @@ async def refresh(
     response_description="Жизнеспособность токена",
 )
 async def checkout_access(
-    authorize: Annotated[CustomAuthJWT, Depends(auth_dep)],
+    authorize: Annotated[BearerAuthJWT, Depends(bearer_auth_dep)],
     jwt: Annotated[JWTService, Depends(get_jwt_service)],
 ) -> None:
     await authorize.jwt_required()
@@ -245,7 +342,7 @@ async def checkout_access(
     response_description="Payload",
 )
 async def get_payload(
-    authorize: Annotated[CustomAuthJWT, Depends(auth_dep)],
+    authorize: Annotated[BearerAuthJWT, Depends(bearer_auth_dep)],
     jwt: Annotated[JWTService, Depends(get_jwt_service)],
 ) -> Payload:
     await authorize.jwt_required()
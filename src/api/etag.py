@@ -0,0 +1,29 @@
+from hashlib import blake2b
+from typing import Final
+
+from fastapi import Response
+from pydantic import BaseModel
+
+from src.services.custom_error import NotModifiedError
+
+
+CACHE_CONTROL: Final = "private, no-cache"
+
+
+def etag_headers(etag: str) -> dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def content_etag(body: BaseModel) -> str:
+    """Tag derived from the body itself, so it cannot go with any other content"""
+    return f'"{blake2b(body.model_dump_json().encode(), digest_size=16).hexdigest()}"'
+
+
+def check_not_modified(response: Response, etag: str, if_none_match: str | None) -> None:
+    """Answers `304` when the client already holds `etag`, otherwise tags the response with it"""
+    if if_none_match is not None and any(
+        tag.strip().removeprefix("W/") in {etag, "*"} for tag in if_none_match.split(",")
+    ):
+        raise NotModifiedError(etag)
+
+    response.headers.update(etag_headers(etag))
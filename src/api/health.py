@@ -0,0 +1,60 @@
+from fastapi import APIRouter
+from fastapi import status
+
+from src import lifecycle
+from src.api.models.health import AdmissionClassModel
+from src.api.models.health import AdmissionModel
+from src.middleware.admission import admission
+from src.models.errors import ErrorBody
+from src.services.custom_error import ResponseError
+
+
+router = APIRouter(tags=["Состояние"])
+health_tags_metadata = {"name": "Состояние", "description": "Проверки живости и готовности сервиса."}
+
+
+@router.get(
+    "/live",
+    summary="Проверка живости",
+    description="Процесс запущен и отвечает",
+    response_description="Сервис жив",
+)
+async def live() -> None:
+    pass
+
+
+@router.get(
+    "/ready",
+    summary="Проверка готовности",
+    description="Пулы соединений прогреты, сервис принимает трафик",
+    response_description="Сервис готов",
+    responses={status.HTTP_503_SERVICE_UNAVAILABLE: {"model": ErrorBody}},
+)
+async def ready() -> None:
+    if not lifecycle.ready:
+        raise ResponseError(status.HTTP_503_SERVICE_UNAVAILABLE, "Сервис не готов")
+
+
+@router.get(
+    "/admission",
+    summary="Состояние допуска запросов",
+    description="Очереди и отклонённые запросы по классам маршрутов в этом воркере",
+    response_description="Счётчики допуска",
+)
+async def admission_stats() -> AdmissionModel:
+    return AdmissionModel(
+        capacity=admission.capacity,
+        running=admission.running,
+        classes=[
+            AdmissionClassModel(
+                name=admission_class.name,
+                priority=admission_class.priority,
+                limit=admission_class.limit,
+                running=stats.running,
+                queued=stats.queued,
+                admitted=stats.admitted,
+                shed=stats.shed,
+            )
+            for admission_class, stats in zip(admission.classes, admission.stats.values(), strict=True)
+        ],
+    )
@@ -1,2 +1,6 @@
 from src.api.models.access_control import *  # noqa: F403
 from src.api.models.auth import *  # noqa: F403
+from src.api.models.health import *  # noqa: F403
+from src.api.models.profiling import *  # noqa: F403
+from src.api.models.revocations import *  # noqa: F403
+from src.api.models.users import *  # noqa: F403
@@ -36,3 +36,12 @@ class ResponseUserModel(BaseModel):
     id: UUID = Field(description="Идентификатор юзера", title="Идентификатор")
     login: str = Field(description="Логин юзера", title="Логин")
     permissions: list[PermissionModel] = Field(description="Права юзера", title="Права")
+
+
+class PageModel(BaseModel):
+    after: str | None = Field(default=None, description="Последнее значение предыдущей страницы", title="После")
+    limit: int = Field(default=100, ge=1, le=1000, description="Размер страницы", title="Размер")
+
+
+class PermissionsPageModel(PermissionsModel):
+    next_after: str | None = Field(description="Значение `after` для следующей страницы", title="Следующая страница")
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import BaseModel
 from pydantic.fields import Field
 
@@ -15,6 +17,31 @@ class AccountModel(SecureAccountModel):
     password: str = Field(description="Пароль пользователя", title="Password", min_length=4)
 
 
+class LoginAvailableModel(BaseModel):
+    login: str = Field(description="Логин пользователя", title="Login")
+    available: bool = Field(description="Логин свободен", title="Available")
+
+
 class LoginModel(BaseModel):
     login: str = Field(description="Логин пользователя", title="Login")
     password: str = Field(description="Пароль пользователя", title="Password")
+
+
+class ClientCredentialsModel(BaseModel):
+    grant_type: Literal["client_credentials"] = Field(description="Тип гранта", title="Grant Type")
+    client_id: str | None = Field(
+        default=None, description="Идентификатор клиента, если не передан в Authorization: Basic", title="Client Id"
+    )
+    client_secret: str | None = Field(
+        default=None, description="Секрет клиента, если не передан в Authorization: Basic", title="Client Secret"
+    )
+    scope: str | None = Field(
+        default=None, description="Названия прав через пробел, по умолчанию все права клиента", title="Scope"
+    )
+
+
+class TokenModel(BaseModel):
+    access_token: str = Field(description="Access токен", title="Access Token")
+    token_type: Literal["Bearer"] = Field(default="Bearer", description="Тип токена", title="Token Type")
+    expires_in: int = Field(description="Сколько секунд токен действителен", title="Expires In")
+    scope: str = Field(description="Названия выданных прав через пробел", title="Scope")
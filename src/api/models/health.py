@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from pydantic import Field
+
+
+class AdmissionClassModel(BaseModel):
+    name: str = Field(description="Класс маршрутов", title="Класс")
+    priority: int = Field(description="Меньше значение, раньше получает слот", title="Приоритет")
+    limit: int = Field(description="Сколько запросов класса выполняется одновременно", title="Лимит")
+    running: int = Field(description="Выполняется сейчас", title="Выполняется")
+    queued: int = Field(description="Ждут слота сейчас", title="В очереди")
+    admitted: int = Field(description="Принято с запуска воркера", title="Принято")
+    shed: int = Field(description="Отклонено с 503 с запуска воркера", title="Отклонено")
+
+
+class AdmissionModel(BaseModel):
+    capacity: int = Field(description="Сколько запросов воркер выполняет одновременно", title="Ёмкость")
+    running: int = Field(description="Выполняется сейчас", title="Выполняется")
+    classes: list[AdmissionClassModel] = Field(description="Классы маршрутов", title="Классы")
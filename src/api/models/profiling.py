@@ -0,0 +1,40 @@
+from pydantic import BaseModel
+from pydantic import Field
+
+from src.core.config import configs
+
+
+class CpuProfileQueryModel(BaseModel):
+    seconds: float = Field(
+        default=5, gt=0, le=configs.profiling_max_seconds, description="Длительность профилирования", title="Секунды"
+    )
+    interval: float = Field(
+        default=0.01,
+        ge=configs.profiling_min_interval,
+        le=1,
+        description="Секунд между снимками стека",
+        title="Интервал",
+    )
+
+
+class MemoryProfileQueryModel(BaseModel):
+    seconds: float = Field(
+        default=5, gt=0, le=configs.profiling_max_seconds, description="Длительность профилирования", title="Секунды"
+    )
+    top: int = Field(default=50, ge=1, le=500, description="Сколько мест выделения вернуть", title="Лимит")
+
+
+class AllocatorModel(BaseModel):
+    traceback: list[str] = Field(description="Стек выделения, `файл:строка`, вызванный последним", title="Стек")
+    size_diff: int = Field(description="Прирост занятой памяти за время профилирования, байт", title="Прирост")
+    size: int = Field(description="Занято в конце профилирования, байт", title="Занято")
+    count_diff: int = Field(description="Прирост числа блоков", title="Прирост блоков")
+    count: int = Field(description="Блоков в конце профилирования", title="Блоки")
+
+
+class MemoryProfileModel(BaseModel):
+    seconds: float = Field(description="Длительность профилирования", title="Секунды")
+    size_diff: int = Field(description="Прирост памяти, выделенной Python, байт", title="Прирост")
+    traced: int = Field(description="Память, выделенная Python и ещё занятая в конце, байт", title="Занято")
+    peak: int = Field(description="Пик занятой памяти за время профилирования, байт", title="Пик")
+    allocators: list[AllocatorModel] = Field(description="Места выделения по убыванию прироста", title="Места")
@@ -0,0 +1,64 @@
+from enum import StrEnum
+from typing import Final
+from uuid import UUID
+
+from pydantic import BaseModel
+from pydantic import Field
+
+from src.core.config import configs
+
+
+CURSOR_PATTERN: Final = r"^\d+-\d+$"
+
+
+class RevocationEventType(StrEnum):
+    token = "token"
+    user = "user"
+    permission = "permission"
+
+
+class RevocationEventModel(BaseModel):
+    id: str | None = Field(default=None, description="Курсор события", title="Курсор")
+    type: RevocationEventType = Field(
+        description="token: отозван один токен, user: отозваны все токены юзера, выпущенные до `issued_before`, "
+        "permission: право изменено или удалено",
+        title="Тип",
+    )
+    user_id: UUID | None = Field(default=None, description="Идентификатор юзера", title="Юзер")
+    token_type: str | None = Field(default=None, description="Тип отозванного токена", title="Тип токена")
+    jti: UUID | None = Field(default=None, description="Идентификатор отозванного токена", title="JTI")
+    issued_before: int | None = Field(
+        default=None, description="Отозваны токены с `iat` меньше этого времени", title="Выпущенные до"
+    )
+    permission_id: UUID | None = Field(default=None, description="Идентификатор права", title="Право")
+    expires_at: int = Field(description="После этого времени событие можно забыть", title="Актуально до")
+
+
+class RevocationEventsQueryModel(BaseModel):
+    after: str | None = Field(
+        default=None, pattern=CURSOR_PATTERN, description="Курсор последнего полученного события", title="После"
+    )
+    wait: float = Field(
+        default=0,
+        ge=0,
+        le=configs.revocation_stream_wait,
+        description="Сколько секунд ждать новых событий, если их нет",
+        title="Ожидание",
+    )
+    limit: int = Field(
+        default=configs.revocation_stream_batch,
+        ge=1,
+        le=configs.revocation_stream_batch,
+        description="Количество событий",
+        title="Лимит",
+    )
+
+
+class RevocationEventsModel(BaseModel):
+    events: list[RevocationEventModel] = Field(description="События по возрастанию курсора", title="События")
+    cursor: str = Field(description="Значение `after` для следующего запроса", title="Курсор")
+    reset: bool = Field(
+        description="Стрим начат заново и события после `after` могли потеряться: локальный список сохраняется, "
+        "а токены, выпущенные раньше, проверяются через `/auth/checkout_access`",
+        title="Сброс",
+    )
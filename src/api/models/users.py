@@ -0,0 +1,28 @@
+from uuid import UUID
+
+from pydantic import BaseModel
+from pydantic import Field
+
+from src.api.models.access_control import PageModel
+
+
+class UserFilterModel(BaseModel):
+    login_prefix: str | None = Field(default=None, description="Начало логина", title="Префикс логина")
+    permission: UUID | None = Field(default=None, description="Идентификатор права юзера", title="Право")
+    is_deleted: bool | None = Field(default=None, description="Удалён ли юзер", title="Удалён")
+
+
+class UsersPageQueryModel(UserFilterModel, PageModel):
+    pass
+
+
+class UserItemModel(BaseModel):
+    id: UUID = Field(description="Идентификатор юзера", title="Идентификатор")
+    login: str = Field(description="Логин юзера", title="Логин")
+    is_deleted: bool = Field(description="Удалён ли юзер", title="Удалён")
+    permissions: list[UUID] = Field(description="Идентификаторы прав юзера", title="Права")
+
+
+class UsersPageModel(BaseModel):
+    users: list[UserItemModel] = Field(description="Список юзеров", title="Юзеры")
+    next_after: str | None = Field(description="Значение `after` для следующей страницы", title="Следующая страница")
@@ -0,0 +1,36 @@
+from pathlib import Path
+
+import orjson
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+
+from src.core.config import configs
+
+
+def route_paths(app: FastAPI) -> set[str]:
+    return {route.path_format for route in app.routes if isinstance(route, APIRoute) and route.include_in_schema}
+
+
+def write_schema(app: FastAPI, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(orjson.dumps(app.openapi()))
+
+
+def load_schema(app: FastAPI, path: Path) -> None:
+    """Serves the schema `write_schema` wrote at build time instead of generating it on the first docs request
+
+    A schema built with other settings, so with other routes, is left for FastAPI to generate again.
+    The title comes from the settings, which the build only had placeholders for, so it is this app's.
+    """
+    try:
+        schema = orjson.loads(path.read_bytes())
+    except (OSError, orjson.JSONDecodeError) as error:
+        configs.logger.warning(f"OpenAPI schema is not precomputed: {error!r}")
+        return
+
+    if set(schema.get("paths", {})) != route_paths(app):
+        configs.logger.warning(f"OpenAPI schema in {path} does not match the routes, it is generated again")
+        return
+
+    schema["info"]["title"] = app.title
+    app.openapi_schema = schema
@@ -0,0 +1,54 @@
+from typing import Annotated
+
+from fastapi import APIRouter
+from fastapi import Query
+from fastapi import status
+from fastapi.responses import PlainTextResponse
+
+from src.api.models.profiling import CpuProfileQueryModel
+from src.api.models.profiling import MemoryProfileModel
+from src.api.models.profiling import MemoryProfileQueryModel
+from src.models.errors import ErrorBody
+from src.services.custom_error import ProfilerBusyError
+from src.services.custom_error import ResponseError
+from src.services.profiler import worker_profiler
+
+
+router = APIRouter(tags=["Профилирование"])
+profiling_tags_metadata = {
+    "name": "Профилирование",
+    "description": "Профили процессора и памяти воркера, который принял запрос. Одновременно идёт один профиль.",
+}
+
+BUSY_RESPONSE = {status.HTTP_409_CONFLICT: {"model": ErrorBody}}
+
+
+@router.get(
+    "/cpu",
+    summary="Профиль процессора",
+    description="Стек цикла событий снимается раз в `interval` секунд в течение `seconds` секунд. "
+    "Ответ в формате collapsed stacks: строка `стек число_снимков`, его читают flamegraph.pl и speedscope",
+    response_description="Свёрнутые стеки",
+    response_class=PlainTextResponse,
+    responses={status.HTTP_200_OK: {"content": {"text/plain": {}}}, **BUSY_RESPONSE},
+)
+async def cpu(query: Annotated[CpuProfileQueryModel, Query()]) -> PlainTextResponse:
+    try:
+        return PlainTextResponse(await worker_profiler.cpu(query.seconds, query.interval))
+    except ProfilerBusyError:
+        raise ResponseError(status.HTTP_409_CONFLICT, "Профилирование уже идёт") from None
+
+
+@router.get(
+    "/memory",
+    summary="Профиль памяти",
+    description="Разница снимков tracemalloc в начале и в конце `seconds` секунд: "
+    "места выделения с наибольшим приростом памяти",
+    response_description="Места выделения",
+    responses=BUSY_RESPONSE,
+)
+async def memory(query: Annotated[MemoryProfileQueryModel, Query()]) -> MemoryProfileModel:
+    try:
+        return await worker_profiler.memory(query.seconds, query.top)
+    except ProfilerBusyError:
+        raise ResponseError(status.HTTP_409_CONFLICT, "Профилирование уже идёт") from None
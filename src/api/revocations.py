@@ -0,0 +1,64 @@
+from typing import Annotated
+
+from fastapi import APIRouter
+from fastapi import Depends
+from fastapi import Header
+from fastapi import Query
+from fastapi import status
+from fastapi.responses import StreamingResponse
+
+from src.api.models.revocations import CURSOR_PATTERN
+from src.api.models.revocations import RevocationEventsModel
+from src.api.models.revocations import RevocationEventsQueryModel
+from src.services.revocation_feed import RevocationFeed
+from src.services.revocation_feed import get_revocation_feed
+from src.services.revocation_feed import revocation_watcher
+
+
+router = APIRouter(tags=["Отзыв токенов"])
+revocations_tags_metadata = {
+    "name": "Отзыв токенов",
+    "description": "События отзыва токенов для сервисов, которые проверяют токены сами.",
+}
+
+
+@router.get(
+    "/events",
+    summary="События отзыва",
+    description="События после курсора `after`, с начала стрима без него. "
+    "С `wait` запрос ждёт до `wait` секунд, пока событий нет",
+    response_description="События и курсор следующего запроса",
+)
+async def events(
+    query: Annotated[RevocationEventsQueryModel, Query()],
+    feed: Annotated[RevocationFeed, Depends(get_revocation_feed)],
+) -> RevocationEventsModel:
+    page = await feed.read(query.after, query.limit)
+    if page.events or page.reset or not query.wait:
+        return page
+
+    if not await revocation_watcher.wait(page.cursor, query.wait):
+        return page
+
+    return await feed.read(page.cursor, query.limit)
+
+
+@router.get(
+    "/stream",
+    summary="Поток событий отзыва",
+    description="Server-Sent Events: событие на каждый отзыв, `reset`, если стрим начат заново, "
+    "и комментарий раз в несколько секунд простоя. Переподключение продолжает с Last-Event-ID",
+    response_description="Поток text/event-stream",
+    response_class=StreamingResponse,
+    responses={status.HTTP_200_OK: {"content": {"text/event-stream": {}}}},
+)
+async def stream(
+    feed: Annotated[RevocationFeed, Depends(get_revocation_feed)],
+    after: Annotated[str | None, Query(pattern=CURSOR_PATTERN, description="Курсор последнего события")] = None,
+    last_event_id: Annotated[str | None, Header(pattern=CURSOR_PATTERN)] = None,
+) -> StreamingResponse:
+    return StreamingResponse(
+        feed.stream(after or last_event_id, revocation_watcher),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
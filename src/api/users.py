@@ -0,0 +1,42 @@
+from typing import Annotated
+
+from fastapi import APIRouter
+from fastapi import Depends
+from fastapi import Query
+from fastapi import status
+from fastapi.responses import StreamingResponse
+
+from src.api.models.users import UserFilterModel
+from src.api.models.users import UsersPageModel
+from src.api.models.users import UsersPageQueryModel
+from src.services.user_service import UserService
+from src.services.user_service import get_user_service
+
+
+router = APIRouter(tags=["Пользователи"])
+users_tags_metadata = {"name": "Пользователи", "description": "Просмотр и выгрузка пользователей."}
+
+
+@router.get(
+    "/list",
+    summary="Постраничный просмотр пользователей",
+    description="Пользователи по возрастанию логина. Следующая страница запрашивается с `after` из `next_after`",
+    response_description="Страница пользователей",
+)
+async def get_page(
+    query: Annotated[UsersPageQueryModel, Query()],
+    user_service: Annotated[UserService, Depends(get_user_service)],
+) -> UsersPageModel:
+    return await user_service.get_page(query)
+
+
+@router.get(
+    "/export",
+    summary="Выгрузка пользователей",
+    description="Все пользователи под фильтр, по одному JSON-объекту на строку",
+    response_description="Поток NDJSON",
+    response_class=StreamingResponse,
+    responses={status.HTTP_200_OK: {"content": {"application/x-ndjson": {}}}},
+)
+async def export(query: Annotated[UserFilterModel, Query()]) -> StreamingResponse:
+    return StreamingResponse(UserService.export(query), media_type="application/x-ndjson")
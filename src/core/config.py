@@ -2,7 +2,9 @@ import logging
 from logging import Logger
 from pathlib import Path
 from typing import Final
+from typing import Literal
 
+from pydantic import BaseModel
 from pydantic import Field
 from pydantic_settings import BaseSettings
 from pydantic_settings import SettingsConfigDict
@@ -11,6 +13,11 @@ from pydantic_settings import SettingsConfigDict
 BASE_DIRECTORY: Final = Path()
 
 
+class ServiceClient(BaseModel):
+    secret_digest: str = Field(pattern=r"^[0-9a-f]{64}$")
+    permissions: list[str] = []
+
+
 class Configs(BaseSettings):
     model_config = SettingsConfigDict(env_file=BASE_DIRECTORY / ".env", extra="allow")
 
@@ -32,9 +39,101 @@ class Configs(BaseSettings):
     pg_password: str = Field(alias="POSTGRES_PASSWORD", serialization_alias="DB_PASSWORD")
     pg_host: str = Field(alias="POSTGRES_HOST", serialization_alias="DB_HOST")
     pg_port: int = Field(alias="POSTGRES_PORT", serialization_alias="DB_PORT")
+    pg_replica_dsns: list[str] = Field(default=[], alias="POSTGRES_REPLICA_DSNS")
+    pg_replica_check_interval: float = 2
+    pg_replica_check_timeout: float = 1
 
     redis_host: str = Field(alias="REDIS_HOST")
     redis_port: int = Field(alias="REDIS_PORT")
+    redis_cluster: bool = False
+    redis_timeout: float = 0.25
+    redis_max_tries: int = 3
+    redis_retry_factor: float = 0.01
+    redis_breaker_failures: int = 5
+    redis_breaker_reset_timeout: float = 5
+    redis_degraded_policy: Literal["fail_closed", "fail_open"] = "fail_closed"
+    redis_recent_size: int = 100_000
+    redis_auto_pipeline: bool = False
+    redis_auto_pipeline_max_batch: int = 1000
+
+    jwt_engine: Literal["pyjwt", "hs256"] = "pyjwt"
+
+    login_filter_counters: int = 16_777_216
+    login_filter_hashes: int = 7
+    login_filter_seed_batch: int = 1000
+    login_filter_seed_timeout: int = 600
+    login_filter_check_interval: float = 60
+
+    service_clients: dict[str, ServiceClient] = {}
+    service_token_expires: int = 3600
+
+    revocation_layout: Literal["keys", "compact", "hash"] = "keys"
+    revocation_legacy_reads: bool = True
+    revocation_stream_batch: int = 500
+    revocation_stream_wait: float = 25
+    revocation_stream_poll_interval: float = 0.2
+
+    shared_cache_enabled: bool = False
+    shared_cache_path: Path = Path("/dev/shm/auth-service-cache")  # noqa: S108
+    shared_cache_watermark_slots: int = 131_072
+    shared_cache_catalog_slots: int = 4096
+    shared_cache_stale_after: float = 2
+    shared_cache_poll_interval: float = 0.2
+
+    projection_ttl: int = 300
+    projection_local_size: int = 10_000
+    projection_local_ttl: float = 2
+
+    docs_enabled: bool = True
+    openapi_path: Path | None = None
+
+    server_host: str = "0.0.0.0"  # noqa: S104
+    server_port: int = 8000
+    server_workers: int = 1
+    server_timeout_keep_alive: int = 5
+    server_timeout_graceful_shutdown: int = 30
+    # Seconds a worker answers not ready after SIGTERM before it drains, for the load balancer to notice
+    server_shutdown_delay: float = 5
+    # Proxies whose X-Forwarded-For gives the client address, "*" for any that can reach the app
+    server_forwarded_allow_ips: str = "127.0.0.1"
+
+    admission_enabled: bool = True
+    admission_capacity: int = 256
+    admission_queue_limit: int = 1000
+    admission_verification_budget: float = 1
+    admission_default_budget: float = 0.5
+    admission_expensive_limit: int = 2
+    admission_expensive_budget: float = 0.25
+    admission_retry_after: int = 1
+
+    profiling_enabled: bool = True
+    profiling_max_seconds: float = 30
+    profiling_min_interval: float = 0.001
+    profiling_memory_frames: int = 10
+
+    capture_enabled: bool = False
+    capture_path: Path = Path("../logs/capture.jsonl")
+    capture_max_bytes: int = 50_000_000
+    capture_backup_count: int = 10
+    capture_sample_rate: float = 1
+
+    export_batch_size: int = 1000
+
+    compaction_enabled: bool = False
+    compaction_interval: float = 86400
+    compaction_retention_days: float = 30
+    compaction_batch_size: int = 500
+    compaction_pause: float = 0.1
+    compaction_lock_timeout: int = 1000
+    compaction_lock_ttl: int = 3600
+    compaction_vacuum: bool = True
+
+    audit_buffer_size: int = 50_000
+    audit_batch_size: int = 1000
+    audit_flush_interval: float = 1
+
+    warmup_postgres_connections: int = 5
+    warmup_redis_connections: int = 5
 
     permission_names: list[str] = Field(alias="PERMISSION_NAMES")
 
@@ -69,6 +168,7 @@ class JWTConfig(BaseSettings):
     authjwt_secret_key: str = Field(alias="JWT_SECRET_KEY")
     authjwt_access_token_expires: int = Field(alias="JWT_EXPIRES_ACCESS_SECONDS")
     authjwt_refresh_token_expires: int = Field(alias="JWT_EXPIRES_REFRESH_SECONDS")
+    # Service clients send an `Authorization: Bearer` header, which only `BearerAuthJWT` reads
     authjwt_token_location: set[str] = {"cookies"}
     authjwt_cookie_csrf_protect: bool = False
 
@@ -29,5 +29,3 @@ def setup_root_logger() -> None:
     logger.addHandler(console)
     logger.addHandler(file)
     logger.setLevel(logging.INFO)
-
-    logging.getLogger("backoff").addHandler(logging.StreamHandler())
@@ -1,50 +1,166 @@
+import time
+from base64 import urlsafe_b64decode
+from datetime import timedelta
+from typing import Any
+from typing import ClassVar
 from typing import Never
 from typing import cast
+from typing import override
+from uuid import uuid4
 
+import orjson
 from async_fastapi_jwt_auth.auth_jwt import AuthJWT
 from async_fastapi_jwt_auth.auth_jwt import AuthJWTBearer
 from fastapi import Request
 from fastapi import Response
 from fastapi import status
 
+from src.core.config import configs
 from src.models.cookie import Cookie
-from src.models.errors import ErrorBody
+from src.models.cookie import CookieTemplate
+from src.models.cookie import cookie_template
 from src.models.jwt import Payload
 from src.services.custom_error import JWTBannedError
+from src.services.hs256_engine import HS256Engine
 
 
 class CustomAuthJWT(AuthJWT):
     _access_expire_key = "access_expire"
     _refresh_expire_key = "refresh_expire"
+    _hs256: ClassVar[HS256Engine | None] = None
+    _verified: tuple[str, bytes] | None = None
+
+    @classmethod
+    def _needs_library(cls) -> bool:
+        """Whether the loaded config uses something the built-in engine lacks"""
+        return (
+            cls._algorithm != "HS256"  # pyright: ignore[reportUnknownMemberType]
+            or cls._decode_algorithms not in (None, ["HS256"])  # pyright: ignore[reportUnknownMemberType]
+            or any((cls._encode_issuer, cls._decode_issuer, cls._decode_audience, cls._denylist_enabled))  # pyright: ignore[reportUnknownMemberType, reportUnknownArgumentType]
+        )
+
+    @classmethod
+    def _engine(cls) -> HS256Engine | None:
+        if configs.jwt_engine != "hs256" or cls._needs_library():
+            return None
+
+        if cls._hs256 is None or cls._hs256.secret != cls._secret_key:  # pyright: ignore[reportUnknownMemberType]
+            leeway = cls._decode_leeway  # pyright: ignore[reportUnknownMemberType, reportUnknownVariableType]
+            seconds = int(leeway.total_seconds()) if isinstance(leeway, timedelta) else leeway or 0  # pyright: ignore[reportUnknownVariableType]
+            cls._hs256 = HS256Engine(cls._secret_key, seconds)  # pyright: ignore[reportUnknownMemberType, reportUnknownArgumentType]
+
+        return cls._hs256
+
+    def _verified_json(self, engine: HS256Engine, encoded_token: str) -> bytes:
+        # The library verifies the same token up to four times per request, the signature is checked once
+        if self._verified is None or self._verified[0] != encoded_token:
+            self._verified = (encoded_token, engine.verify(encoded_token))
+
+        return self._verified[1]
+
+    @override
+    async def _verified_token(self, encoded_token: str, issuer: str | None = None) -> dict[str, Any]:
+        if (engine := self._engine()) is None:
+            return await super()._verified_token(encoded_token, issuer)
+
+        return engine.claims(self._verified_json(engine, encoded_token))
+
+    @override
+    async def _create_token(
+        self,
+        subject: str | int,
+        type_token: str,
+        exp_time: int | None,
+        fresh: bool | None = False,
+        algorithm: str | None = None,
+        headers: dict[str, Any] | None = None,
+        issuer: str | None = None,
+        audience: str | list[str] | None = None,
+        user_claims: dict[str, Any] | None = None,
+    ) -> str:
+        engine = self._engine()
+        if engine is None or headers or issuer or audience or algorithm not in {None, "HS256"}:
+            return await super()._create_token(
+                subject, type_token, exp_time, fresh, algorithm, headers, issuer, audience, user_claims or {}
+            )
+
+        # The claims the library writes, in the same order
+        now = int(time.time())
+        claims: dict[str, Any] = {"sub": subject, "iat": now, "nbf": now, "jti": str(uuid4())}
+        if exp_time:
+            claims["exp"] = exp_time
+        claims["type"] = type_token
+        if type_token == "access":
+            claims["fresh"] = fresh
+        if self.jwt_in_cookies and self._cookie_csrf_protect:  # pyright: ignore[reportUnknownMemberType]
+            claims["csrf"] = str(uuid4())
+        if user_claims:
+            claims.update(user_claims)
+
+        return engine.encode(claims)
 
     async def get_payload(self, encoded_token: str | None = None) -> Payload:
+        token = encoded_token or self._token  # pyright: ignore[reportUnknownMemberType, reportUnknownVariableType]
+        if (engine := self._engine()) is not None and token:
+            return engine.payload(self._verified_json(engine, token))  # pyright: ignore[reportUnknownArgumentType]
+
         raw_jwt = await self.get_raw_jwt(encoded_token)
         assert raw_jwt is not None
         return Payload.model_validate(raw_jwt)
 
+    @staticmethod
+    def _get_unverified_exp(encoded_token: str) -> int:
+        """`exp` of a token this instance has just signed, read without verifying the signature again"""
+        claims = encoded_token.split(".", 2)[1]
+        return orjson.loads(urlsafe_b64decode(claims + "=" * (-len(claims) % 4)))["exp"]
+
+    def _token_cookie_template(self, key: str, path: str) -> CookieTemplate:
+        return cookie_template(
+            key,
+            path=path,
+            domain=self._cookie_domain,  # pyright: ignore[reportUnknownMemberType, reportUnknownArgumentType]
+            secure=self._cookie_secure,  # pyright: ignore[reportUnknownMemberType, reportUnknownArgumentType]
+            httponly=True,
+            samesite=self._cookie_samesite,  # pyright: ignore[reportUnknownMemberType, reportUnknownArgumentType]
+        )
+
+    def _expire_cookie_template(self, key: str) -> CookieTemplate:
+        return cookie_template(key, samesite=None)
+
     async def set_cookies(self, cookie: Cookie, response: Response | None = None) -> None:
         response = response or self._response  # pyright: ignore[reportUnknownVariableType, reportUnknownMemberType, reportAttributeAccessIssue]
         response.set_cookie(**cookie.model_dump())  # pyright: ignore[reportUnknownMemberType]
 
+    def _set_expire_cookie(self, key: str, encoded_token: str, response: Response, max_age: int | None) -> None:
+        value = str(self._get_unverified_exp(encoded_token))
+        if max_age is None:
+            response.set_cookie(key, value, samesite=None)
+        else:
+            self._expire_cookie_template(key).set(response, value, max_age)
+
     async def set_access_cookies(
         self, encoded_access_token: str, response: Response | None = None, max_age: int | None = None
     ) -> None:
-        await super().set_access_cookies(encoded_access_token, response, max_age)
-        payload = await self.get_payload(encoded_access_token)
-        response = response or self._response  # pyright: ignore[reportUnknownVariableType, reportUnknownMemberType, reportAttributeAccessIssue]
-        response.set_cookie(  # pyright: ignore[reportUnknownMemberType]
-            **Cookie(key=self._access_expire_key, value=str(payload.exp), samesite=None, max_age=max_age).model_dump()
-        )
+        response = cast(Response, response or self._response)  # pyright: ignore[reportUnknownMemberType, reportAttributeAccessIssue]
+        if max_age is None or self._cookie_csrf_protect:
+            await super().set_access_cookies(encoded_access_token, response, max_age)
+        else:
+            template = self._token_cookie_template(self._access_cookie_key, self._access_cookie_path)  # pyright: ignore[reportUnknownMemberType, reportUnknownArgumentType]
+            template.set(response, encoded_access_token, max_age)
+
+        self._set_expire_cookie(self._access_expire_key, encoded_access_token, response, max_age)
 
     async def set_refresh_cookies(
         self, encoded_refresh_token: str, response: Response | None = None, max_age: int | None = None
     ) -> None:
-        await super().set_refresh_cookies(encoded_refresh_token, response, max_age)
-        payload = await self.get_payload(encoded_refresh_token)
-        response = response or self._response  # pyright: ignore[reportUnknownVariableType, reportUnknownMemberType, reportAttributeAccessIssue]
-        response.set_cookie(  # pyright: ignore[reportUnknownMemberType]
-            **Cookie(key=self._refresh_expire_key, value=str(payload.exp), samesite=None, max_age=max_age).model_dump()
-        )
+        response = cast(Response, response or self._response)  # pyright: ignore[reportUnknownMemberType, reportAttributeAccessIssue]
+        if max_age is None or self._cookie_csrf_protect:
+            await super().set_refresh_cookies(encoded_refresh_token, response, max_age)
+        else:
+            template = self._token_cookie_template(self._refresh_cookie_key, self._refresh_cookie_path)  # pyright: ignore[reportUnknownMemberType, reportUnknownArgumentType]
+            template.set(response, encoded_refresh_token, max_age)
+
+        self._set_expire_cookie(self._refresh_expire_key, encoded_refresh_token, response, max_age)
 
     async def unset_jwt_cookies(self, response: Response | None = None) -> None:
         await super().unset_jwt_cookies(response)
@@ -65,10 +181,25 @@ class CustomAuthJWT(AuthJWT):
         await self.unset_jwt_cookies()
         response = cast(Response, self._response)  # pyright: ignore[reportUnknownMemberType, reportAttributeAccessIssue]
         response.status_code = status.HTTP_401_UNAUTHORIZED
-        response.body = response.render(ErrorBody(detail=f"{payload_type} token banned").model_dump_json())
+        response.body = orjson.dumps({"detail": f"{payload_type} token banned"})
         raise JWTBannedError(response)
 
 
+class BearerAuthJWT(CustomAuthJWT):
+    """Reads the access token from an `Authorization: Bearer` header if there is one, else from the cookies
+
+    Only for the routes service clients call. On a cookie route a header would let a service token
+    act for a browser, and `jwt_refresh_token_required` would take the header token for the refresh one.
+    """
+
+    _token_location: ClassVar[set[str]] = {"cookies", "headers"}
+
+
 class CustomAuthJWTBearer(AuthJWTBearer):
     def __call__(self, req: Request = None, res: Response = None) -> CustomAuthJWT:  # pyright: ignore[reportArgumentType]
         return CustomAuthJWT(req, res)
+
+
+class BearerAuthJWTBearer(AuthJWTBearer):
+    def __call__(self, req: Request = None, res: Response = None) -> BearerAuthJWT:  # pyright: ignore[reportArgumentType]
+        return BearerAuthJWT(req, res)
@@ -1,8 +1,27 @@
+import asyncio
 from collections.abc import AsyncGenerator
+from collections.abc import Sequence
+from contextlib import suppress
+from functools import partial
+from itertools import count
+from typing import Annotated
+from typing import Any
+from typing import override
 
+from fastapi import Depends
+from sqlalchemy import Connection
+from sqlalchemy import Engine
+from sqlalchemy import event
+from sqlalchemy import text
+from sqlalchemy.engine import ExceptionContext
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import ClauseElement
+from sqlalchemy.sql.dml import UpdateBase
 
 from src.core.config import configs
 
@@ -11,6 +30,126 @@ engine = create_async_engine(configs.postgres_dsn)
 async_session = async_sessionmaker(engine, expire_on_commit=False)
 
 
+class ReplicaPool:
+    """Round-robin over the replicas that passed their last health check"""
+
+    def __init__(self, dsns: Sequence[str]) -> None:
+        self.engines = [create_async_engine(dsn) for dsn in dsns]
+        self.healthy = [True] * len(self.engines)
+        self._turn = count()
+        self._monitor: asyncio.Task[None] | None = None
+        for index, replica in enumerate(self.engines):
+            event.listen(replica.sync_engine, "handle_error", partial(self._on_error, index))
+
+    def _on_error(self, index: int, context: ExceptionContext) -> None:
+        if context.is_disconnect:
+            self._mark(index, healthy=False)
+
+    def _mark(self, index: int, *, healthy: bool) -> None:
+        if self.healthy[index] != healthy:
+            configs.logger.warning("Postgres replica %s is %s", index, "back" if healthy else "down")
+
+        self.healthy[index] = healthy
+
+    def choose(self) -> AsyncEngine | None:
+        for _ in self.engines:
+            index = next(self._turn) % len(self.engines)
+            if self.healthy[index]:
+                return self.engines[index]
+
+        return None
+
+    async def _probe(self, index: int) -> None:
+        try:
+            async with asyncio.timeout(configs.pg_replica_check_timeout), self.engines[index].connect() as connection:
+                await connection.execute(text("SELECT 1"))
+        except (SQLAlchemyError, OSError, TimeoutError):
+            self._mark(index, healthy=False)
+        else:
+            self._mark(index, healthy=True)
+
+    async def check(self) -> None:
+        await asyncio.gather(*(self._probe(index) for index in range(len(self.engines))))
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(configs.pg_replica_check_interval)
+            await self.check()
+
+    def start(self) -> None:
+        if self.engines and self._monitor is None:
+            self._monitor = asyncio.create_task(self._watch())
+
+    async def close(self) -> None:
+        if self._monitor is not None:
+            self._monitor.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._monitor
+            self._monitor = None
+
+        await asyncio.gather(*(replica.dispose() for replica in self.engines))
+
+
+replicas = ReplicaPool(configs.pg_replica_dsns)
+
+
+class RoutingSession(Session):
+    """Reads from one replica until the session writes anything, from then on everything goes to the primary"""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.pinned = False
+        self.replica: AsyncEngine | None = None
+
+    @override
+    def get_bind(  # pyright: ignore[reportIncompatibleMethodOverride]
+        self, mapper: Any = None, *, clause: ClauseElement | None = None, **kwargs: Any
+    ) -> Engine | Connection:
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.pinned = True
+
+        if self.pinned:
+            return engine.sync_engine
+
+        if self.replica is None:
+            self.replica = replicas.choose()
+
+        return (self.replica or engine).sync_engine
+
+
+replica_session = async_sessionmaker(engine, expire_on_commit=False, sync_session_class=RoutingSession)
+
+
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session() as session:
         yield session
+
+
+def open_read_session() -> AsyncSession:
+    return replica_session() if replicas.engines else async_session()
+
+
+async def get_replica_session(
+    session: Annotated[AsyncSession, Depends(get_session)],
+) -> AsyncGenerator[AsyncSession, None]:
+    if not replicas.engines:
+        yield session
+        return
+
+    async with replica_session() as replica:
+        yield replica
+
+
+async def warmup(connections: int) -> None:
+    async def touch() -> None:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(touch() for _ in range(connections)))
+    await replicas.check()
+    replicas.start()
+
+
+async def close() -> None:
+    await replicas.close()
+    await engine.dispose()
@@ -1,9 +1,61 @@
+import asyncio
+
 from redis.asyncio import Redis
+from redis.asyncio import RedisCluster
+from redis.asyncio.client import Pipeline
+from redis.asyncio.cluster import ClusterPipeline
+
+from src.core.config import configs
+from src.services.auto_pipeline import AutoPipeline
+from src.services.circuit_breaker import CircuitBreaker
+from src.services.recent_values import RecentValues
+
+
+type RedisClient = Redis | RedisCluster
+type RedisPipeline = Pipeline | ClusterPipeline
+
+redis: RedisClient | None = None
+# Set up with the client when `redis_auto_pipeline` is on
+pipeline: AutoPipeline | None = None
+breaker = CircuitBreaker(configs.redis_breaker_failures, configs.redis_breaker_reset_timeout)
+recent_values = RecentValues(configs.redis_recent_size)
+projections = RecentValues(configs.projection_local_size, configs.projection_local_ttl)
 
 
-redis: Redis | None = None
+def connect() -> RedisClient:
+    client = RedisCluster if configs.redis_cluster else Redis
+    return client(
+        host=configs.redis_host,
+        port=configs.redis_port,
+        socket_timeout=configs.redis_timeout,
+        socket_connect_timeout=configs.redis_timeout,
+    )
 
 
-def get_redis() -> Redis:
+def get_redis() -> RedisClient:
     assert redis is not None
     return redis
+
+
+def get_auto_pipeline() -> AutoPipeline | None:
+    return pipeline
+
+
+def get_breaker() -> CircuitBreaker:
+    return breaker
+
+
+def get_recent_values() -> RecentValues:
+    return recent_values
+
+
+def get_projections() -> RecentValues:
+    return projections
+
+
+async def warmup(connections: int) -> None:
+    await asyncio.gather(*(get_redis().ping() for _ in range(connections)))
+
+
+async def close() -> None:
+    await get_redis().aclose()
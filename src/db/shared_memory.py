@@ -0,0 +1,229 @@
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Final
+from uuid import UUID
+
+from src.services.custom_error import SharedMemoryUnavailableError
+
+
+MAGIC: Final = b"AUTH"
+LAYOUT: Final = 1
+# magic, layout, heartbeat, watermark slots, catalog slots, flags
+HEADER: Final = struct.Struct("<4sIdIII")
+HEADER_SIZE: Final = 64
+FLAGS: Final = struct.Struct("<I")
+FLAGS_OFFSET: Final = 24
+HEARTBEAT: Final = struct.Struct("<d")
+HEARTBEAT_OFFSET: Final = 8
+WATERMARKS_SYNCED: Final = 1
+CATALOG_SYNCED: Final = 2
+
+SEQUENCE: Final = struct.Struct("<I")
+# sequence, user id, access watermark, refresh watermark, expires at
+WATERMARK: Final = struct.Struct("<I4x16sqqq")
+# sequence, number of entries
+CATALOG_HEADER: Final = struct.Struct("<II")
+CATALOG_HEADER_SIZE: Final = 64
+MAX_NAME: Final = 111
+# permission id, name length, name
+CATALOG_ENTRY: Final = struct.Struct(f"<16sB{MAX_NAME}s")
+
+EMPTY: Final = bytes(16)
+MAX_PROBES: Final = 32
+READ_ATTEMPTS: Final = 16
+
+
+class SharedMemory:
+    """A file in /dev/shm mapped by every worker of the host, with fixed-size records
+
+    It holds the revocation watermarks, in an open-addressing table keyed by user id and probed
+    linearly, and the permission catalog. There is one writer per host. Each record is guarded by
+    a sequence lock: the writer makes its counter odd, writes, then makes it even again, and a
+    reader retries while the counter is odd or has moved. Readers never take a lock.
+
+    A watermark slot is never emptied again, only reused once its watermark has expired, so probe
+    chains stay intact. The writer never resizes or clears a mapped file: it builds a new one and
+    renames it over the old, and readers map the new one when the old goes stale.
+    """
+
+    def __init__(self, path: Path, watermark_slots: int, catalog_slots: int) -> None:
+        self.path = path
+        self.watermark_slots = watermark_slots
+        self.catalog_slots = catalog_slots
+        self.catalog_offset = HEADER_SIZE + watermark_slots * WATERMARK.size
+        self.size = self.catalog_offset + CATALOG_HEADER_SIZE + catalog_slots * CATALOG_ENTRY.size
+        self._map: mmap.mmap | None = None
+        self._inode: int | None = None
+
+    @property
+    def mapped(self) -> bool:
+        return self._map is not None
+
+    def _memory(self) -> mmap.mmap:
+        if self._map is None:
+            raise SharedMemoryUnavailableError
+        return self._map
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+            self._inode = None
+
+    def create(self) -> None:
+        """Maps a new, empty file for writing and puts it in place of the current one"""
+        if self._map is not None:
+            self.set_flags(0)
+            self.close()
+
+        temporary = self.path.with_name(f"{self.path.name}.{os.getpid()}")
+        fd = os.open(temporary, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.ftruncate(fd, self.size)
+            self._map = mmap.mmap(fd, self.size)
+            self._inode = os.fstat(fd).st_ino
+        finally:
+            os.close(fd)
+
+        HEADER.pack_into(self._map, 0, MAGIC, LAYOUT, 0.0, self.watermark_slots, self.catalog_slots, 0)
+        temporary.replace(self.path)
+
+    def open(self) -> bool:
+        """Maps the current file for reading, if not mapped yet. False when it is missing or of another layout"""
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            self.close()
+            return False
+
+        try:
+            stat = os.fstat(fd)
+            if stat.st_ino == self._inode:
+                return True
+
+            self.close()
+            if stat.st_size != self.size:
+                return False
+
+            memory = mmap.mmap(fd, self.size, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+
+        magic, layout, _, watermark_slots, catalog_slots, _ = HEADER.unpack_from(memory, 0)
+        if (magic, layout, watermark_slots, catalog_slots) != (MAGIC, LAYOUT, self.watermark_slots, self.catalog_slots):
+            memory.close()
+            return False
+
+        self._map, self._inode = memory, stat.st_ino
+        return True
+
+    def synced(self, flag: int, since: float) -> bool:
+        """Whether the writer has synced the part behind `flag` and was alive after `since`"""
+        if self._map is None:
+            return False
+
+        (flags,) = FLAGS.unpack_from(self._map, FLAGS_OFFSET)
+        return bool(flags & flag) and HEARTBEAT.unpack_from(self._map, HEARTBEAT_OFFSET)[0] > since
+
+    def set_flags(self, flags: int) -> None:
+        FLAGS.pack_into(self._memory(), FLAGS_OFFSET, flags)
+
+    def beat(self) -> None:
+        HEARTBEAT.pack_into(self._memory(), HEARTBEAT_OFFSET, time.time())
+
+    @staticmethod
+    def _write(memory: mmap.mmap, offset: int, record: struct.Struct, *fields: object) -> None:
+        (sequence,) = SEQUENCE.unpack_from(memory, offset)
+        SEQUENCE.pack_into(memory, offset, (sequence + 1) & 0xFFFFFFFF)
+        record.pack_into(memory, offset, (sequence + 1) & 0xFFFFFFFF, *fields)
+        SEQUENCE.pack_into(memory, offset, (sequence + 2) & 0xFFFFFFFF)
+
+    @staticmethod
+    def _read(memory: mmap.mmap, offset: int, record: struct.Struct) -> tuple[object, ...]:
+        for _ in range(READ_ATTEMPTS):
+            fields = record.unpack_from(memory, offset)
+            if not fields[0] & 1 and SEQUENCE.unpack_from(memory, offset)[0] == fields[0]:
+                return fields
+
+        raise SharedMemoryUnavailableError
+
+    def _slots(self, user_id: UUID) -> list[int]:
+        start = int.from_bytes(user_id.bytes[8:], "little") % self.watermark_slots
+        return [
+            HEADER_SIZE + (start + probe) % self.watermark_slots * WATERMARK.size
+            for probe in range(min(MAX_PROBES, self.watermark_slots))
+        ]
+
+    def watermark(self, token_type: str, user_id: UUID) -> int | None:
+        memory = self._memory()
+        for offset in self._slots(user_id):
+            _, key, access, refresh, _ = self._read(memory, offset, WATERMARK)
+            if key == user_id.bytes:
+                watermark = access if token_type == "access" else refresh
+                return watermark or None
+            if key == EMPTY:
+                return None
+
+        return None
+
+    def put_watermark(self, token_type: str, user_id: UUID, watermark: int, expires_at: int) -> bool:
+        """Raises the user's watermark. False if there is no free slot within `MAX_PROBES`"""
+        memory = self._memory()
+        now = int(time.time())
+        target, current = None, (0, 0, 0)
+        for offset in self._slots(user_id):
+            _, key, access, refresh, expires = WATERMARK.unpack_from(memory, offset)
+            if key == user_id.bytes:
+                target, current = offset, (access, refresh, expires)
+                break
+            if key == EMPTY:
+                target = offset if target is None else target
+                break
+            if target is None and expires < now:
+                target = offset
+
+        if target is None:
+            return False
+
+        access, refresh, expires = current
+        if token_type == "access":
+            access = max(access, watermark)
+        else:
+            refresh = max(refresh, watermark)
+        self._write(memory, target, WATERMARK, user_id.bytes, access, refresh, max(expires, expires_at))
+        return True
+
+    def catalog(self) -> list[tuple[UUID, str]]:
+        memory = self._memory()
+        for _ in range(READ_ATTEMPTS):
+            sequence, count = CATALOG_HEADER.unpack_from(memory, self.catalog_offset)
+            if sequence & 1:
+                continue
+
+            start = self.catalog_offset + CATALOG_HEADER_SIZE
+            entries = [
+                CATALOG_ENTRY.unpack_from(memory, start + index * CATALOG_ENTRY.size)
+                for index in range(min(count, self.catalog_slots))
+            ]
+            if CATALOG_HEADER.unpack_from(memory, self.catalog_offset)[0] == sequence:
+                return [(UUID(bytes=id_), name[:length].decode()) for id_, length, name in entries]
+
+        raise SharedMemoryUnavailableError
+
+    def put_catalog(self, entries: list[tuple[UUID, str]]) -> bool:
+        """Replaces the catalog. False if it has too many entries or a name too long for a slot"""
+        encoded = [(id_.bytes, name.encode()) for id_, name in entries]
+        if len(encoded) > self.catalog_slots or any(len(name) > MAX_NAME for _, name in encoded):
+            return False
+
+        memory = self._memory()
+        (sequence,) = SEQUENCE.unpack_from(memory, self.catalog_offset)
+        CATALOG_HEADER.pack_into(memory, self.catalog_offset, (sequence + 1) & 0xFFFFFFFF, len(encoded))
+        start = self.catalog_offset + CATALOG_HEADER_SIZE
+        for index, (id_, name) in enumerate(encoded):
+            CATALOG_ENTRY.pack_into(memory, start + index * CATALOG_ENTRY.size, id_, len(name), name)
+        CATALOG_HEADER.pack_into(memory, self.catalog_offset, (sequence + 2) & 0xFFFFFFFF, len(encoded))
+        return True
@@ -0,0 +1,72 @@
+from uuid import uuid4
+
+from fastapi import Response
+
+from src.core.config import configs
+from src.core.config import jwt_config
+from src.custom_auth_jwt import CustomAuthJWT
+from src.db import postgres_db
+from src.db import redis_db
+from src.middleware.capture import traffic_capture
+from src.services.audit_trail import audit_trail
+from src.services.compaction import compaction_scheduler
+from src.services.login_filter import login_filter_seeder
+from src.services.password_service import get_password_service
+from src.services.redis_service import RedisService
+from src.services.revocation_feed import RevocationFeed
+from src.services.revocation_feed import revocation_watcher
+from src.services.shared_cache import shared_cache
+
+
+ready = False
+
+
+async def warmup_code_paths() -> None:
+    """Runs token issuance, verification, cookie writing and hashing once, so the first request pays nothing extra"""
+    authorize = CustomAuthJWT()
+    claims = {"permissions": [str(uuid4())]}
+    access_token = await authorize.create_access_token(subject=str(uuid4()), user_claims=claims)
+    refresh_token = await authorize.create_refresh_token(subject=str(uuid4()), user_claims=claims)
+    await authorize.get_payload(access_token)
+    response = Response()
+    await authorize.set_access_cookies(access_token, response, max_age=jwt_config.authjwt_access_token_expires)
+    await authorize.set_refresh_cookies(refresh_token, response, max_age=jwt_config.authjwt_refresh_token_expires)
+
+    password_service = get_password_service()
+    await password_service.check_password("warmup", await password_service.compute_hash("warmup", iters=1))
+
+
+async def startup() -> None:
+    global ready  # noqa: PLW0603
+
+    await postgres_db.warmup(configs.warmup_postgres_connections)
+    await redis_db.warmup(configs.warmup_redis_connections)
+    await warmup_code_paths()
+    audit_trail.start()
+    login_filter_seeder.start()
+    revocation_watcher.start(
+        RevocationFeed(RedisService(redis_db.get_redis(), redis_db.breaker, redis_db.recent_values))
+    )
+    if configs.shared_cache_enabled:
+        shared_cache.start()
+    if configs.capture_enabled:
+        traffic_capture.start()
+    if configs.compaction_enabled:
+        compaction_scheduler.start()
+    ready = True
+    configs.logger.info("Worker is ready")
+
+
+async def shutdown() -> None:
+    global ready  # noqa: PLW0603
+
+    ready = False
+    await compaction_scheduler.stop()
+    traffic_capture.stop()
+    await shared_cache.stop()
+    await revocation_watcher.stop()
+    await login_filter_seeder.stop()
+    await audit_trail.stop()
+    await redis_db.close()
+    await postgres_db.close()
+    configs.logger.info("Worker is stopped")
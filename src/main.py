@@ -1,5 +1,6 @@
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
+from math import ceil
 from typing import Any
 
 from async_fastapi_jwt_auth.exceptions import AuthJWTException
@@ -8,23 +9,31 @@ from fastapi import FastAPI
 from fastapi import Request
 from fastapi import Response
 from fastapi import status
-from fastapi.responses import JSONResponse
 from fastapi.responses import ORJSONResponse
-from redis.asyncio import Redis
 
+from src import lifecycle
 from src.api import access_control
 from src.api import auth
+from src.api import health
+from src.api import profiling
+from src.api import revocations
+from src.api import users
+from src.api.etag import etag_headers
+from src.api.openapi import load_schema
 from src.core.config import JWTConfig
 from src.core.config import configs
 from src.core.config import jwt_config
 from src.core.logger import setup_root_logger
+from src.custom_auth_jwt import CustomAuthJWT
 from src.db import redis_db
-from src.jwt_auth_helpers import CustomAuthJWT
 from src.jwt_auth_helpers import check_permissions
 from src.middleware.middleware import setup_middleware
 from src.models.errors import ErrorBody
+from src.services.auto_pipeline import AutoPipeline
 from src.services.custom_error import JWTBannedError
 from src.services.custom_error import MisdirectedRequestError
+from src.services.custom_error import NotModifiedError
+from src.services.custom_error import RedisUnavailableError
 from src.services.custom_error import ResponseError
 
 
@@ -38,14 +47,21 @@ def get_config() -> JWTConfig:
 
 @asynccontextmanager
 async def lifespan(_: FastAPI) -> AsyncGenerator[None, Any]:
-    redis_db.redis = Redis(host=configs.redis_host, port=configs.redis_port)
+    redis_db.redis = redis_db.connect()
+    if configs.redis_auto_pipeline:
+        redis_db.pipeline = AutoPipeline(redis_db.redis, configs.redis_auto_pipeline_max_batch)
+    await lifecycle.startup()
     yield
-    await redis_db.redis.close()
+    await lifecycle.shutdown()
 
 
 tags_metadata = [
     auth.auth_tags_metadata,
     access_control.permissions_tags_metadata,
+    health.health_tags_metadata,
+    profiling.profiling_tags_metadata,
+    revocations.revocations_tags_metadata,
+    users.users_tags_metadata,
 ]
 
 responses: dict[str | int, Any] = {
@@ -57,9 +73,9 @@ app = FastAPI(
     title=configs.name_app,
     description="",
     version="1.0.0",
-    docs_url="/api/openapi",
-    openapi_url="/api/openapi.json",
-    redoc_url="/api/redoc",
+    docs_url="/api/openapi" if configs.docs_enabled else None,
+    openapi_url="/api/openapi.json" if configs.docs_enabled else None,
+    redoc_url="/api/redoc" if configs.docs_enabled else None,
     openapi_tags=tags_metadata,
     default_response_class=ORJSONResponse,
     responses=responses,
@@ -70,18 +86,32 @@ setup_middleware(app)
 
 
 @app.exception_handler(MisdirectedRequestError)
-async def misdirected_error_handler(_: Request, exc: MisdirectedRequestError) -> JSONResponse:  # noqa: RUF029
-    return JSONResponse(status_code=status.HTTP_421_MISDIRECTED_REQUEST, content=exc.body.model_dump())
+async def misdirected_error_handler(_: Request, exc: MisdirectedRequestError) -> ORJSONResponse:  # noqa: RUF029
+    return ORJSONResponse(status_code=status.HTTP_421_MISDIRECTED_REQUEST, content={"detail": exc.detail})
 
 
 @app.exception_handler(AuthJWTException)
-async def authjwt_exception_handler(_: Request, exc: AuthJWTException) -> JSONResponse:  # noqa: RUF029
-    return JSONResponse(status_code=exc.status_code, content={"detail": exc.message})
+async def authjwt_exception_handler(_: Request, exc: AuthJWTException) -> ORJSONResponse:  # noqa: RUF029
+    return ORJSONResponse(status_code=exc.status_code, content={"detail": exc.message})
 
 
 @app.exception_handler(ResponseError)
-async def response_exception_handler(_: Request, exc: ResponseError) -> JSONResponse:  # noqa: RUF029
-    return JSONResponse(status_code=exc.status_code, content=exc.body.model_dump())
+async def response_exception_handler(_: Request, exc: ResponseError) -> ORJSONResponse:  # noqa: RUF029
+    return ORJSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
+
+
+@app.exception_handler(RedisUnavailableError)
+async def redis_unavailable_handler(_: Request, __: RedisUnavailableError) -> ORJSONResponse:  # noqa: RUF029
+    return ORJSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Сервис временно недоступен"},
+        headers={"Retry-After": str(ceil(configs.redis_breaker_reset_timeout))},
+    )
+
+
+@app.exception_handler(NotModifiedError)
+async def not_modified_handler(_: Request, exc: NotModifiedError) -> Response:  # noqa: RUF029
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(exc.etag))
 
 
 @app.exception_handler(JWTBannedError)
@@ -89,5 +119,13 @@ async def jwt_banned_exception_handler(_: Request, exc: JWTBannedError) -> Respo
     return exc.response
 
 
+app.include_router(health.router, prefix="/health")
 app.include_router(auth.router, prefix="/auth")
 app.include_router(access_control.router, prefix="/permission", dependencies=[Depends(check_permissions)])
+app.include_router(users.router, prefix="/users", dependencies=[Depends(check_permissions)])
+app.include_router(revocations.router, prefix="/revocations", dependencies=[Depends(check_permissions)])
+if configs.profiling_enabled:
+    app.include_router(profiling.router, prefix="/profiling", dependencies=[Depends(check_permissions)])
+
+if configs.docs_enabled and configs.openapi_path is not None:
+    load_schema(app, configs.openapi_path)
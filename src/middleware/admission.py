@@ -0,0 +1,186 @@
+import asyncio
+import heapq
+import itertools
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Final
+
+from fastapi import status
+from fastapi.responses import ORJSONResponse
+from starlette.types import ASGIApp
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+from src.core.config import configs
+
+
+@dataclass(slots=True, frozen=True)
+class AdmissionClass:
+    name: str
+    priority: int
+    limit: int
+    queue_budget: float
+    queue_limit: int
+
+
+@dataclass(slots=True)
+class AdmissionStats:
+    running: int = 0
+    queued: int = 0
+    admitted: int = 0
+    shed: int = 0
+
+
+@dataclass(slots=True, order=True)
+class Waiter:
+    priority: int
+    sequence: int
+    admission_class: AdmissionClass = field(compare=False)
+    future: asyncio.Future[None] = field(compare=False)
+
+
+class AdmissionController:
+    """Admits at most `capacity` requests of the worker at once, and at most `limit` of each class
+
+    A request that finds no slot waits in a queue shared by all classes, where a free slot goes to
+    the waiter with the lowest `priority` whose class is under its limit, first come first served
+    within a priority. A request is shed instead once its class has `queue_limit` requests waiting,
+    or after waiting `queue_budget` seconds.
+    """
+
+    def __init__(self, capacity: int, classes: list[AdmissionClass]) -> None:
+        self.capacity = capacity
+        self.running = 0
+        self.classes = classes
+        self.stats = {admission_class.name: AdmissionStats() for admission_class in classes}
+        self._queue: list[Waiter] = []
+        self._sequence = itertools.count()
+
+    def _can_run(self, admission_class: AdmissionClass) -> bool:
+        return self.running < self.capacity and self.stats[admission_class.name].running < admission_class.limit
+
+    def _start(self, admission_class: AdmissionClass) -> None:
+        stats = self.stats[admission_class.name]
+        self.running += 1
+        stats.running += 1
+        stats.admitted += 1
+
+    def _dispatch(self) -> None:
+        blocked: list[Waiter] = []
+        while self._queue and self.running < self.capacity:
+            waiter = heapq.heappop(self._queue)
+            if waiter.future.done():
+                continue
+
+            if not self._can_run(waiter.admission_class):
+                blocked.append(waiter)
+                continue
+
+            self.stats[waiter.admission_class.name].queued -= 1
+            self._start(waiter.admission_class)
+            waiter.future.set_result(None)
+
+        for waiter in blocked:
+            heapq.heappush(self._queue, waiter)
+
+    async def acquire(self, admission_class: AdmissionClass) -> bool:
+        """Whether the request got a slot, which it gives back with `release`, or has to be shed"""
+        stats = self.stats[admission_class.name]
+        if self._can_run(admission_class):
+            self._start(admission_class)
+            return True
+
+        if stats.queued >= admission_class.queue_limit:
+            stats.shed += 1
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, Waiter(admission_class.priority, next(self._sequence), admission_class, future))
+        stats.queued += 1
+        try:
+            async with asyncio.timeout(admission_class.queue_budget):
+                await future
+        except TimeoutError:
+            pass
+        except BaseException:
+            if future.done() and not future.cancelled():
+                self.release(admission_class)
+            else:
+                stats.queued -= 1
+            raise
+
+        # Granted right as the budget ran out: the slot is taken all the same
+        if future.done() and not future.cancelled():
+            return True
+
+        stats.queued -= 1
+        stats.shed += 1
+        return False
+
+    def release(self, admission_class: AdmissionClass) -> None:
+        self.running -= 1
+        self.stats[admission_class.name].running -= 1
+        self._dispatch()
+
+
+VERIFICATION = AdmissionClass(
+    "verification",
+    priority=0,
+    limit=configs.admission_capacity,
+    queue_budget=configs.admission_verification_budget,
+    queue_limit=configs.admission_queue_limit,
+)
+DEFAULT = AdmissionClass(
+    "default",
+    priority=1,
+    limit=configs.admission_capacity,
+    queue_budget=configs.admission_default_budget,
+    queue_limit=configs.admission_queue_limit,
+)
+EXPENSIVE = AdmissionClass(
+    "expensive",
+    priority=2,
+    limit=configs.admission_expensive_limit,
+    queue_budget=configs.admission_expensive_budget,
+    queue_limit=configs.admission_queue_limit,
+)
+
+ROUTE_CLASSES: Final = {
+    "/auth/checkout_access": VERIFICATION,
+    "/auth/get_payload": VERIFICATION,
+    "/auth/login": EXPENSIVE,
+    "/auth/register": EXPENSIVE,
+    "/auth/change_password": EXPENSIVE,
+}
+# Probes and profiles have to answer under any load, and the revocation feed holds its requests open for long
+BYPASS_PREFIXES: Final = ("/health/", "/profiling/", "/revocations/")
+
+admission = AdmissionController(configs.admission_capacity, [VERIFICATION, DEFAULT, EXPENSIVE])
+
+
+class AdmissionMiddleware:
+    def __init__(self, app: ASGIApp, controller: AdmissionController) -> None:
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path: str = scope.get("path", "")
+        if scope["type"] != "http" or path.startswith(BYPASS_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        admission_class = ROUTE_CLASSES.get(path, DEFAULT)
+        if not await self.controller.acquire(admission_class):
+            response = ORJSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"detail": "Сервис перегружен"},
+                headers={"Retry-After": str(configs.admission_retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(admission_class)
@@ -0,0 +1,184 @@
+import hashlib
+import hmac
+import logging
+import random
+import time
+from base64 import urlsafe_b64decode
+from collections.abc import Iterable
+from http.cookies import CookieError
+from http.cookies import SimpleCookie
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from queue import SimpleQueue
+from typing import Any
+from typing import Final
+
+import orjson
+from starlette.types import ASGIApp
+from starlette.types import Message
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+from src.core.config import configs
+from src.core.config import jwt_config
+
+
+TOKEN_COOKIES: Final = {"access_token_cookie": "access", "refresh_token_cookie": "refresh"}
+ACTOR_LENGTH: Final = 16
+
+
+def unverified_claims(encoded_token: str) -> dict[str, Any] | None:
+    """Claims of a token, read without checking the signature: only their shape is ever kept"""
+    try:
+        claims = encoded_token.split(".", 2)[1]
+        decoded = orjson.loads(urlsafe_b64decode(claims + "=" * (-len(claims) % 4)))
+    except (IndexError, ValueError):
+        return None
+
+    return decoded if isinstance(decoded, dict) else None
+
+
+def parse_cookies(header: bytes) -> dict[str, str]:
+    try:
+        return {name: morsel.value for name, morsel in SimpleCookie(header.decode("latin-1")).items()}
+    except CookieError:
+        return {}
+
+
+class TrafficCapture:
+    """Sanitized shape of every request, one JSON line each, in rotating files for `bench.replay`
+
+    A line holds the route, method, status and duration, the names of the query parameters and the
+    shape of the tokens presented or issued: their age, time left and number of permissions. It never
+    holds a token, a cookie, a body or a query value. Requests of the same user share an `actor`,
+    an HMAC of the user id under a key derived from the JWT secret, so it matches across workers
+    and restarts but cannot be traced back without the secret.
+
+    Lines go through a queue to a thread that writes the file, so a request never waits on disk.
+    """
+
+    def __init__(self, path: Path, max_bytes: int, backup_count: int, sample_rate: float) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.sample_rate = sample_rate
+        self.enabled = False
+        self._key = hmac.digest(jwt_config.authjwt_secret_key.encode(), b"traffic-capture", hashlib.sha256)
+        self._logger = logging.getLogger(f"{configs.name_app}.capture")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._listener: QueueListener | None = None
+
+    def sampled(self) -> bool:
+        return self.enabled and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def actor(self, user_id: str) -> str:
+        return hmac.digest(self._key, user_id.encode(), hashlib.sha256).hex()[:ACTOR_LENGTH]
+
+    def token_shape(self, encoded_token: str, now: float) -> tuple[dict[str, Any], str | None] | None:
+        if (claims := unverified_claims(encoded_token)) is None:
+            return None
+
+        shape: dict[str, Any] = {}
+        if isinstance(iat := claims.get("iat"), int):
+            shape["age"] = round(now - iat)
+        if isinstance(exp := claims.get("exp"), int):
+            shape["ttl"] = round(exp - now)
+        if isinstance(permissions := claims.get("permissions"), list):
+            shape["permissions"] = len(permissions)  # pyright: ignore[reportUnknownArgumentType]
+
+        subject = claims.get("sub")
+        return shape, self.actor(subject) if isinstance(subject, str) else None
+
+    def tokens(
+        self, headers: Iterable[tuple[bytes, bytes]], header: bytes, now: float
+    ) -> tuple[dict[str, dict[str, Any]], str | None]:
+        """Shapes of the tokens in the `header` cookies, by token type, and the actor they belong to"""
+        shapes: dict[str, dict[str, Any]] = {}
+        actor = None
+        for name, value in headers:
+            if name != header:
+                continue
+
+            for cookie, encoded_token in parse_cookies(value).items():
+                if (token_type := TOKEN_COOKIES.get(cookie)) and (shape := self.token_shape(encoded_token, now)):
+                    shapes[token_type], actor = shape[0], actor or shape[1]
+
+        return shapes, actor
+
+    def record(self, line: dict[str, Any]) -> None:
+        self._logger.info(orjson.dumps(line).decode())
+
+    def start(self) -> None:
+        if self._listener is not None:
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        file = RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backup_count)
+        file.setFormatter(logging.Formatter("%(message)s"))
+        queue: SimpleQueue[logging.LogRecord] = SimpleQueue()
+        self._logger.addHandler(QueueHandler(queue))
+        self._listener = QueueListener(queue, file)
+        self._listener.start()
+        self.enabled = True
+
+    def stop(self) -> None:
+        self.enabled = False
+        if self._listener is None:
+            return
+
+        self._listener.stop()
+        for handler in (*self._logger.handlers, *self._listener.handlers):
+            handler.close()
+        self._logger.handlers.clear()
+        self._listener = None
+
+
+traffic_capture = TrafficCapture(
+    configs.capture_path, configs.capture_max_bytes, configs.capture_backup_count, configs.capture_sample_rate
+)
+
+
+class CaptureMiddleware:
+    def __init__(self, app: ASGIApp, capture: TrafficCapture) -> None:
+        self.app = app
+        self.capture = capture
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.capture.sampled():
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.time()
+        started = time.perf_counter()
+        line: dict[str, Any] = {
+            "at": round(started_at, 6),
+            "method": scope["method"],
+            "route": scope["path"],
+            "status": None,
+        }
+        if query := scope.get("query_string"):
+            line["query"] = sorted({part.partition(b"=")[0].decode("latin-1") for part in query.split(b"&") if part})
+
+        shapes, actor = self.capture.tokens(scope["headers"], b"cookie", started_at)
+        line.update(shapes)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal actor
+            if message["type"] == "http.response.start":
+                line["status"] = message["status"]
+                # A login has no token yet: the user is known from the ones it issues
+                if actor is None:
+                    actor = self.capture.tokens(message.get("headers", []), b"set-cookie", started_at)[1]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            line["ms"] = round((time.perf_counter() - started) * 1000, 3)
+            if actor is not None:
+                line["actor"] = actor
+            self.capture.record(line)
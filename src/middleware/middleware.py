@@ -1,12 +1,22 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from src.core.config import configs
+from src.middleware.admission import AdmissionMiddleware
+from src.middleware.admission import admission
+from src.middleware.capture import CaptureMiddleware
+from src.middleware.capture import traffic_capture
+
 
 def setup_middleware(app: FastAPI) -> None:
     allow_origins = [
         "http://127.0.0.1:99",
     ]
 
+    # Added first so that it runs inside CORS, and shed responses still carry its headers
+    if configs.admission_enabled:
+        app.add_middleware(AdmissionMiddleware, controller=admission)
+
     app.add_middleware(
         CORSMiddleware,
         allow_origins=allow_origins,
@@ -14,3 +24,7 @@ def setup_middleware(app: FastAPI) -> None:
         allow_methods=["*"],
         allow_headers=["*"],
     )
+
+    # Added last so that it is outermost, and the durations include the time spent queued for admission
+    if configs.capture_enabled:
+        app.add_middleware(CaptureMiddleware, capture=traffic_capture)
@@ -10,6 +10,9 @@ from sqlalchemy import Index
 from sqlalchemy import Integer
 from sqlalchemy import String
 from sqlalchemy import Table
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import INET
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import Mapped
@@ -30,12 +33,31 @@ user_permission = Table(
     Base.metadata,
     Column[uuid.UUID]("user_id", ForeignKey("user.id", ondelete="CASCADE"), primary_key=True),
     Column[uuid.UUID]("permission_id", ForeignKey("permission.id", ondelete="CASCADE"), primary_key=True),
+    Index("ix_user_permission_permission_id", "permission_id"),
+)
+
+
+audit_event = Table(
+    "audit_event",
+    Base.metadata,
+    Column[datetime]("occurred_at", DateTime(timezone=True), nullable=False),
+    Column[str]("event", String(32), nullable=False),
+    Column[uuid.UUID]("user_id", UUID(as_uuid=True), nullable=True),
+    Column[str]("login", String(60), nullable=True),
+    Column[str]("address", INET, nullable=True),
+    Column[dict[str, str]]("detail", JSONB, nullable=True),
+    Index("ix_audit_event_user_id_occurred_at", "user_id", "occurred_at"),
+    postgresql_partition_by="RANGE (occurred_at)",
 )
 
 
 class UserOrm(Base):
     __tablename__ = "user"
-    __table_args__ = (Index("id_deleted", "id", "is_deleted"), Index("login_deleted", "login", "is_deleted"))
+    __table_args__ = (
+        Index("id_deleted", "id", "is_deleted"),
+        # Only the deleted rows, which the compaction looks up by deletion time
+        Index("ix_user_deleted_modified_at", "modified_at", postgresql_where=text("is_deleted")),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     login: Mapped[str] = mapped_column(String(60), unique=True, nullable=False)
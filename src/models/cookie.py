@@ -1,7 +1,15 @@
+from dataclasses import dataclass
 from datetime import datetime
+from functools import cache
+from typing import Final
 from typing import Literal
 
 from pydantic import BaseModel
+from starlette.responses import Response
+
+
+_VALUE_MARK: Final = "cookievaluemark"
+_MAX_AGE_MARK: Final = 918273645
 
 
 class Cookie(BaseModel):
@@ -14,3 +22,45 @@ class Cookie(BaseModel):
     secure: bool = False
     httponly: bool = False
     samesite: Literal["lax", "strict", "none"] | None = "lax"
+
+
+@dataclass(slots=True, frozen=True)
+class CookieTemplate:
+    """`Set-Cookie` header of a cookie with fixed attributes, split around its value and max age"""
+
+    prefix: str
+    middle: str
+    suffix: str
+
+    def render(self, value: str, max_age: int) -> tuple[bytes, bytes]:
+        return b"set-cookie", f"{self.prefix}{value}{self.middle}{max_age}{self.suffix}".encode("latin-1")
+
+    def set(self, response: Response, value: str, max_age: int) -> None:
+        response.raw_headers.append(self.render(value, max_age))
+
+
+@cache
+def cookie_template(
+    key: str,
+    path: str | None = "/",
+    domain: str | None = None,
+    secure: bool = False,
+    httponly: bool = False,
+    samesite: Literal["lax", "strict", "none"] | None = "lax",
+) -> CookieTemplate:
+    """Renders the header once through `Response.set_cookie`, so templated cookies match it byte for byte"""
+    response = Response()
+    response.set_cookie(
+        key,
+        _VALUE_MARK,
+        max_age=_MAX_AGE_MARK,
+        path=path,
+        domain=domain,
+        secure=secure,
+        httponly=httponly,
+        samesite=samesite,
+    )
+    header = response.headers["set-cookie"]
+    prefix, rest = header.split(_VALUE_MARK)
+    middle, suffix = rest.split(str(_MAX_AGE_MARK))
+    return CookieTemplate(prefix, middle, suffix)
@@ -9,5 +9,7 @@ class Payload(BaseModel):
     iat: int
     jti: UUID
     exp: int
+    nbf: int | None = None
     type: str
     permissions: list[UUID]
+    client: str | None = None
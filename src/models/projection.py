@@ -0,0 +1,19 @@
+from dataclasses import dataclass
+from uuid import UUID
+
+
+@dataclass(slots=True, frozen=True)
+class UserProjection:
+    """What the permission and account endpoints need to know about a user. Never carries credentials"""
+
+    id: UUID
+    login: str
+    is_deleted: bool
+    permissions: tuple[UUID, ...]
+
+
+@dataclass(slots=True, frozen=True)
+class PermissionProjection:
+    id: UUID
+    name: str
+    description: str | None
@@ -0,0 +1,65 @@
+import signal
+import time
+from types import FrameType
+from typing import override
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from src import lifecycle
+from src.core.config import configs
+
+
+class Server(uvicorn.Server):
+    """Turns not ready on SIGTERM and keeps serving for `server_shutdown_delay` seconds before draining
+
+    The load balancer sees `/health/ready` fail and stops sending requests while the listener is
+    still open, so none of them is refused. A second signal, or SIGINT, shuts down at once.
+    """
+
+    def __init__(self, config: uvicorn.Config) -> None:
+        super().__init__(config)
+        self.exit_at: float | None = None
+
+    @override
+    def handle_exit(self, sig: int, frame: FrameType | None) -> None:
+        lifecycle.ready = False
+        if sig == signal.SIGTERM and self.exit_at is None and configs.server_shutdown_delay > 0:
+            configs.logger.info(f"Worker is not ready, shutting down in {configs.server_shutdown_delay}s")
+            self.exit_at = time.monotonic() + configs.server_shutdown_delay
+            return
+
+        super().handle_exit(sig, frame)
+
+    @override
+    async def on_tick(self, counter: int) -> bool:
+        if self.exit_at is not None and not self.should_exit and time.monotonic() >= self.exit_at:
+            super().handle_exit(signal.SIGTERM, None)
+
+        return await super().on_tick(counter)
+
+
+def main() -> None:
+    config = uvicorn.Config(
+        "src.main:app",
+        host=configs.server_host,
+        port=configs.server_port,
+        workers=configs.server_workers,
+        loop="uvloop",
+        http="httptools",
+        lifespan="on",
+        proxy_headers=True,
+        forwarded_allow_ips=configs.server_forwarded_allow_ips,
+        timeout_keep_alive=configs.server_timeout_keep_alive,
+        timeout_graceful_shutdown=configs.server_timeout_graceful_shutdown,
+    )
+    server = Server(config)
+    # What `uvicorn.run` does, with the server above
+    if config.workers > 1:
+        Multiprocess(config, target=server.run, sockets=[config.bind_socket()]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    main()
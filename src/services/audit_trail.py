@@ -0,0 +1,208 @@
+import asyncio
+from contextlib import suppress
+from dataclasses import dataclass
+from datetime import UTC
+from datetime import datetime
+from enum import StrEnum
+from typing import Any
+from uuid import UUID
+
+import orjson
+from fastapi import Request
+from psycopg import DataError as PsycopgDataError
+from psycopg import Error as PsycopgError
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.core.config import configs
+from src.db.postgres_db import engine
+
+
+class AuditEventType(StrEnum):
+    registered = "registered"
+    login = "login"
+    login_failed = "login_failed"
+    service_token = "service_token"
+    service_token_failed = "service_token_failed"
+    logout = "logout"
+    logout_all = "logout_all"
+    password_changed = "password_changed"
+    password_change_failed = "password_change_failed"
+    account_deleted = "account_deleted"
+    permission_created = "permission_created"
+    permission_updated = "permission_updated"
+    permission_deleted = "permission_deleted"
+    permission_assigned = "permission_assigned"
+    permission_taken_away = "permission_taken_away"
+
+
+@dataclass(slots=True, frozen=True)
+class AuditRecord:
+    occurred_at: datetime
+    event: AuditEventType
+    user_id: UUID | None
+    login: str | None
+    address: str | None
+    detail: dict[str, Any] | None
+
+    def row(self) -> tuple[Any, ...]:
+        detail = None if self.detail is None else orjson.dumps(self.detail).decode()
+        return (self.occurred_at, self.event.value, self.user_id, self.login, self.address, detail)
+
+
+# Length of `audit_event.login`: longer logins and client ids, as sent by clients, are cut to fit
+LOGIN_MAX_LENGTH = 60
+COPY_AUDIT_EVENT = "COPY audit_event (occurred_at, event, user_id, login, address, detail) FROM STDIN"
+
+
+def _month_start(year: int, month: int) -> datetime:
+    return datetime(year + (month - 1) // 12, (month - 1) % 12 + 1, 1, tzinfo=UTC)
+
+
+async def create_partition(year: int, month: int) -> None:
+    start, end = _month_start(year, month), _month_start(year, month + 1)
+    async with engine.begin() as connection:
+        await connection.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS audit_event_y{start:%Ym%m} PARTITION OF audit_event "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+        )
+
+
+async def copy_records(records: list[AuditRecord]) -> None:
+    async with engine.connect() as connection:
+        raw = (await connection.get_raw_connection()).driver_connection
+        async with raw.cursor() as cursor, cursor.copy(COPY_AUDIT_EVENT) as copy:  # pyright: ignore[reportOptionalMemberAccess, reportUnknownMemberType, reportUnknownVariableType]
+            for record in records:
+                await copy.write_row(record.row())  # pyright: ignore[reportUnknownMemberType]
+
+        await raw.commit()  # pyright: ignore[reportOptionalMemberAccess, reportUnknownMemberType]
+
+
+class AuditTrail:
+    """In-process buffer of audit records, written to Postgres in batches with COPY
+
+    `push` never waits: once `max_size` records are waiting, new ones are counted in `dropped`
+    and discarded. The background task flushes when `batch_size` records are waiting or every
+    `flush_interval` seconds, and once more on shutdown. A batch that failed for want of Postgres
+    goes back to the front of the buffer, as much of it as still fits. One that Postgres rejected
+    is split in halves until the rejected records are alone, and those are dropped: retrying them
+    would stall the trail.
+    """
+
+    def __init__(self, max_size: int, batch_size: int, flush_interval: float) -> None:
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer: list[AuditRecord] = []
+        self.dropped = 0
+        self._reported_dropped = 0
+        self._partitions: set[tuple[int, int]] = set()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+
+    def push(self, record: AuditRecord) -> None:
+        if len(self.buffer) >= self.max_size:
+            self.dropped += 1
+            return
+
+        self.buffer.append(record)
+        if len(self.buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _ensure_partitions(self, months: set[tuple[int, int]]) -> None:
+        # Attempted once per month and worker: without its partition, a month is written to the default one
+        for month in months - self._partitions:
+            self._partitions.add(month)
+            try:
+                await create_partition(*month)
+            except (SQLAlchemyError, OSError) as error:
+                configs.logger.warning(f"Audit partition {month} not created: {error!r}")
+
+    async def _write(self, batch: list[AuditRecord]) -> None:
+        try:
+            await copy_records(batch)
+        except PsycopgDataError as error:
+            if len(batch) == 1:
+                configs.logger.warning(f"Audit record dropped, Postgres rejected it: {batch[0]!r} {error!r}")
+                self.dropped += 1
+                return
+
+            middle = len(batch) // 2
+            await self._write(batch[:middle])
+            await self._write(batch[middle:])
+
+    async def flush(self) -> None:
+        while self.buffer:
+            batch = self.buffer[: self.batch_size]
+            del self.buffer[: self.batch_size]
+            try:
+                await self._ensure_partitions({(record.occurred_at.year, record.occurred_at.month) for record in batch})
+                await self._write(batch)
+            except (SQLAlchemyError, PsycopgError, OSError) as error:
+                configs.logger.warning(f"Audit batch of {len(batch)} records not written: {error!r}")
+                kept = batch[: self.max_size - len(self.buffer)]
+                self.buffer[:0] = kept
+                self.dropped += len(batch) - len(kept)
+                break
+            except BaseException:
+                self.buffer[:0] = batch
+                raise
+
+        if self.dropped != self._reported_dropped:
+            configs.logger.warning(f"Audit records dropped so far: {self.dropped}")
+            self._reported_dropped = self.dropped
+
+    async def _run(self) -> None:
+        now = datetime.now(UTC)
+        next_month = _month_start(now.year, now.month + 1)
+        await self._ensure_partitions({(now.year, now.month), (next_month.year, next_month.month)})
+
+        while True:
+            with suppress(TimeoutError):
+                async with asyncio.timeout(self.flush_interval):
+                    await self._wakeup.wait()
+
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+        await self.flush()
+
+
+audit_trail = AuditTrail(configs.audit_buffer_size, configs.audit_batch_size, configs.audit_flush_interval)
+
+
+@dataclass(slots=True, frozen=True)
+class RequestAudit:
+    """The audit trail as seen from one request, which supplies the client address"""
+
+    trail: AuditTrail
+    address: str | None
+
+    def push(
+        self,
+        event: AuditEventType,
+        *,
+        user_id: UUID | None = None,
+        login: str | None = None,
+        detail: dict[str, Any] | None = None,
+    ) -> None:
+        login = None if login is None else login[:LOGIN_MAX_LENGTH]
+        self.trail.push(AuditRecord(datetime.now(UTC), event, user_id, login, self.address, detail))
+
+
+def get_audit(request: Request) -> RequestAudit:
+    # Behind nginx this is the client's address only while `server_forwarded_allow_ips` trusts nginx
+    return RequestAudit(audit_trail, request.client.host if request.client is not None else None)
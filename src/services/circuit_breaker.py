@@ -0,0 +1,62 @@
+import time
+from enum import StrEnum
+
+
+class CircuitState(StrEnum):
+    closed = "closed"
+    open = "open"
+    half_open = "half_open"
+
+
+class CircuitBreaker:
+    """Stops calling a dependency after `failure_threshold` failures in a row
+
+    Once `reset_timeout` seconds have passed, a single probe call is let through: its success
+    closes the circuit again, its failure keeps it open for another `reset_timeout`.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+
+    @property
+    def state(self) -> CircuitState:
+        if self.opened_at is None:
+            return CircuitState.closed
+
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return CircuitState.half_open
+
+        return CircuitState.open
+
+    def allow(self) -> bool:
+        match self.state:
+            case CircuitState.closed:
+                return True
+            case CircuitState.half_open if not self.probing:
+                self.probing = True
+                return True
+            case _:
+                return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self) -> bool:
+        """Returns whether this failure has opened the circuit"""
+        self.failures += 1
+        self.probing = False
+        was_open = self.opened_at is not None
+        if was_open or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+        return not was_open and self.opened_at is not None
+
+    def release(self) -> None:
+        """Gives up a probe that ended without an answer either way, e.g. a cancelled request"""
+        self.probing = False
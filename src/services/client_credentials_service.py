@@ -0,0 +1,59 @@
+import hashlib
+import hmac
+from typing import Final
+from uuid import UUID
+from uuid import uuid5
+
+from src.core.config import ServiceClient
+from src.core.config import configs
+
+
+SERVICE_CLIENT_NAMESPACE: Final = UUID("a63b1bb6-dcad-493a-925c-b085242c818b")
+# Compared against when the client id is unknown, so the timing does not tell which ids exist
+UNKNOWN_CLIENT_DIGEST: Final = bytes(hashlib.sha256().digest_size)
+
+
+def secret_digest(client_id: str, secret: str) -> str:
+    """What `SERVICE_CLIENTS` stores instead of the secret: HMAC-SHA256 of the client id keyed by the secret"""
+    return hmac.digest(secret.encode(), client_id.encode(), hashlib.sha256).hex()
+
+
+def client_subject(client_id: str) -> UUID:
+    """`sub` of the client's tokens: the same for every token and worker, and never the id of a user"""
+    return uuid5(SERVICE_CLIENT_NAMESPACE, client_id)
+
+
+class ClientCredentialsService:
+    """Service clients from `SERVICE_CLIENTS`, authenticated by a pre-shared secret
+
+    Secrets are random and long, so one HMAC and a constant-time comparison verify them: there is
+    nothing for PBKDF2 to slow down, unlike a password.
+    """
+
+    def __init__(self, clients: dict[str, ServiceClient]) -> None:
+        self.clients = clients
+        self._digests = {client_id: bytes.fromhex(client.secret_digest) for client_id, client in clients.items()}
+
+    def authenticate(self, client_id: str, secret: str) -> ServiceClient | None:
+        expected = self._digests.get(client_id, UNKNOWN_CLIENT_DIGEST)
+        presented = hmac.digest(secret.encode(), client_id.encode(), hashlib.sha256)
+        if not hmac.compare_digest(presented, expected):
+            return None
+
+        return self.clients.get(client_id)
+
+    @staticmethod
+    def scope(client: ServiceClient, requested: str | None) -> list[str] | None:
+        """Names of the permissions to grant: all the client's without `requested`, None if it asks for more"""
+        if requested is None:
+            return client.permissions
+
+        names = list(dict.fromkeys(requested.split()))
+        return names if set(names) <= set(client.permissions) else None
+
+
+client_credentials_service = ClientCredentialsService(configs.service_clients)
+
+
+def get_client_credentials_service() -> ClientCredentialsService:
+    return client_credentials_service
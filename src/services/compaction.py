@@ -0,0 +1,221 @@
+import asyncio
+from contextlib import suppress
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import UTC
+from datetime import datetime
+from datetime import timedelta
+from typing import Final
+from uuid import UUID
+from uuid import uuid4
+
+from redis.exceptions import RedisError
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.core.config import configs
+from src.core.config import jwt_config
+from src.db import redis_db
+from src.db.postgres_db import async_session
+from src.db.postgres_db import engine
+from src.db.redis_db import RedisClient
+from src.models.alchemy_model import UserOrm
+from src.services.custom_error import RedisUnavailableError
+from src.services.projection_cache import ProjectionCache
+from src.services.redis_service import Key
+from src.services.redis_service import RedisService
+from src.services.revocation_service import watermark_key
+
+
+LOCK_KEY: Final = Key("compaction", "user", "lock")
+# Deletes the lock only while it is still ours, not one another worker took after ours expired
+RELEASE_SCRIPT: Final = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+# The user's permissions go with it, by the cascade of `user_permission`
+RELATIONS: Final = ("user", "user_permission")
+
+
+@dataclass(slots=True, frozen=True)
+class RelationSize:
+    table: int
+    indexes: int
+
+
+@dataclass(slots=True)
+class CompactionReport:
+    cutoff: datetime
+    users: int = 0
+    batches: int = 0
+    before: dict[str, RelationSize] = field(default_factory=dict)
+    after: dict[str, RelationSize] = field(default_factory=dict)
+
+    @property
+    def table_bytes(self) -> int:
+        """Bytes the tables gave back to the file system"""
+        return sum(self.before[name].table - self.after[name].table for name in self.before)
+
+    @property
+    def index_bytes(self) -> int:
+        """Bytes the indexes gave back to the file system"""
+        return sum(self.before[name].indexes - self.after[name].indexes for name in self.before)
+
+    def __str__(self) -> str:
+        return (
+            f"purged {self.users} users deleted before {self.cutoff.isoformat()} in {self.batches} batches, "
+            f"reclaimed {self.table_bytes} table bytes and {self.index_bytes} index bytes"
+        )
+
+
+def retention() -> timedelta:
+    """Never shorter than a refresh token lives: a purged user cannot have a token left to revoke"""
+    return max(
+        timedelta(days=configs.compaction_retention_days),
+        timedelta(seconds=jwt_config.authjwt_refresh_token_expires),
+    )
+
+
+class UserCompaction:
+    """Purges users soft-deleted longer ago than `retention()`, with everything kept for them in Redis
+
+    `modified_at` of a deleted user is its deletion time, as nothing updates the row afterwards.
+    Each batch is its own short transaction: it takes only the rows it deletes, skips those another
+    transaction holds, and gives up on a lock it waits for longer than `compaction_lock_timeout`.
+
+    A delete only frees space inside the table and index files, for new rows to reuse. With
+    `compaction_vacuum` the run ends with a VACUUM, which gives trailing empty pages of the table
+    back to the file system; the report counts the bytes the relations shrank by.
+    """
+
+    def __init__(self, redis: RedisService) -> None:
+        self.redis = redis
+        self.cache = ProjectionCache(redis)
+
+    @staticmethod
+    async def sizes() -> dict[str, RelationSize]:
+        stmt = text("SELECT pg_table_size(CAST(:name AS regclass)), pg_indexes_size(CAST(:name AS regclass))")
+        async with engine.connect() as connection:
+            return {
+                name: RelationSize(*(await connection.execute(stmt, {"name": f'"{name}"'})).one()) for name in RELATIONS
+            }
+
+    @staticmethod
+    async def vacuum() -> None:
+        # VACUUM cannot run inside a transaction
+        async with engine.connect() as connection:
+            autocommit = await connection.execution_options(isolation_level="AUTOCOMMIT")
+            for name in RELATIONS:
+                await autocommit.execute(text(f'VACUUM (ANALYZE) "{name}"'))
+
+    @staticmethod
+    async def purge_batch(cutoff: datetime) -> dict[UUID, str]:
+        batch = (
+            select(UserOrm.id)
+            .where(UserOrm.is_deleted == True, UserOrm.modified_at < cutoff)  # noqa: E712
+            .order_by(UserOrm.modified_at)
+            .limit(configs.compaction_batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            delete(UserOrm)
+            .where(UserOrm.id.in_(batch))
+            .returning(UserOrm.id, UserOrm.login)
+            .execution_options(synchronize_session=False)
+        )
+        async with async_session() as session, session.begin():
+            await session.execute(select(func.set_config("lock_timeout", f"{configs.compaction_lock_timeout}ms", True)))
+            return dict((await session.execute(stmt)).tuples().all())
+
+    async def forget(self, users: dict[UUID, str]) -> None:
+        """Drops the projections and the revocation watermarks of purged users, instead of waiting for their TTL"""
+        await self.cache.forget_users(users)
+        await self.redis.delete(
+            *(watermark_key(token_type, id_) for id_ in users for token_type in ("access", "refresh"))
+        )
+
+    async def run(self) -> CompactionReport:
+        report = CompactionReport(cutoff=datetime.now(UTC) - retention())
+        report.before = await self.sizes()
+        while True:
+            try:
+                users = await self.purge_batch(report.cutoff)
+            except OperationalError as error:
+                configs.logger.warning(
+                    f"Compaction batch gave up on a lock, the rest is left for the next run: {error!r}"
+                )
+                break
+
+            if not users:
+                break
+
+            report.users += len(users)
+            report.batches += 1
+            with suppress(RedisUnavailableError, RedisError):
+                await self.forget(users)
+
+            await asyncio.sleep(configs.compaction_pause)
+
+        if configs.compaction_vacuum and report.users:
+            await self.vacuum()
+
+        report.after = await self.sizes()
+        configs.logger.info(f"Compaction {report}")
+        return report
+
+    async def run_locked(self) -> CompactionReport | None:
+        """Runs unless another worker does. None if it did not run"""
+        token = uuid4().bytes
+
+        async def lock(redis: RedisClient) -> bool | None:
+            return await redis.set(str(LOCK_KEY), token, ex=configs.compaction_lock_ttl, nx=True)
+
+        if not await self.redis.execute(lock):
+            return None
+
+        try:
+            return await self.run()
+        finally:
+            # Left to expire after `compaction_lock_ttl` if Redis is down, the run's outcome is what counts
+            try:
+                await self.redis.execute(lambda redis: redis.eval(RELEASE_SCRIPT, 1, str(LOCK_KEY), token))
+            except (RedisUnavailableError, RedisError) as error:
+                configs.logger.warning(f"Compaction lock not released: {error!r}")
+
+
+class CompactionScheduler:
+    """Compacts the `user` table every `interval` seconds, on one worker at a time"""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._task: asyncio.Task[None] | None = None
+
+    async def _run(self) -> None:
+        while True:
+            compaction = UserCompaction(RedisService(redis_db.get_redis(), redis_db.breaker, redis_db.recent_values))
+            try:
+                await compaction.run_locked()
+            except (RedisUnavailableError, RedisError, SQLAlchemyError) as error:
+                configs.logger.warning(f"Compaction failed: {error!r}")
+
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+
+compaction_scheduler = CompactionScheduler(configs.compaction_interval)
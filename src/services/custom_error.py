@@ -1,19 +1,38 @@
 from fastapi import Response
 
-from src.models.errors import ErrorBody
-
 
 class MisdirectedRequestError(Exception):
     def __init__(self, detail: str) -> None:
-        self.body = ErrorBody(detail=detail)
+        self.detail = detail
 
 
 class ResponseError(Exception):
     def __init__(self, status_code: int, detail: str) -> None:
         self.status_code = status_code
-        self.body = ErrorBody(detail=detail)
+        self.detail = detail
 
 
 class JWTBannedError(Exception):
     def __init__(self, response: Response) -> None:
         self.response = response
+
+
+class RedisUnavailableError(Exception):
+    pass
+
+
+class NotModifiedError(Exception):
+    def __init__(self, etag: str) -> None:
+        self.etag = etag
+
+
+class SharedMemoryUnavailableError(Exception):
+    pass
+
+
+class ProfilerBusyError(Exception):
+    pass
+
+
+class LoginTakenError(Exception):
+    pass
@@ -2,28 +2,48 @@ from typing import Annotated
 
 from fastapi import Depends
 
+from src.core.config import configs
 from src.models.jwt import Payload
-from src.services.redis_service import Key
 from src.services.redis_service import RedisService
 from src.services.redis_service import get_service_redis
+from src.services.revocation_service import RevocationService
+from src.services.revocation_service import get_revocation_service
+from src.services.revocation_service import watermark_key
+from src.services.shared_cache import shared_cache
 
 
 class JWTService:
-    def __init__(self, redis: RedisService) -> None:
+    def __init__(self, redis: RedisService, revocations: RevocationService) -> None:
         self.redis = redis
+        self.revocations = revocations
 
     async def check_banned(self, data: Payload) -> bool:
-        user_id = data.user_id
-        prefix_general = f"{data.type}_banned"
-        jti = data.jti
+        """Whether the token is revoked, by itself or by a watermark of its user
+
+        The host's shared table learns of a watermark from the revocation feed, up to
+        `shared_cache_poll_interval` after it is written, so the table is checked together with
+        the watermarks this worker wrote itself. A watermark written by another worker, on this
+        host or another, is still enforced here only once the table has caught up with the feed.
+        """
         plug = object()
-        return bool(
-            (banned := await self.redis.get(Key(prefix_general, user_id, jti), plug)) is plug
-            or banned == jti
-            or (banned_all := await self.redis.get(Key(prefix_general, "all", user_id), plug)) is plug
-            or (isinstance(banned_all, int) and banned_all > data.iat)
-        )
+        local_fallback = configs.redis_degraded_policy == "fail_open"
+        # Both reads within one `redis_timeout`, so a stalled Redis delays a request once, not twice
+        with self.redis.budget():
+            if await self.revocations.is_revoked(data, local_fallback=local_fallback):
+                return True
+
+            key = watermark_key(data.type, data.user_id)
+            missing = object()
+            if (banned_all := shared_cache.watermark(data.type, data.user_id, missing)) is missing:
+                banned_all = await self.redis.get(key, plug, local_fallback=local_fallback)
+            elif isinstance(written := self.redis.recall(key, None), int) and written > (banned_all or 0):
+                # Written by this worker, not yet applied to the table from the feed
+                banned_all = written
+        return banned_all is plug or (isinstance(banned_all, int) and banned_all > data.iat)
 
 
-def get_jwt_service(redis: Annotated[RedisService, Depends(get_service_redis)]) -> JWTService:
-    return JWTService(redis)
+def get_jwt_service(
+    redis: Annotated[RedisService, Depends(get_service_redis)],
+    revocations: Annotated[RevocationService, Depends(get_revocation_service)],
+) -> JWTService:
+    return JWTService(redis, revocations)
@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+from collections.abc import Iterable
+from contextlib import suppress
+from typing import Annotated
+from typing import Any
+from typing import Final
+
+from fastapi import Depends
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.core.config import configs
+from src.db import redis_db
+from src.db.postgres_db import open_read_session
+from src.db.redis_db import RedisClient
+from src.models.alchemy_model import UserOrm
+from src.services.custom_error import RedisUnavailableError
+from src.services.redis_service import Key
+from src.services.redis_service import RedisService
+from src.services.redis_service import get_service_redis
+
+
+FILTER_TAG: Final = "login_filter"
+COUNTERS_KEY: Final = Key("login", "filter", "counters", tag=FILTER_TAG)
+READY_KEY: Final = Key("login", "filter", "ready", tag=FILTER_TAG)
+SEED_LOCK_KEY: Final = Key("login", "filter", "seeding", tag=FILTER_TAG)
+COUNTER: Final = "u4"
+# Removals before the seed is done are dropped: the seed may not have counted the login yet
+REMOVE_SCRIPT: Final = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    return nil
+end
+return redis.call('BITFIELD', KEYS[1], 'OVERFLOW', 'SAT', unpack(ARGV))
+"""
+
+
+def positions(login: str, counters: int, hashes: int) -> list[int]:
+    """Counters of the login, by double hashing one 128-bit digest"""
+    digest = hashlib.blake2b(login.encode(), digest_size=16).digest()
+    first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+    return [(first + index * second) % counters for index in range(hashes)]
+
+
+class LoginFilter:
+    """Counting Bloom filter of the taken logins, in a Redis string of 4-bit counters
+
+    A login is added before its user is committed and removed after its user is deleted, so the
+    filter can be wrong only towards "maybe taken", which Postgres then settles. Counters saturate
+    at 15, and only a counter shared by more than 15 logins, which the sizing makes negligible,
+    can be decremented below its true count. The answer is a hint for signup forms:
+    `/auth/register` still checks the login in Postgres.
+
+    Until the seed from the `user` table is done, the filter cannot tell, and says so.
+    """
+
+    def __init__(self, redis: RedisService, counters: int, hashes: int) -> None:
+        self.redis = redis
+        self.counters = counters
+        self.hashes = hashes
+
+    def _operations(self, logins: Iterable[str], operation: str, *arguments: int) -> list[Any]:
+        return [
+            item
+            for login in logins
+            for position in positions(login, self.counters, self.hashes)
+            for item in (operation, COUNTER, f"#{position}", *arguments)
+        ]
+
+    async def add(self, *logins: str) -> None:
+        if not logins:
+            return
+
+        operations = self._operations(logins, "INCRBY", 1)
+        await self.redis.execute(
+            lambda redis: redis.execute_command("BITFIELD", str(COUNTERS_KEY), "OVERFLOW", "SAT", *operations)
+        )
+
+    async def remove(self, login: str) -> None:
+        operations = self._operations([login], "INCRBY", -1)
+        await self.redis.execute(
+            lambda redis: redis.eval(REMOVE_SCRIPT, 2, str(COUNTERS_KEY), str(READY_KEY), *operations)
+        )
+
+    async def might_exist(self, login: str) -> bool | None:
+        """False if the login is surely free, True if it may be taken, None if the filter is not seeded yet"""
+        operations = self._operations([login], "GET")
+
+        async def execute(redis: RedisClient) -> list[Any]:
+            pipe = redis.pipeline(transaction=False)
+            pipe.exists(str(READY_KEY))  # pyright: ignore[reportUnusedCoroutine]
+            pipe.execute_command("BITFIELD_RO", str(COUNTERS_KEY), *operations)  # pyright: ignore[reportUnusedCoroutine]
+            return await pipe.execute()
+
+        ready, counters = await self.redis.execute(execute)
+        if not ready:
+            return None
+
+        return all(counters)
+
+    async def seed(self) -> bool:
+        """Counts every login of the `user` table, unless another worker does. Whether the filter is ready"""
+        if await self.redis.get(READY_KEY, None) is not None:
+            return True
+
+        async def lock(redis: RedisClient) -> bool | None:
+            return await redis.set(str(SEED_LOCK_KEY), b"1", ex=configs.login_filter_seed_timeout, nx=True)
+
+        if not await self.redis.execute(lock):
+            return False
+
+        # Counting a login twice, because its user was created during the seed, only leaves a "maybe taken"
+        stmt = (
+            select(UserOrm.login)
+            .where(UserOrm.is_deleted == False)  # noqa: E712
+            .execution_options(yield_per=configs.login_filter_seed_batch)
+        )
+        async with open_read_session() as session:
+            result = await session.stream_scalars(stmt)
+            async for logins in result.partitions():
+                await self.add(*logins)
+
+        await self.redis.set(READY_KEY, True)
+        await self.redis.delete(SEED_LOCK_KEY)
+        configs.logger.info("Login filter is seeded")
+        return True
+
+
+class LoginFilterSeeder:
+    """Seeds the filter at startup, and again whenever Redis has lost it"""
+
+    def __init__(self, check_interval: float) -> None:
+        self.check_interval = check_interval
+        self._task: asyncio.Task[None] | None = None
+
+    async def _run(self) -> None:
+        while True:
+            logins = LoginFilter(
+                RedisService(redis_db.get_redis(), redis_db.breaker, redis_db.recent_values),
+                configs.login_filter_counters,
+                configs.login_filter_hashes,
+            )
+            try:
+                await logins.seed()
+            except (RedisUnavailableError, RedisError, SQLAlchemyError) as error:
+                configs.logger.warning(f"Login filter not seeded: {error!r}")
+
+            await asyncio.sleep(self.check_interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+
+login_filter_seeder = LoginFilterSeeder(configs.login_filter_check_interval)
+
+
+def get_login_filter(redis: Annotated[RedisService, Depends(get_service_redis)]) -> LoginFilter:
+    return LoginFilter(redis, configs.login_filter_counters, configs.login_filter_hashes)
@@ -1,7 +1,6 @@
 from contextlib import suppress
-from datetime import UTC
-from datetime import datetime
 from typing import Annotated
+from uuid import UUID
 
 from fastapi import Depends
 from sqlalchemy import and_
@@ -15,27 +14,32 @@ from sqlalchemy.orm import selectinload
 
 from src.api.models.access_control import ChangePermissionModel
 from src.api.models.access_control import CreatePermissionModel
+from src.api.models.access_control import PageModel
 from src.api.models.access_control import PermissionModel
 from src.api.models.access_control import PermissionsModel
+from src.api.models.access_control import PermissionsPageModel
 from src.api.models.access_control import ResponseUserModel
 from src.api.models.access_control import SearchPermissionModel
 from src.api.models.access_control import UserModel
-from src.core.config import jwt_config
 from src.db.postgres_db import get_session
 from src.models.alchemy_model import PermissionOrm
 from src.models.alchemy_model import UserOrm
+from src.models.projection import UserProjection
 from src.services.custom_error import MisdirectedRequestError
-from src.services.redis_service import Key
-from src.services.redis_service import RedisService
-from src.services.redis_service import get_service_redis
+from src.services.projection_cache import ProjectionCache
+from src.services.projection_cache import get_projection_cache
+from src.services.revocation_service import RevocationService
+from src.services.revocation_service import get_revocation_service
+from src.services.shared_cache import shared_cache
 
 
 NOT_ENOUGH_INFO = "Недостаточно информации"
 
 
 class PermissionManagementService:
-    def __init__(self, redis: RedisService, session: AsyncSession) -> None:
-        self.redis = redis
+    def __init__(self, revocations: RevocationService, cache: ProjectionCache, session: AsyncSession) -> None:
+        self.revocations = revocations
+        self.cache = cache
         self.session = session
 
     async def create(self, new_right: CreatePermissionModel) -> PermissionModel:
@@ -46,6 +50,7 @@ class PermissionManagementService:
         right = PermissionOrm(**new_right.model_dump())
         self.session.add(right)
         await self.session.commit()
+        await self.cache.forget_catalog()
         await self.session.refresh(right)
         return PermissionModel(id=right.id, name=right.name, description=right.description)
 
@@ -59,20 +64,18 @@ class PermissionManagementService:
         except NoResultFound:
             raise MisdirectedRequestError(f"Право '{right.name or right.id}' не существует")
 
-        now = int(datetime.now(UTC).timestamp())
-        keys_access_to_redis: dict[Key, int] = {}
-        keys_refresh_to_redis: dict[Key, int] = {}
+        users_changed: dict[UUID, str] = {}
         stmt_users_with_right = select(UserOrm).where(UserOrm.permissions.contains(right_))
         for user in (await self.session.scalars(stmt_users_with_right)).all():
             with suppress(ValueError):
                 user.permissions.remove(right_)
-                keys_access_to_redis[Key("access_banned", "all", user.id)] = now
-                keys_refresh_to_redis[Key("refresh_banned", "all", user.id)] = now
+                users_changed[user.id] = user.login
 
-        await self.redis.pipe_set(keys_access_to_redis, jwt_config.authjwt_access_token_expires)
-        await self.redis.pipe_set(keys_refresh_to_redis, jwt_config.authjwt_refresh_token_expires)
+        await self.revocations.revoke_users(users_changed, permission_id=right_.id)
         await self.session.delete(right_)
         await self.session.commit()
+        await self.cache.forget_catalog()
+        await self.cache.forget_users(users_changed)
         return f"Право '{right.name or right.id}' удалено"
 
     async def update(self, right_old: SearchPermissionModel, right_new: ChangePermissionModel) -> PermissionModel:
@@ -92,27 +95,46 @@ class PermissionManagementService:
         except IntegrityError:
             raise MisdirectedRequestError(f"Право с названием '{right_new.name}' уже существует")
 
-        now = int(datetime.now(UTC).timestamp())
-        keys_access_to_redis: dict[Key, int] = {}
-        keys_refresh_to_redis: dict[Key, int] = {}
-        stmt_users_with_right = select(UserOrm).where(UserOrm.permissions.contains(right))
-        for user in (await self.session.scalars(stmt_users_with_right)).all():
-            keys_access_to_redis[Key("access_banned", "all", user.id)] = now
-            keys_refresh_to_redis[Key("refresh_banned", "all", user.id)] = now
-
-        await self.redis.pipe_set(keys_access_to_redis, jwt_config.authjwt_access_token_expires)
-        await self.redis.pipe_set(keys_refresh_to_redis, jwt_config.authjwt_refresh_token_expires)
+        stmt_users_with_right = select(UserOrm.id).where(UserOrm.permissions.contains(right))
+        await self.revocations.revoke_users(
+            (await self.session.scalars(stmt_users_with_right)).all(), permission_id=right.id
+        )
         await self.session.commit()
+        await self.cache.forget_catalog()
         return PermissionModel(id=right.id, name=right.name, description=right.description)
 
-    async def get_all(self) -> PermissionsModel:
+    async def get_all(self, *, fresh: bool = False) -> PermissionsModel:
         return PermissionsModel(
             permissions=[
                 PermissionModel(id=right.id, name=right.name, description=right.description)
-                for right in (await self.session.scalars(select(PermissionOrm))).fetchall()
+                for right in await self.cache.catalog(self.session, local=not fresh)
             ]
         )
 
+    async def catalog(self) -> list[tuple[UUID, str]]:
+        """Ids and names of all permissions, from the host's shared cache when it can tell"""
+        if (catalog := shared_cache.catalog()) is None:
+            catalog = [(permission.id, permission.name) for permission in (await self.get_all()).permissions]
+
+        return catalog
+
+    async def get_page(self, page: PageModel) -> PermissionsPageModel:
+        stmt = (
+            select(PermissionOrm.id, PermissionOrm.name, PermissionOrm.description)
+            .order_by(PermissionOrm.name)
+            .limit(page.limit + 1)
+        )
+        if page.after is not None:
+            stmt = stmt.where(PermissionOrm.name > page.after)
+
+        rows = (await self.session.execute(stmt)).all()
+        permissions = [
+            PermissionModel(id=id_, name=name, description=description) for id_, name, description in rows[: page.limit]
+        ]
+        return PermissionsPageModel(
+            permissions=permissions, next_after=permissions[-1].name if len(rows) > page.limit else None
+        )
+
     async def assign(self, right: SearchPermissionModel, user: UserModel) -> ResponseUserModel:
         if not right.model_dump(exclude_none=True) or not user.model_dump(exclude_none=True):
             raise MisdirectedRequestError(NOT_ENOUGH_INFO)
@@ -145,9 +167,7 @@ class PermissionManagementService:
 
         user_.permissions.append(right_)
 
-        now = int(datetime.now(UTC).timestamp())
-        await self.redis.set(Key("access_banned", "all", user_.id), now, jwt_config.authjwt_access_token_expires)
-        await self.redis.set(Key("refresh_banned", "all", user_.id), now, jwt_config.authjwt_refresh_token_expires)
+        await self.revocations.revoke_users([user_.id])
         result = ResponseUserModel(
             id=user_.id,
             login=user_.login,
@@ -157,6 +177,7 @@ class PermissionManagementService:
             ],
         )
         await self.session.commit()
+        await self.cache.forget_user(user_.id, user_.login)
         return result
 
     async def take_away(self, right: SearchPermissionModel, user: UserModel) -> ResponseUserModel:
@@ -191,9 +212,7 @@ class PermissionManagementService:
                 f"Пользователь '{user.id or user.login}' не имеет право '{right.name or right.id}'"
             )
 
-        now = int(datetime.now(UTC).timestamp())
-        await self.redis.set(Key("access_banned", "all", user_.id), now, jwt_config.authjwt_access_token_expires)
-        await self.redis.set(Key("refresh_banned", "all", user_.id), now, jwt_config.authjwt_refresh_token_expires)
+        await self.revocations.revoke_users([user_.id])
 
         result = ResponseUserModel(
             id=user_.id,
@@ -204,36 +223,33 @@ class PermissionManagementService:
             ],
         )
         await self.session.commit()
+        await self.cache.forget_user(user_.id, user_.login)
         return result
 
-    async def get_user_permissions(self, user: UserModel) -> PermissionsModel:
+    async def _find_user(self, user: UserModel, *, fresh: bool = False) -> UserProjection:
         if not user.model_dump(exclude_none=True):
             raise MisdirectedRequestError(NOT_ENOUGH_INFO)
 
-        stmt = (
-            select(UserOrm)
-            .options(selectinload(UserOrm.permissions))
-            .where(
-                and_(
-                    or_(UserOrm.id == user.id, UserOrm.login == user.login),
-                    UserOrm.is_deleted == False,  # noqa: E712
-                )
-            )
-        )
-        try:
-            user_ = (await self.session.scalars(stmt)).one()
-        except NoResultFound:
+        user_ = await self.cache.user(self.session, id_=user.id, login=user.login, local=not fresh)
+        if user_ is None or user_.is_deleted:
             raise MisdirectedRequestError(f"Пользователь '{user.id or user.login}' не существует")
 
+        return user_
+
+    async def get_user_permissions(self, user: UserModel, *, fresh: bool = False) -> PermissionsModel:
+        user_ = await self._find_user(user, fresh=fresh)
         return PermissionsModel(
             permissions=[
                 PermissionModel(id=right.id, name=right.name, description=right.description)
-                for right in user_.permissions
+                for right in await self.cache.catalog(self.session, local=not fresh)
+                if right.id in user_.permissions
             ]
         )
 
 
 def get_permission_management_service(
-    redis: Annotated[RedisService, Depends(get_service_redis)], postgres: Annotated[AsyncSession, Depends(get_session)]
+    revocations: Annotated[RevocationService, Depends(get_revocation_service)],
+    cache: Annotated[ProjectionCache, Depends(get_projection_cache)],
+    postgres: Annotated[AsyncSession, Depends(get_session)],
 ) -> PermissionManagementService:
-    return PermissionManagementService(redis, postgres)
+    return PermissionManagementService(revocations, cache, postgres)
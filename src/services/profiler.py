@@ -0,0 +1,123 @@
+import asyncio
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from types import FrameType
+from typing import Final
+
+from src.api.models.profiling import AllocatorModel
+from src.api.models.profiling import MemoryProfileModel
+from src.core.config import configs
+from src.services.custom_error import ProfilerBusyError
+
+
+# The sampler only sees the loop where it lets go of the GIL, so with the default 5 ms every sample
+# would land in `select`: a short interval makes the loop hand the GIL over wherever it runs
+SWITCH_INTERVAL: Final = 0.0001
+IGNORED_TRACES: Final = (
+    tracemalloc.Filter(inclusive=False, filename_pattern=tracemalloc.__file__),
+    tracemalloc.Filter(inclusive=False, filename_pattern="<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(inclusive=False, filename_pattern="<unknown>"),
+)
+
+
+def collapsed_stack(frame: FrameType | None) -> str:
+    """`root;...;leaf` with one `function (file:first line)` per frame, as flame graph tools read it"""
+    names: list[str] = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_qualname} ({code.co_filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+
+    return ";".join(reversed(names))
+
+
+class WorkerProfiler:
+    """Profiles the worker that receives the request, one profile at a time
+
+    The CPU profile samples the stack of the event loop thread from another thread every `interval`
+    seconds, so the loop is never stopped or instrumented, and a sample costs the same however hot
+    the code. The memory profile traces allocations with `tracemalloc` between two snapshots, then
+    stops tracing again if it was off. Both last at most `profiling_max_seconds`.
+    """
+
+    def __init__(self) -> None:
+        self.busy = False
+
+    def _acquire(self) -> None:
+        if self.busy:
+            raise ProfilerBusyError
+        self.busy = True
+
+    @staticmethod
+    def _sample(thread_id: int, interval: float, deadline: float, done: threading.Event) -> Counter[str]:
+        stacks: Counter[str] = Counter()
+        while not done.wait(interval) and time.monotonic() < deadline:
+            stacks[collapsed_stack(sys._current_frames().get(thread_id))] += 1
+
+        return stacks
+
+    async def cpu(self, seconds: float, interval: float) -> str:
+        """Collapsed stacks of the event loop thread, one `stack count` line each, most sampled first"""
+        self._acquire()
+        done = threading.Event()
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(SWITCH_INTERVAL)
+        try:
+            stacks = await asyncio.to_thread(
+                self._sample, threading.get_ident(), interval, time.monotonic() + seconds, done
+            )
+        finally:
+            # Stops the sampler right away when the client goes, instead of at the deadline
+            done.set()
+            sys.setswitchinterval(switch_interval)
+            self.busy = False
+
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common() if stack)
+
+    @staticmethod
+    def _diff(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, top: int) -> tuple[int, list[AllocatorModel]]:
+        statistics = after.filter_traces(IGNORED_TRACES).compare_to(before.filter_traces(IGNORED_TRACES), "traceback")
+        return sum(statistic.size_diff for statistic in statistics), [
+            AllocatorModel(
+                traceback=[f"{frame.filename}:{frame.lineno}" for frame in statistic.traceback],
+                size_diff=statistic.size_diff,
+                size=statistic.size,
+                count_diff=statistic.count_diff,
+                count=statistic.count,
+            )
+            for statistic in statistics[:top]
+        ]
+
+    async def memory(self, seconds: float, top: int) -> MemoryProfileModel:
+        self._acquire()
+        try:
+            started = not tracemalloc.is_tracing()
+            try:
+                if started:
+                    tracemalloc.start(configs.profiling_memory_frames)
+                tracemalloc.reset_peak()
+                before = await asyncio.to_thread(tracemalloc.take_snapshot)
+                await asyncio.sleep(seconds)
+                after = await asyncio.to_thread(tracemalloc.take_snapshot)
+                traced, peak = tracemalloc.get_traced_memory()
+            finally:
+                if started:
+                    tracemalloc.stop()
+
+            size_diff, allocators = await asyncio.to_thread(self._diff, before, after, top)
+        finally:
+            self.busy = False
+
+        return MemoryProfileModel(
+            seconds=seconds,
+            size_diff=size_diff,
+            traced=traced,
+            peak=peak,
+            allocators=allocators,
+        )
+
+
+worker_profiler = WorkerProfiler()
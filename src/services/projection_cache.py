@@ -0,0 +1,143 @@
+from contextlib import suppress
+from hashlib import blake2b
+from pickle import HIGHEST_PROTOCOL as PICKLE_HIGHEST_PROTOCOL  # noqa: S403
+from pickle import dumps as pickle_dumps  # noqa: S403
+from typing import Annotated
+from typing import Any
+from uuid import UUID
+
+from fastapi import Depends
+from redis.exceptions import RedisError
+from sqlalchemy import ColumnElement
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.config import configs
+from src.db.redis_db import RedisClient
+from src.db.redis_db import get_auto_pipeline
+from src.db.redis_db import get_breaker
+from src.db.redis_db import get_projections
+from src.db.redis_db import get_redis
+from src.models.alchemy_model import PermissionOrm
+from src.models.alchemy_model import UserOrm
+from src.models.alchemy_model import user_permission
+from src.models.projection import PermissionProjection
+from src.models.projection import UserProjection
+from src.services.auto_pipeline import AutoPipeline
+from src.services.circuit_breaker import CircuitBreaker
+from src.services.custom_error import RedisUnavailableError
+from src.services.recent_values import RecentValues
+from src.services.redis_service import Key
+from src.services.redis_service import RedisService
+
+
+# Tagged alike, so that a cluster keeps the catalog and its version on one shard
+CATALOG_KEY = Key("projection", "permission", "catalog", "catalog")
+CATALOG_VERSION_KEY = Key("projection_version", "permission", "catalog", "catalog")
+
+
+def user_id_key(id_: UUID) -> Key:
+    return Key("projection", "user_id", id_, id_)
+
+
+def user_login_key(login: str) -> Key:
+    return Key("projection", "user_login", login)
+
+
+class ProjectionCache:
+    """Read-through cache of user projections and of the permission catalog
+
+    Looked up in this worker's LRU first, then in Redis, then in Postgres. Misses are loaded
+    from the session given by the caller, which should be the primary: a lagging replica could
+    otherwise put back rows an invalidation has just removed.
+
+    The catalog is stored along with a hash of its content, in one transaction and with the same TTL,
+    so the version read is always that of the catalog next to it and changes only with its content.
+    """
+
+    def __init__(self, redis: RedisService) -> None:
+        self.redis = redis
+
+    async def _get(self, key: Key, *, local: bool = True) -> Any | None:
+        try:
+            return await self.redis.get(key, None, local_first=local)
+        except RedisUnavailableError:
+            return None
+
+    async def _put(self, key: Key, value: Any) -> None:
+        with suppress(RedisUnavailableError):
+            await self.redis.set(key, value, configs.projection_ttl)
+
+    async def _load_user(self, session: AsyncSession, condition: ColumnElement[bool]) -> UserProjection | None:
+        stmt = select(UserOrm.id, UserOrm.login, UserOrm.is_deleted).where(condition)
+        if (row := (await session.execute(stmt)).one_or_none()) is None:
+            return None
+
+        stmt_permissions = select(user_permission.c.permission_id).where(user_permission.c.user_id == row.id)
+        permissions = tuple((await session.scalars(stmt_permissions)).all())
+        user = UserProjection(id=row.id, login=row.login, is_deleted=row.is_deleted, permissions=permissions)
+        await self._put(user_id_key(user.id), user)
+        await self._put(user_login_key(user.login), user)
+
+        return user
+
+    async def user(
+        self, session: AsyncSession, *, id_: UUID | None = None, login: str | None = None, local: bool = True
+    ) -> UserProjection | None:
+        user = None
+        if id_ is not None:
+            user = await self._get(user_id_key(id_), local=local) or await self._load_user(session, UserOrm.id == id_)
+
+        if user is None and login is not None:
+            user = await self._get(user_login_key(login), local=local) or await self._load_user(
+                session, UserOrm.login == login
+            )
+
+        return user
+
+    async def catalog(self, session: AsyncSession, *, local: bool = True) -> tuple[PermissionProjection, ...]:
+        if (catalog := await self._get(CATALOG_KEY, local=local)) is not None:
+            return catalog
+
+        stmt = select(PermissionOrm.id, PermissionOrm.name, PermissionOrm.description)
+        catalog = tuple(
+            PermissionProjection(id=row.id, name=row.name, description=row.description)
+            for row in await session.execute(stmt)
+        )
+        version = blake2b(pickle_dumps(catalog, protocol=PICKLE_HIGHEST_PROTOCOL), digest_size=16).hexdigest()
+        with suppress(RedisUnavailableError):
+            await self.redis.pipe_set({CATALOG_KEY: catalog, CATALOG_VERSION_KEY: version}, configs.projection_ttl)
+        return catalog
+
+    async def catalog_version(self) -> str | None:
+        """None until the catalog is cached again after a change"""
+        return await self._get(CATALOG_VERSION_KEY, local=False)
+
+    async def _forget(self, *keys: Key) -> None:
+        # Runs after the change is committed: failing here would report a write that took place as failed
+        try:
+            await self.redis.delete(*keys)
+        except (RedisUnavailableError, RedisError) as error:
+            configs.logger.warning(
+                f"Projections left to expire within {configs.projection_ttl}s, Redis did not drop them: {error!r}"
+            )
+
+    async def forget_users(self, users: dict[UUID, str]) -> None:
+        if users:
+            keys = [key for id_, login in users.items() for key in (user_id_key(id_), user_login_key(login))]
+            await self._forget(*keys)
+
+    async def forget_user(self, id_: UUID, login: str) -> None:
+        await self.forget_users({id_: login})
+
+    async def forget_catalog(self) -> None:
+        await self._forget(CATALOG_KEY, CATALOG_VERSION_KEY)
+
+
+def get_projection_cache(
+    redis: Annotated[RedisClient, Depends(get_redis)],
+    breaker: Annotated[CircuitBreaker, Depends(get_breaker)],
+    projections: Annotated[RecentValues, Depends(get_projections)],
+    pipeline: Annotated[AutoPipeline | None, Depends(get_auto_pipeline)],
+) -> ProjectionCache:
+    return ProjectionCache(RedisService(redis, breaker, projections, pipeline))
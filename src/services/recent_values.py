@@ -0,0 +1,46 @@
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from redis.typing import ExpiryT
+
+
+class RecentValues:
+    """Values this worker has recently written to or read from Redis, kept with their TTL
+
+    Lets revocation checks keep working from local knowledge while Redis is unreachable, and
+    serves cached projections without a round trip. `max_age` caps how long an entry is
+    trusted, for values other workers may invalidate.
+    """
+
+    def __init__(self, max_size: int, max_age: float | None = None) -> None:
+        self.max_size = max_size
+        self.max_age = max_age
+        self.values: OrderedDict[str, tuple[bytes, float | None]] = OrderedDict()
+
+    def put(self, key: str, value: bytes, expire: ExpiryT | None = None) -> None:
+        if isinstance(expire, timedelta):
+            expire = expire.total_seconds()
+
+        if self.max_age is not None:
+            expire = self.max_age if expire is None else min(expire, self.max_age)
+
+        self.values[key] = (value, None if expire is None else time.monotonic() + expire)
+        self.values.move_to_end(key)
+        if len(self.values) > self.max_size:
+            self.values.popitem(last=False)
+
+    def get(self, key: str) -> bytes | None:
+        if (item := self.values.get(key)) is None:
+            return None
+
+        value, deadline = item
+        if deadline is not None and deadline <= time.monotonic():
+            del self.values[key]
+            return None
+
+        self.values.move_to_end(key)
+        return value
+
+    def forget(self, key: str) -> None:
+        self.values.pop(key, None)
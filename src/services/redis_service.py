@@ -1,3 +1,10 @@
+import asyncio
+import random
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
 from pickle import HIGHEST_PROTOCOL as PICKLE_HIGHEST_PROTOCOL  # noqa: S403
 from pickle import dumps as pickle_dumps  # noqa: S403
@@ -6,60 +13,190 @@ from typing import Annotated
 from typing import Any
 from uuid import UUID
 
-import backoff
 from fastapi import Depends
-from redis.asyncio import Redis
 from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
 from redis.typing import ExpiryT
 
+from src.core.config import configs
+from src.db.redis_db import RedisClient
+from src.db.redis_db import get_auto_pipeline
+from src.db.redis_db import get_breaker
+from src.db.redis_db import get_recent_values
 from src.db.redis_db import get_redis
+from src.services.auto_pipeline import AutoPipeline
+from src.services.circuit_breaker import CircuitBreaker
+from src.services.custom_error import RedisUnavailableError
+from src.services.recent_values import RecentValues
 
 
 type Plug = object
 
+# Loop time by which every call of the current `RedisService.budget()` block must be answered
+_deadline: ContextVar[float | None] = ContextVar("redis_deadline", default=None)
+
+
+def hash_tag(tag: str | UUID) -> str:
+    """Prefix that keeps keys with the same tag in one cluster slot, empty outside cluster mode"""
+    return f"{{{tag}}}" if configs.redis_cluster else ""
+
 
 @dataclass(frozen=True, slots=True)
 class Key:
     prefix_general: str
     prefix_local: str | UUID
     key: str | UUID
+    tag: str | UUID | None = None
 
     def __str__(self) -> str:
-        return f"{self.prefix_general}:{self.prefix_local}:{self.key}"
+        if self.tag is None:
+            return f"{self.prefix_general}:{self.prefix_local}:{self.key}"
+        return f"{hash_tag(self.tag)}{self.prefix_general}:{self.prefix_local}:{self.key}"
 
 
 class RedisService:
-    def __init__(self, redis: Redis) -> None:
+    def __init__(
+        self, redis: RedisClient, breaker: CircuitBreaker, recent: RecentValues, pipeline: AutoPipeline | None = None
+    ) -> None:
         self.redis = redis
-
-    @backoff.on_exception(backoff.expo, RedisConnectionError, max_tries=10)
-    async def get(self, key: Key, plug: Plug) -> Any | Plug | None:
-        if (data := await self.redis.get(str(key))) is None:
+        self.breaker = breaker
+        self.recent = recent
+        self.pipeline = pipeline
+
+    @staticmethod
+    @contextmanager
+    def budget() -> Iterator[None]:
+        """Makes the calls inside share one `redis_timeout`, instead of waiting up to that long each"""
+        if _deadline.get() is not None:
+            yield
+            return
+
+        token = _deadline.set(asyncio.get_running_loop().time() + configs.redis_timeout)
+        try:
+            yield
+        finally:
+            _deadline.reset(token)
+
+    async def _call[T](self, command: Callable[[], Awaitable[T]]) -> T:
+        deadline = _deadline.get()
+        if deadline is None:
+            deadline = asyncio.get_running_loop().time() + configs.redis_timeout
+        elif deadline <= asyncio.get_running_loop().time():
+            # Spent by the earlier calls of the block, which Redis has been charged for already
+            raise RedisUnavailableError
+
+        if not self.breaker.allow():
+            raise RedisUnavailableError
+
+        try:
+            async with asyncio.timeout_at(deadline):
+                result = await self._retry(command)
+        except (RedisConnectionError, RedisTimeoutError, TimeoutError) as error:
+            if self.breaker.record_failure():
+                configs.logger.warning(f"Redis circuit opened: {error!r}")
+            raise RedisUnavailableError from error
+        except BaseException:
+            self.breaker.release()
+            raise
+
+        self.breaker.record_success()
+        return result
+
+    @staticmethod
+    async def _retry[T](command: Callable[[], Awaitable[T]]) -> T:
+        """Retries a refused connection with exponential backoff and full jitter"""
+        for attempt in range(1, configs.redis_max_tries):
+            try:
+                return await command()
+            except RedisConnectionError as error:
+                delay = random.uniform(0, configs.redis_retry_factor * 2 ** (attempt - 1))
+                configs.logger.info(f"Redis retry {attempt} in {delay:.3f}s: {error!r}")
+                await asyncio.sleep(delay)
+
+        return await command()
+
+    async def _command(self, command: Callable[[RedisClient], Awaitable[Any]]) -> Any:
+        """Sends a single command, coalesced with those of concurrent requests when there is an auto-pipeline"""
+        if self.pipeline is None:
+            return await command(self.redis)
+
+        return await self.pipeline.submit(command)
+
+    async def execute[T](self, command: Callable[[RedisClient], Awaitable[T]]) -> T:
+        """Runs raw commands on the client, within the same time budget, retries and circuit breaker"""
+        return await self._call(lambda: command(self.redis))
+
+    async def get(
+        self, key: Key, plug: Plug, *, local_first: bool = False, local_fallback: bool = False
+    ) -> Any | Plug | None:
+        name = str(key)
+        if local_first and (data := self.recent.get(name)) is not None:
+            return pickle_loads(data)[0]  # noqa: S301
+
+        try:
+            data = await self._call(lambda: self._command(lambda redis: redis.get(name)))
+        except RedisUnavailableError:
+            if not local_fallback:
+                raise
+            data = self.recent.get(name)
+        else:
+            if data is not None:
+                self.recent.put(name, data)
+
+        if data is None:
             return None
 
         result = pickle_loads(data)[0]  # noqa: S301
         return plug if result is None else result
 
-    @backoff.on_exception(backoff.expo, RedisConnectionError, max_tries=10)
+    def recall(self, key: Key, plug: Plug) -> Any | Plug:
+        """The value this worker last wrote or read for `key`, `plug` if it knows none, without a round trip"""
+        if (data := self.recent.get(str(key))) is None:
+            return plug
+
+        return pickle_loads(data)[0]  # noqa: S301
+
+    def remember(self, key: Key, value: Any, expire: ExpiryT | None = None) -> tuple[str, bytes]:
+        """Name and data `set` would write for `key`, kept locally as if written, to go out in a pipeline"""
+        name = str(key)
+        data = pickle_dumps((value,), protocol=PICKLE_HIGHEST_PROTOCOL)
+        self.recent.put(name, data, expire)
+        return name, data
+
     async def set(self, key: Key, value: Any, expire: ExpiryT | None = None) -> None:
-        await self.redis.set(
-            str(key),
-            pickle_dumps((value,), protocol=PICKLE_HIGHEST_PROTOCOL),
-            expire,
-        )
+        name, data = self.remember(key, value, expire)
+        await self._call(lambda: self._command(lambda redis: redis.set(name, data, expire)))
+
+    async def delete(self, *keys: Key) -> None:
+        names = [str(key) for key in keys]
+        for name in names:
+            self.recent.forget(name)
+
+        if configs.redis_cluster and len(names) > 1:
+            # The cluster client splits a DEL of keys in several slots, a cluster pipeline cannot
+            await self._call(lambda: self.redis.delete(*names))
+            return
+
+        await self._call(lambda: self._command(lambda redis: redis.delete(*names)))
 
-    @backoff.on_exception(backoff.expo, RedisConnectionError, max_tries=10)
     async def pipe_set(self, map: dict[Key, Any], expire: ExpiryT | None = None) -> None:
-        pipe = self.redis.pipeline()
-        for key, value in map.items():
-            await pipe.set(
-                str(key),
-                pickle_dumps((value,), protocol=PICKLE_HIGHEST_PROTOCOL),
-                expire,
-            )
+        items = dict(self.remember(key, value, expire) for key, value in map.items())
+
+        async def execute() -> None:
+            # A cluster pipeline has no MULTI, it sends one batch per shard instead
+            pipe = self.redis.pipeline(transaction=not configs.redis_cluster)
+            for name, data in items.items():
+                pipe.set(name, data, expire)  # pyright: ignore[reportUnusedCoroutine]
+
+            await pipe.execute()
 
-        await pipe.execute()
+        await self._call(execute)
 
 
-def get_service_redis(redis: Annotated[Redis, Depends(get_redis)]) -> RedisService:
-    return RedisService(redis)
+def get_service_redis(
+    redis: Annotated[RedisClient, Depends(get_redis)],
+    breaker: Annotated[CircuitBreaker, Depends(get_breaker)],
+    recent: Annotated[RecentValues, Depends(get_recent_values)],
+    pipeline: Annotated[AutoPipeline | None, Depends(get_auto_pipeline)],
+) -> RedisService:
+    return RedisService(redis, breaker, recent, pipeline)
@@ -0,0 +1,185 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from collections.abc import Iterable
+from contextlib import suppress
+from math import ceil
+from typing import Annotated
+from typing import Any
+from typing import Final
+
+from fastapi import Depends
+
+from src.api.models.revocations import RevocationEventModel
+from src.api.models.revocations import RevocationEventsModel
+from src.core.config import configs
+from src.core.config import jwt_config
+from src.db.redis_db import RedisClient
+from src.db.redis_db import RedisPipeline
+from src.services.custom_error import RedisUnavailableError
+from src.services.redis_service import Key
+from src.services.redis_service import RedisService
+from src.services.redis_service import get_service_redis
+
+
+STREAM_KEY: Final = Key("revocation", "stream", "events")
+EVENT_FIELD: Final = b"event"
+START: Final = "0-0"
+
+
+def entry_id(value: str | bytes) -> tuple[int, int]:
+    milliseconds, _, sequence = (value.decode() if isinstance(value, bytes) else value).partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+def sse_message(event: RevocationEventModel) -> bytes:
+    return f"id: {event.id}\nevent: {event.type}\ndata: {event.model_dump_json(exclude={'id'})}\n\n".encode()
+
+
+class RevocationFeed:
+    """Revocation events in a Redis stream, whose entry ids are the consumers' cursors
+
+    The stream keeps events as long as the longest-lived token: older ones are trimmed on every
+    append, since no token they revoke can be presented any more. So a consumer that reads from
+    the start and follows the cursor holds every revocation still in force.
+    """
+
+    def __init__(self, redis: RedisService) -> None:
+        self.redis = redis
+
+    @staticmethod
+    def add(pipe: RedisPipeline, events: Iterable[RevocationEventModel]) -> None:
+        """Queues the events on `pipe`, to be appended in the round trip of the commands around them"""
+        name = str(STREAM_KEY)
+        oldest = f"{(int(time.time()) - jwt_config.authjwt_refresh_token_expires) * 1000}-0"
+        for event in events:
+            pipe.xadd(name, {EVENT_FIELD: event.model_dump_json(exclude={"id"})}, minid=oldest)  # pyright: ignore[reportUnusedCoroutine]
+
+    async def publish(self, *events: RevocationEventModel) -> None:
+        if not events:
+            return
+
+        async def execute(redis: RedisClient) -> None:
+            pipe = redis.pipeline(transaction=False)
+            self.add(pipe, events)
+            await pipe.execute()
+
+        await self.redis.execute(execute)
+
+    async def _entries(self, after: str | None, limit: int) -> tuple[list[Any], tuple[int, int]]:
+        name = str(STREAM_KEY)
+
+        async def execute(redis: RedisClient) -> list[Any]:
+            pipe = redis.pipeline(transaction=False)
+            pipe.xrange(name, min="-" if after is None else f"({after}", count=limit)  # pyright: ignore[reportUnusedCoroutine]
+            pipe.xrevrange(name, count=1)  # pyright: ignore[reportUnusedCoroutine]
+            return await pipe.execute()
+
+        entries, newest = await self.redis.execute(execute)
+        return entries, entry_id(newest[0][0]) if newest else (0, 0)
+
+    async def newest(self) -> tuple[int, int]:
+        async def execute(redis: RedisClient) -> list[Any]:
+            return await redis.xrevrange(str(STREAM_KEY), count=1)
+
+        newest = await self.redis.execute(execute)
+        return entry_id(newest[0][0]) if newest else (0, 0)
+
+    async def read(self, after: str | None, limit: int) -> RevocationEventsModel:
+        entries, newest = await self._entries(after, limit)
+        # The newest entry always survives trimming, a cursor past it means the stream was lost and started over
+        reset = after is not None and entry_id(after) > newest
+        if reset:
+            entries, _ = await self._entries(None, limit)
+
+        events: list[RevocationEventModel] = []
+        for id_, fields in entries:
+            event = RevocationEventModel.model_validate_json(fields[EVENT_FIELD])
+            event.id = id_.decode()
+            events.append(event)
+
+        cursor = events[-1].id if events else START if reset or after is None else after
+        assert cursor is not None
+        return RevocationEventsModel(events=events, cursor=cursor, reset=reset)
+
+    async def stream(self, after: str | None, watcher: "RevocationWatcher") -> AsyncIterator[bytes]:
+        # A client that loses the stream reconnects after `retry` with Last-Event-ID
+        yield f"retry: {ceil(configs.redis_breaker_reset_timeout * 1000)}\n\n".encode()
+        cursor = after
+        with suppress(RedisUnavailableError):
+            while True:
+                page = await self.read(cursor, configs.revocation_stream_batch)
+                if page.reset:
+                    yield f"event: reset\ndata: {page.model_dump_json(include={'cursor'})}\n\n".encode()
+                if page.events:
+                    yield b"".join(map(sse_message, page.events))
+
+                cursor = page.cursor
+                if len(page.events) < configs.revocation_stream_batch and not await watcher.wait(
+                    cursor, configs.revocation_stream_wait
+                ):
+                    yield b": keepalive\n\n"
+
+
+class RevocationWatcher:
+    """Newest entry id of the revocation stream, polled while some request waits for new events
+
+    One poll every `poll_interval` seconds serves all the long-poll and SSE clients of the worker,
+    however many there are; with nobody waiting, Redis is not polled at all.
+    """
+
+    def __init__(self, poll_interval: float) -> None:
+        self.poll_interval = poll_interval
+        self.newest = (0, 0)
+        self.waiters = 0
+        self._changed = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+
+    async def wait(self, cursor: str, seconds: float) -> bool:
+        """Whether an entry after `cursor` appeared within `seconds`"""
+        after = entry_id(cursor)
+        self.waiters += 1
+        self._wakeup.set()
+        try:
+            async with asyncio.timeout(seconds):
+                while self.newest <= after:
+                    await self._changed.wait()
+        except TimeoutError:
+            return False
+        finally:
+            self.waiters -= 1
+
+        return True
+
+    async def _run(self, feed: RevocationFeed) -> None:
+        while True:
+            if not self.waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            with suppress(RedisUnavailableError):
+                if (newest := await feed.newest()) != self.newest:
+                    self.newest = newest
+                    changed, self._changed = self._changed, asyncio.Event()
+                    changed.set()
+
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self, feed: RevocationFeed) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(feed))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+
+revocation_watcher = RevocationWatcher(configs.revocation_stream_poll_interval)
+
+
+def get_revocation_feed(redis: Annotated[RedisService, Depends(get_service_redis)]) -> RevocationFeed:
+    return RevocationFeed(redis)
@@ -0,0 +1,185 @@
+from collections.abc import Iterable
+from datetime import UTC
+from datetime import datetime
+from enum import StrEnum
+from typing import Annotated
+from uuid import UUID
+
+from fastapi import Depends
+
+from src.api.models.revocations import RevocationEventModel
+from src.api.models.revocations import RevocationEventType
+from src.core.config import configs
+from src.core.config import jwt_config
+from src.db.redis_db import RedisClient
+from src.db.redis_db import RedisPipeline
+from src.models.jwt import Payload
+from src.services.custom_error import RedisUnavailableError
+from src.services.redis_service import Key
+from src.services.redis_service import RedisService
+from src.services.redis_service import get_service_redis
+from src.services.redis_service import hash_tag
+from src.services.revocation_feed import RevocationFeed
+
+
+class RevocationLayout(StrEnum):
+    """How revoked jti are laid out in Redis
+
+    keys: `{type}_banned:{user}:{jti}` holding the pickled jti again.
+    compact: one value-less key per jti named with its 16 raw bytes, `a:` or `r:` first.
+    hash: one hash per user and token type, a value-less field per jti with its own TTL (Redis 7.4+).
+    """
+
+    keys = "keys"
+    compact = "compact"
+    hash = "hash"
+
+
+# In cluster mode every key below is tagged with the user, so all of a user's revocations share one slot
+
+
+def watermark_key(token_type: str, user_id: UUID) -> Key:
+    """Tokens of the user issued before the time stored here are revoked"""
+    return Key(f"{token_type}_banned", "all", user_id, user_id)
+
+
+def legacy_key(token_type: str, user_id: UUID, jti: UUID) -> Key:
+    return Key(f"{token_type}_banned", user_id, jti, user_id)
+
+
+def compact_key(token_type: str, user_id: UUID, jti: UUID) -> bytes:
+    return hash_tag(user_id).encode() + token_type[:1].encode() + b":" + jti.bytes
+
+
+def hash_key(token_type: str, user_id: UUID) -> bytes:
+    return hash_tag(user_id).encode() + token_type[:1].encode() + b"h:" + user_id.bytes
+
+
+class RevocationService:
+    """Revokes single tokens and checks them, in the layout chosen by `revocation_layout`
+
+    While `revocation_legacy_reads` is on, the `keys` layout is checked as well, so switching to
+    another layout keeps the revocations made before the switch until they expire.
+
+    Every revocation is also published to the `RevocationFeed`, by an XADD that follows its
+    writes in the same pipeline, so storing and announcing it costs a single round trip.
+    """
+
+    def __init__(self, redis: RedisService, layout: RevocationLayout, *, legacy_reads: bool) -> None:
+        self.redis = redis
+        self.layout = layout
+        self.legacy_reads = legacy_reads and layout is not RevocationLayout.keys
+        self.feed = RevocationFeed(redis)
+
+    @staticmethod
+    def _local_name(payload: Payload) -> str:
+        return f"revoked:{payload.type}:{payload.jti}"
+
+    async def revoke(self, *payloads: Payload) -> None:
+        now = int(datetime.now(UTC).timestamp())
+        events = [
+            RevocationEventModel(
+                type=RevocationEventType.token,
+                user_id=payload.user_id,
+                token_type=payload.type,
+                jti=payload.jti,
+                expires_at=payload.exp,
+            )
+            for payload in payloads
+        ]
+
+        async def execute(redis: RedisClient) -> None:
+            pipe = redis.pipeline(transaction=False)
+            self._store(pipe, payloads, now)
+            self.feed.add(pipe, events)
+            await pipe.execute()
+
+        await self.redis.execute(execute)
+
+    async def revoke_users(self, user_ids: Iterable[UUID], *, permission_id: UUID | None = None) -> None:
+        """Revokes every token issued to the users so far, and announces the change of `permission_id` if given"""
+        now = int(datetime.now(UTC).timestamp())
+        user_ids = list(user_ids)
+        access_expires = jwt_config.authjwt_access_token_expires
+        refresh_expires = jwt_config.authjwt_refresh_token_expires
+        expires_at = now + max(access_expires, refresh_expires)
+        events = [
+            RevocationEventModel(
+                type=RevocationEventType.user, user_id=user_id, issued_before=now, expires_at=expires_at
+            )
+            for user_id in user_ids
+        ]
+        if permission_id is not None:
+            events.append(
+                RevocationEventModel(
+                    type=RevocationEventType.permission, permission_id=permission_id, expires_at=expires_at
+                )
+            )
+        watermarks = [
+            (*self.redis.remember(watermark_key(token_type, user_id), now, expires), expires)
+            for token_type, expires in (("access", access_expires), ("refresh", refresh_expires))
+            for user_id in user_ids
+        ]
+
+        async def execute(redis: RedisClient) -> None:
+            # A cluster pipeline has no MULTI, it sends one batch per shard instead
+            pipe = redis.pipeline(transaction=not configs.redis_cluster)
+            # Appended first: the shared cache takes a watermark missing from the feed for no watermark at all
+            self.feed.add(pipe, events)
+            for name, data, expires in watermarks:
+                pipe.set(name, data, expires)  # pyright: ignore[reportUnusedCoroutine]
+
+            await pipe.execute()
+
+        await self.redis.execute(execute)
+
+    def _store(self, pipe: RedisPipeline, payloads: tuple[Payload, ...], now: int) -> None:
+        """Queues the writes that revoke `payloads` on `pipe`"""
+        for payload in payloads:
+            ttl = max(payload.exp - now, 1)
+            match self.layout:
+                case RevocationLayout.keys:
+                    name, data = self.redis.remember(
+                        legacy_key(payload.type, payload.user_id, payload.jti), payload.jti, ttl
+                    )
+                    pipe.set(name, data, ex=ttl)  # pyright: ignore[reportUnusedCoroutine]
+                case RevocationLayout.compact:
+                    self.redis.recent.put(self._local_name(payload), b"", ttl)
+                    pipe.set(compact_key(payload.type, payload.user_id, payload.jti), b"", ex=ttl)  # pyright: ignore[reportUnusedCoroutine]
+                case RevocationLayout.hash:
+                    self.redis.recent.put(self._local_name(payload), b"", ttl)
+                    name = hash_key(payload.type, payload.user_id)
+                    pipe.hset(name, payload.jti.bytes, b"")  # pyright: ignore[reportUnusedCoroutine, reportArgumentType]
+                    pipe.hexpire(name, ttl, payload.jti.bytes)  # pyright: ignore[reportUnusedCoroutine, reportArgumentType]
+
+    async def is_revoked(self, payload: Payload, *, local_fallback: bool = False) -> bool:
+        if self.layout is RevocationLayout.keys:
+            plug = object()
+            banned = await self.redis.get(
+                legacy_key(payload.type, payload.user_id, payload.jti), plug, local_fallback=local_fallback
+            )
+            return banned is plug or banned == payload.jti
+
+        async def execute(redis: RedisClient) -> bool:
+            pipe = redis.pipeline(transaction=False)
+            if self.layout is RevocationLayout.compact:
+                pipe.exists(compact_key(payload.type, payload.user_id, payload.jti))  # pyright: ignore[reportUnusedCoroutine]
+            else:
+                pipe.hexists(hash_key(payload.type, payload.user_id), payload.jti.bytes)  # pyright: ignore[reportUnusedCoroutine, reportArgumentType]
+            if self.legacy_reads:
+                pipe.exists(str(legacy_key(payload.type, payload.user_id, payload.jti)))  # pyright: ignore[reportUnusedCoroutine]
+
+            return any(await pipe.execute())
+
+        try:
+            return await self.redis.execute(execute)
+        except RedisUnavailableError:
+            if not local_fallback:
+                raise
+            return self.redis.recent.get(self._local_name(payload)) is not None
+
+
+def get_revocation_service(redis: Annotated[RedisService, Depends(get_service_redis)]) -> RevocationService:
+    return RevocationService(
+        redis, RevocationLayout(configs.revocation_layout), legacy_reads=configs.revocation_legacy_reads
+    )
@@ -0,0 +1,224 @@
+import asyncio
+import fcntl
+import os
+import time
+from contextlib import suppress
+from itertools import batched
+from pickle import loads as pickle_loads  # noqa: S403
+from typing import Final
+from uuid import UUID
+
+from redis.exceptions import RedisError
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.api.models.revocations import RevocationEventType
+from src.core.config import configs
+from src.core.config import jwt_config
+from src.db import postgres_db
+from src.db import redis_db
+from src.db.redis_db import RedisClient
+from src.db.shared_memory import CATALOG_SYNCED
+from src.db.shared_memory import WATERMARKS_SYNCED
+from src.db.shared_memory import SharedMemory
+from src.services.custom_error import RedisUnavailableError
+from src.services.custom_error import SharedMemoryUnavailableError
+from src.services.projection_cache import ProjectionCache
+from src.services.redis_service import RedisService
+from src.services.revocation_feed import RevocationFeed
+
+
+WATERMARK_PATTERN: Final = "*_banned:all:*"
+SCAN_BATCH: Final = 1000
+
+
+class WatermarkTableFullError(Exception):
+    pass
+
+
+class SharedCache:
+    """Revocation watermarks and the permission catalog, kept once per host in `SharedMemory`
+
+    The worker that holds the lock file is the host's writer: it loads every watermark from Redis,
+    then follows the revocation feed, and reloads the catalog whenever its version changes, beating
+    a heartbeat as it goes. The other workers only read. A reader uses a part of the table only while
+    the writer has it synced and its heartbeat is fresh, and gets nothing otherwise, to go to Redis
+    and Postgres as before. When the writer dies, its lock is released and another worker takes over.
+    """
+
+    def __init__(self, reader: SharedMemory, writer: SharedMemory, stale_after: float, poll_interval: float) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        self.enabled = False
+        self._reopen_at = 0.0
+        self._lock: int | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    def _usable(self, flag: int) -> bool:
+        if not self.enabled:
+            return False
+
+        now = time.time()
+        if self.reader.synced(flag, now - self.stale_after):
+            return True
+
+        if now < self._reopen_at:
+            return False
+
+        self._reopen_at = now + self.stale_after
+        return self.reader.open() and self.reader.synced(flag, now - self.stale_after)
+
+    def watermark[T](self, token_type: str, user_id: UUID, missing: T) -> int | T | None:
+        """The user's watermark, None if there is none, `missing` if the table cannot tell"""
+        if not self._usable(WATERMARKS_SYNCED):
+            return missing
+
+        try:
+            return self.reader.watermark(token_type, user_id)
+        except SharedMemoryUnavailableError:
+            return missing
+
+    def catalog(self) -> list[tuple[UUID, str]] | None:
+        """Ids and names of all permissions, None if the table cannot tell"""
+        if not self._usable(CATALOG_SYNCED):
+            return None
+
+        try:
+            return self.reader.catalog()
+        except SharedMemoryUnavailableError:
+            return None
+
+    def _try_lock(self) -> bool:
+        fd = os.open(self.writer.path.with_name(f"{self.writer.path.name}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+
+        self._lock = fd
+        return True
+
+    def _put_watermark(self, token_type: str, user_id: UUID, watermark: int, expires_at: int) -> None:
+        if not self.writer.put_watermark(token_type, user_id, watermark, expires_at):
+            raise WatermarkTableFullError
+
+    async def _load_watermarks(self, redis: RedisClient) -> None:
+        lifetimes = {
+            "access": jwt_config.authjwt_access_token_expires,
+            "refresh": jwt_config.authjwt_refresh_token_expires,
+        }
+        names = [name async for name in redis.scan_iter(match=WATERMARK_PATTERN, count=SCAN_BATCH)]
+        for batch in batched(names, SCAN_BATCH):
+            pipe = redis.pipeline(transaction=False)
+            for name in batch:
+                pipe.get(name)  # pyright: ignore[reportUnusedCoroutine]
+
+            for name, data in zip(batch, await pipe.execute(), strict=True):
+                if data is None or not isinstance(watermark := pickle_loads(data)[0], int):  # noqa: S301
+                    continue
+
+                # `{tag}access_banned:all:<user id>`, the tag only in cluster mode
+                prefix, _, user_id = name.decode().split(":")
+                token_type = prefix.rpartition("}")[2].removesuffix("_banned")
+                self._put_watermark(token_type, UUID(user_id), watermark, watermark + lifetimes[token_type])
+
+    async def _load_catalog(self, cache: ProjectionCache) -> None:
+        async with postgres_db.async_session() as session:
+            catalog = await cache.catalog(session, local=False)
+
+        if self.writer.put_catalog([(permission.id, permission.name) for permission in catalog]):
+            self.writer.set_flags(WATERMARKS_SYNCED | CATALOG_SYNCED)
+        else:
+            self.writer.set_flags(WATERMARKS_SYNCED)
+            configs.logger.warning("Permission catalog does not fit the shared cache, read from Redis instead")
+
+    async def _sync(self) -> None:
+        """Fills a new table and keeps it in sync, until the feed starts over or a dependency fails"""
+        service = RedisService(redis_db.get_redis(), redis_db.breaker, redis_db.recent_values)
+        feed = RevocationFeed(service)
+        cache = ProjectionCache(RedisService(redis_db.get_redis(), redis_db.breaker, redis_db.projections))
+        self.writer.create()
+
+        # The cursor is taken before the scan, so that nothing revoked during it is missed
+        milliseconds, sequence = await feed.newest()
+        cursor = f"{milliseconds}-{sequence}"
+        await self._load_watermarks(redis_db.get_redis())
+        self.writer.set_flags(WATERMARKS_SYNCED)
+        self.writer.beat()
+
+        catalog_version = await cache.catalog_version()
+        await self._load_catalog(cache)
+        while True:
+            page = await feed.read(cursor, configs.revocation_stream_batch)
+            if page.reset:
+                return
+
+            for event in page.events:
+                if event.type is RevocationEventType.user and event.user_id and event.issued_before:
+                    for token_type in ("access", "refresh"):
+                        self._put_watermark(token_type, event.user_id, event.issued_before, event.expires_at)
+            cursor = page.cursor
+
+            if (version := await cache.catalog_version()) != catalog_version:
+                await self._load_catalog(cache)
+                catalog_version = version
+
+            self.writer.beat()
+            if len(page.events) < configs.revocation_stream_batch:
+                await asyncio.sleep(self.poll_interval)
+
+    async def _run(self) -> None:
+        try:
+            while self._lock is None:
+                if not self._try_lock():
+                    await asyncio.sleep(self.stale_after)
+        except OSError as error:
+            configs.logger.warning(f"Shared cache lock not taken, the worker only reads: {error!r}")
+            return
+
+        configs.logger.info("Worker writes the shared cache of the host")
+        while True:
+            try:
+                await self._sync()
+            except (RedisUnavailableError, RedisError, SQLAlchemyError, OSError) as error:
+                configs.logger.warning(f"Shared cache out of sync: {error!r}")
+            except WatermarkTableFullError:
+                configs.logger.warning("Shared cache has no free watermark slot, raise SHARED_CACHE_WATERMARK_SLOTS")
+
+            with suppress(SharedMemoryUnavailableError):
+                self.writer.set_flags(0)
+            await asyncio.sleep(configs.redis_breaker_reset_timeout)
+
+    def start(self) -> None:
+        self.enabled = True
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self.enabled = False
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+        with suppress(SharedMemoryUnavailableError):
+            self.writer.set_flags(0)
+        self.writer.close()
+        self.reader.close()
+        if self._lock is not None:
+            os.close(self._lock)
+            self._lock = None
+
+
+def shared_memory() -> SharedMemory:
+    return SharedMemory(
+        configs.shared_cache_path, configs.shared_cache_watermark_slots, configs.shared_cache_catalog_slots
+    )
+
+
+shared_cache = SharedCache(
+    shared_memory(), shared_memory(), configs.shared_cache_stale_after, configs.shared_cache_poll_interval
+)
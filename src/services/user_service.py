@@ -1,24 +1,78 @@
+from collections.abc import AsyncIterator
 from collections.abc import Iterable
 from typing import Annotated
 from uuid import UUID
 
-from aiohttp import ClientSession
+import orjson
 from fastapi import Depends
+from psycopg.errors import UniqueViolation
+from sqlalchemy import Select
+from sqlalchemy import delete
+from sqlalchemy import exists
+from sqlalchemy import func
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload
 from sqlalchemy.orm import selectinload
 from sqlalchemy.sql import select
 
 from src.api.models.auth import AccountModel
+from src.api.models.users import UserFilterModel
+from src.api.models.users import UserItemModel
+from src.api.models.users import UsersPageModel
+from src.api.models.users import UsersPageQueryModel
+from src.core.config import configs
+from src.db.postgres_db import get_replica_session
 from src.db.postgres_db import get_session
+from src.db.postgres_db import open_read_session
 from src.models.alchemy_model import UserOrm
+from src.models.alchemy_model import user_permission
+from src.models.projection import UserProjection
+from src.services.custom_error import LoginTakenError
+from src.services.login_filter import LoginFilter
+from src.services.login_filter import get_login_filter
 from src.services.password_service import PasswordService
 from src.services.password_service import get_password_service
+from src.services.projection_cache import ProjectionCache
+from src.services.projection_cache import get_projection_cache
+
+
+def select_users(filter_: UserFilterModel) -> Select[tuple[UUID, str, bool, list[UUID] | None]]:
+    permissions = (
+        select(func.array_agg(user_permission.c.permission_id))
+        .where(user_permission.c.user_id == UserOrm.id)
+        .scalar_subquery()
+    )
+    stmt = select(UserOrm.id, UserOrm.login, UserOrm.is_deleted, permissions).order_by(UserOrm.login)
+    if filter_.login_prefix is not None:
+        stmt = stmt.where(UserOrm.login.startswith(filter_.login_prefix, autoescape=True))
+    if filter_.is_deleted is not None:
+        stmt = stmt.where(UserOrm.is_deleted == filter_.is_deleted)
+    if filter_.permission is not None:
+        stmt = stmt.where(
+            exists().where(
+                user_permission.c.user_id == UserOrm.id, user_permission.c.permission_id == filter_.permission
+            )
+        )
+
+    return stmt
 
 
 class UserService:
-    def __init__(self, session: AsyncSession, password: PasswordService) -> None:
+    def __init__(
+        self,
+        session: AsyncSession,
+        password: PasswordService,
+        cache: ProjectionCache,
+        logins: LoginFilter,
+        replica: AsyncSession | None = None,
+    ) -> None:
         self.session = session
         self.password = password
+        self.cache = cache
+        self.logins = logins
+        self.replica = session if replica is None else replica
 
     async def get_user(self, login: str, *, is_deleted: bool = False) -> UserOrm | None:
         stmt = (
@@ -26,26 +80,37 @@ class UserService:
             .options(selectinload(UserOrm.permissions))
             .where(UserOrm.login == login, UserOrm.is_deleted == is_deleted)
         )
-        result = await self.session.execute(stmt)
+        result = await self.replica.execute(stmt)
         return result.scalars().first()
 
     async def get_user_by_id(self, id_: UUID) -> UserOrm | None:
         stmt = (
             select(UserOrm)
-            .options(selectinload(UserOrm.permissions))
+            .options(raiseload(UserOrm.permissions))
             .where(UserOrm.id == id_, UserOrm.is_deleted == False)  # noqa: E712
         )
         result = await self.session.execute(stmt)
         return result.scalars().first()
 
+    async def get_projection(self, id_: UUID) -> UserProjection | None:
+        return await self.cache.user(self.session, id_=id_)
+
     async def transfer_user_to_other_services(self, user_id: UUID, urls: Iterable[str]) -> None:
+        # Imported on the first registration instead of at startup: nothing else needs aiohttp
+        from aiohttp import ClientSession
+
         async with ClientSession(conn_timeout=3, read_timeout=10) as session:
             for url in urls:
                 async with session.post(url, json=str(user_id)):
                     ...
 
     async def create_user(self, account: AccountModel) -> UserOrm:
-        deleted_user = await self.get_user(account.login, is_deleted=True)
+        stmt = (
+            select(UserOrm)
+            .options(selectinload(UserOrm.permissions))
+            .where(UserOrm.login == account.login, UserOrm.is_deleted == True)  # noqa: E712
+        )
+        deleted_user = (await self.session.scalars(stmt)).first()
         if deleted_user is None:
             user = UserOrm(
                 login=account.login,
@@ -57,24 +122,66 @@ class UserService:
             user.password = await self.password.compute_hash(account.password)
             user.is_deleted = False
 
-        await self.session.commit()
+        # Counted before the commit, so that the filter never tells a taken login is free
+        await self.logins.add(account.login)
+        try:
+            await self.session.commit()
+        except IntegrityError as error:
+            # Registered concurrently, or after a check on a replica that had not caught up yet
+            await self.session.rollback()
+            if isinstance(error.orig, UniqueViolation):
+                raise LoginTakenError from error
+            raise
+
         await self.session.refresh(user)
+        await self.cache.forget_user(user.id, user.login)
         return user
 
-    async def delete_user(self, user: UserOrm) -> None:
-        user.is_deleted = True
-        user.permissions.clear()
-        self.session.add(user)
+    async def delete_user(self, user: UserProjection) -> None:
+        await self.session.execute(update(UserOrm).where(UserOrm.id == user.id).values(is_deleted=True))
+        await self.session.execute(delete(user_permission).where(user_permission.c.user_id == user.id))
         await self.session.commit()
+        await self.cache.forget_user(user.id, user.login)
+        await self.logins.remove(user.login)
 
     async def change_password(self, user: UserOrm, new_password: str) -> None:
         user.password = await self.password.compute_hash(new_password)
         await self.session.commit()
         await self.session.refresh(user)
 
+    async def get_page(self, query: UsersPageQueryModel) -> UsersPageModel:
+        stmt = select_users(query).limit(query.limit + 1)
+        if query.after is not None:
+            stmt = stmt.where(UserOrm.login > query.after)
+
+        rows = (await self.replica.execute(stmt)).all()
+        users = [
+            UserItemModel(id=id_, login=login, is_deleted=is_deleted, permissions=permissions or [])
+            for id_, login, is_deleted, permissions in rows[: query.limit]
+        ]
+        return UsersPageModel(users=users, next_after=users[-1].login if len(rows) > query.limit else None)
+
+    @staticmethod
+    async def export(filter_: UserFilterModel) -> AsyncIterator[bytes]:
+        # Own session: the request's one is closed before a streamed body is sent
+        stmt = select_users(filter_).execution_options(yield_per=configs.export_batch_size)
+        async with open_read_session() as session:
+            result = await session.stream(stmt)
+            async for rows in result.partitions():
+                yield b"".join(
+                    orjson.dumps(
+                        {"id": id_, "login": login, "is_deleted": is_deleted, "permissions": permissions or []},
+                        option=orjson.OPT_APPEND_NEWLINE,
+                    )
+                    for id_, login, is_deleted, permissions in rows
+                )
+
 
 def get_user_service(
     postgres: Annotated[AsyncSession, Depends(get_session)],
     password: Annotated[PasswordService, Depends(get_password_service)],
+    cache: Annotated[ProjectionCache, Depends(get_projection_cache)],
+    logins: Annotated[LoginFilter, Depends(get_login_filter)],
+    replica: Annotated[AsyncSession, Depends(get_replica_session)],
 ) -> UserService:
-    return UserService(postgres, password)
+    return UserService(postgres, password, cache, logins, replica)